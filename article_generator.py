@@ -1,15 +1,36 @@
 import re
+import copy
+import contextvars
 import json
 import logging
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, Iterator
 from pydantic import BaseModel, ValidationError
 
-from utils import load_prompts
+from prompt_registry import PromptRegistry, get_registry
 from gpt_client import GPTClient
+from journal import JobJournal
+from context_policy import ContextPolicy
+from system_prompts import SystemPromptProvider
+from outline_stream import iter_outline_items
+from metrics import labels
 
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
+_OUTLINE_DONE = object()
+
+
+class ArticleGenerationError(RuntimeError):
+    """
+    Статью не удалось сгенерировать целиком (нет outline или упал раздел).
+    Неполная статья не сохраняется и не отмечается в журнале как готовая,
+    поэтому --resume повторит только недостающие этапы.
+    """
+
 
 class OutlineItem(BaseModel):
     title: str
@@ -19,35 +40,70 @@ class OutlineResponse(BaseModel):
     outline: list[OutlineItem]
 
 
+class TranslatedOutline(BaseModel):
+    title: str
+    outline: list[OutlineItem]
+
+
+# Запрос перевода outline, если для языка нет шаблона outline_translation_prompt
+DEFAULT_TRANSLATION_PROMPT = (
+    "Translate the article title and the titles and subtopics of its outline into the language "
+    "with code {language}. Keep the number and order of sections and subtopics.\n{outline}"
+)
+
+
 class ArticleGenerator:
-    def __init__(self, gpt: GPTClient, language: str):
+    def __init__(self, gpt: GPTClient, language: str, max_workers: int = 1,
+                 journal: JobJournal | None = None,
+                 context_policies: dict[str, ContextPolicy] | None = None,
+                 stream_tokens: bool = False, prompts: PromptRegistry | None = None,
+                 system_prompts: SystemPromptProvider | None = None, pipeline_outline: bool = False,
+                 max_sections: int | None = None, outline_from: str | None = None):
         """
         Инициализирует генератор статей с клиентом GPT и языком.
+        max_workers > 1 включает параллельную генерацию разделов.
+        journal сохраняет результаты этапов, чтобы продолжить статью после падения.
+        context_policies задает политику контекста для шагов "outline",
+        "introduction", "section" и "conclusion"; для остальных действует политика клиента.
+        stream_tokens включает потоковую выдачу текста разделов в iter_article
+        (только при последовательной генерации, max_workers=1).
+        prompts — реестр шаблонов; по умолчанию общий нестрогий реестр prompts/.
+        system_prompts — провайдер системных промптов; общий экземпляр позволяет
+        переиспользовать клиентов и сгенерированные промпты между статьями.
+        pipeline_outline включает потоковую генерацию outline: каждый раздел
+        запускается, как только его пункт outline пришел целиком, не дожидаясь
+        остальных. Разделы при этом видят запрос outline, но не ответ на него.
+        max_sections ограничивает число основных разделов статьи (лишние пункты outline отбрасываются).
+        outline_from — тема, чей outline из журнала используется вместо генерации
+        нового (для почти одинаковых тем); если его там нет, outline генерируется.
         """
         self.gpt = gpt
         self.language = language
+        self.max_workers = max(1, max_workers)
+        self.journal = journal
+        self.context_policies = context_policies or {}
+        self.stream_tokens = stream_tokens
+        self.prompts = prompts or get_registry()
+        self.system_prompts = system_prompts or SystemPromptProvider(self.prompts)
+        self.pipeline_outline = pipeline_outline
+        self.max_sections = max_sections
+        self.outline_from = outline_from
+
+    def _fork(self) -> "ArticleGenerator":
+        """
+        Возвращает копию генератора с независимым контекстом GPT-клиента.
+        """
+        forked = copy.copy(self)
+        forked.gpt = self.gpt.fork()
+        return forked
 
     def generate_system_prompt(self, topic: str) -> str:
         """
         Генерирует специализированный системный промпт для конкретной темы статьи.
+        Промпт запрашивается отдельным клиентом из пула провайдера, чтобы не мешать
+        основному клиенту с его контекстом; повторные темы берутся из кэша.
         """
-        # Используем отдельный клиент GPT для генерации системного промпта
-        # чтобы не мешать основному клиенту с его контекстом
-        from gpt_client import GPTClient, MODEL_ADVANCED, TEMPERATURE
-        
-        prompt_template = load_prompts(f"prompts/system_prompt_generator_{self.language}.txt")
-        user_prompt = prompt_template.format(topic=topic)
-        
-        try:
-            # Создаем временный клиент для генерации системного промпта
-            temp_client = GPTClient(model=MODEL_ADVANCED, temperature=TEMPERATURE)
-            system_prompt = temp_client.chat(user_prompt)
-            logger.info(f"Generated custom system prompt for topic: {topic}")
-            return system_prompt
-        except Exception as e:
-            logger.error(f"Failed to generate system prompt: {e}")
-            # В случае ошибки используем стандартный системный промпт
-            return load_prompts(f"prompts/system_prompt_{self.language}.txt")
+        return self.system_prompts.get(topic, self.language)
 
     @staticmethod
     def parse_outline_json(outline_text: str) -> list:
@@ -80,36 +136,49 @@ class ArticleGenerator:
             logger.warning("JSON parsing error: %s", e)
             return []
 
-    def generate_outline(self, topic: str) -> str:
+    @staticmethod
+    def validate_outline_json(outline_text: str) -> list:
         """
-        Generates a structured JSON outline for the given topic using OpenAI's Structured Outputs approach.
+        Строгий вариант parse_outline_json: весь ответ (объект или голый
+        массив разделов) проверяется схемой OutlineResponse, при ошибке
+        бросается ValueError вместо подстановки непроверенных данных.
         """
-        # Reading the prompt template
-        template = load_prompts(f"prompts/outline_prompt_{self.language}.txt")
-        user_prompt = template.format(topic=topic)
+        cleaned = re.sub(r"```json\s*", "", outline_text)
+        cleaned = re.sub(r"```", "", cleaned).strip()
+        data = json.loads(cleaned)
+        if isinstance(data, list):
+            data = {"outline": data}
+        return [item.dict() for item in OutlineResponse.parse_obj(data).outline]
 
-        try:
-            # Using OpenAI's Structured Outputs to ensure JSON format
-            response = self.gpt.chat_with_format(
-                user_prompt,
-                response_format=OutlineResponse
-            )
+    def generate_outline(self, topic: str) -> OutlineResponse:
+        """
+        Запрашивает outline по JSON-схеме OutlineResponse (Structured Outputs)
+        и возвращает проверенный объект. Некорректный ответ модель исправляет
+        один раз; если и это не помогло, бросает ArticleGenerationError.
+        """
+        user_prompt = self.prompts.render("outline_prompt", self.language, topic=topic)
 
-            # Convert the structured response to a dictionary and then to JSON
-            return json.dumps(response.dict(), indent=2, ensure_ascii=False)
+        try:
+            with labels(stage="outline"):
+                outline = self.gpt.chat_with_format(
+                    user_prompt,
+                    response_format=OutlineResponse,
+                    context_policy=self.context_policies.get("outline")
+                )
         except Exception as e:
             logger.error("Failed to generate outline: %s", e)
-            # В случае ошибки возвращаем JSON с пустым outline
-            return json.dumps({"outline": []}, indent=2, ensure_ascii=False)
+            raise ArticleGenerationError(f"Failed to generate outline for topic '{topic}'") from e
+        logger.info(f"Outline generated for topic: {topic} ({len(outline.outline)} sections)")
+        return outline
 
     def generate_introduction(self, topic: str) -> str:
         """
         Генерирует введение для статьи по заданной теме.
         """
-        template = load_prompts(f"prompts/introduction_prompt_{self.language}.txt")
-        user_prompt = template.format(topic=topic)
+        user_prompt = self.prompts.render("introduction_prompt", self.language, topic=topic)
         try:
-            intro_text = self.gpt.chat(user_prompt)
+            with labels(stage="introduction"):
+                intro_text = self.gpt.chat(user_prompt, context_policy=self.context_policies.get("introduction"))
             logger.info(f"Introduction generated for topic: {topic}")
             return intro_text
         except Exception as e:
@@ -121,108 +190,451 @@ class ArticleGenerator:
         Генерирует единый текст для 'section_title' (основной раздел) и
         всех подпунктов (subtopics) внутри.
         """
+        try:
+            return self._write_section(topic, section_title, subtopics)
+        except Exception as e:
+            logger.error("Failed to generate section with subtopics: %s", e)
+            return f"Не удалось сгенерировать раздел '{section_title}'."
+
+    def _write_section(self, topic: str, section_title: str, subtopics: list[str]) -> str:
+        """
+        Запрашивает текст раздела; в отличие от generate_section_with_subtopics
+        пробрасывает ошибку, чтобы неудачный раздел не попал в журнал.
+        """
+        user_prompt = self._section_prompt(topic, section_title, subtopics)
+        return self.gpt.chat(user_prompt, context_policy=self.context_policies.get("section"))
+
+    def _section_prompt(self, topic: str, section_title: str, subtopics: list[str]) -> str:
         # Можно оформить subtopics как список пунктов в prompt:
         bullets = "\n".join([f"- {s}" for s in subtopics])
-        template = load_prompts(f"prompts/subtopics_prompt_{self.language}.txt")
-        user_prompt = template.format(
+        return self.prompts.render(
+            "subtopics_prompt",
+            self.language,
             topic=topic,
             section_title=section_title,
             bullets=bullets
         )
 
-        try:
-            return self.gpt.chat(user_prompt)
-        except Exception as e:
-            logger.error("Failed to generate section with subtopics: %s", e)
-            return f"Не удалось сгенерировать раздел '{section_title}'."
-
     def generate_conclusion(self, topic: str) -> str:
         """
         Генерирует заключение для статьи по заданной теме.
         """
-        template = load_prompts(f"prompts/conclusion_prompt_{self.language}.txt")
-        user_prompt = template.format(topic=topic)
+        user_prompt = self.prompts.render("conclusion_prompt", self.language, topic=topic)
         try:
-            conclusion_text = self.gpt.chat(user_prompt)
+            with labels(stage="conclusion"):
+                conclusion_text = self.gpt.chat(user_prompt, context_policy=self.context_policies.get("conclusion"))
             logger.info(f"Conclusion generated for topic: {topic}")
             return conclusion_text
         except Exception as e:
             logger.error(f"Failed to generate conclusion: {e}")
             return "Не удалось сгенерировать заключение."
 
+    @staticmethod
+    def _select_main_sections(sections: list, with_introduction: bool = False,
+                              with_conclusion: bool = False) -> list:
+        """
+        Отбирает основные разделы outline, исключая введение и заключение.
+        """
+        main_sections = []
+        for sec in sections:
+            section_title = sec.get("title", "").lower()
+            # Исключаем разделы с заголовками, похожими на "введение" и "заключение"
+            if not any(keyword in section_title for keyword in ["введение", "вступление", "обзор", "заключение", "вывод", "итог"]):
+                main_sections.append(sec)
+            elif "введение" in section_title or "вступление" in section_title or "обзор" in section_title:
+                # Используем подтемы из раздела введения для улучшения нашего введения
+                if with_introduction:
+                    logger.info(f"Found introduction section in outline: {section_title}")
+            elif "заключение" in section_title or "вывод" in section_title or "итог" in section_title:
+                # Используем подтемы из раздела заключения для улучшения нашего заключения
+                if with_conclusion:
+                    logger.info(f"Found conclusion section in outline: {section_title}")
+        return main_sections
+
+    @staticmethod
+    def _section_failed(sec: dict, error: Exception) -> ArticleGenerationError:
+        section_title = sec.get("title", "Untitled Section")
+        logger.error("Failed to generate section '%s': %s", section_title, error)
+        return ArticleGenerationError(f"Failed to generate section '{section_title}': {error}")
+
+    def _iter_sections(self, topic: str, main_sections: list, key: str | None = None) -> Iterator[str]:
+        """
+        Отдает тексты разделов строго в порядке outline, каждый — как только
+        он и все предыдущие готовы.
+        При max_workers > 1 запросы выполняются параллельно, каждый раздел
+        получает собственную копию контекста. Разделы, уже сохраненные
+        в журнале, не генерируются. Ошибка раздела прерывает статью
+        ArticleGenerationError; успевшие разделы остаются в журнале.
+        key — ключ журнала (по умолчанию тема).
+        """
+        key = key or topic
+        saved = [
+            self.journal.get_section(key, index) if self.journal else None
+            for index in range(len(main_sections))
+        ]
+        pending = [index for index, text in enumerate(saved) if text is None]
+        if len(pending) < len(main_sections):
+            logger.info(f"Restored {len(main_sections) - len(pending)} sections from journal for topic: {topic}")
+
+        def write(generator: "ArticleGenerator", index: int) -> str:
+            sec = main_sections[index]
+            with labels(stage=f"section {index + 1}"):
+                text = generator._write_section(
+                    topic, sec.get("title", "Untitled Section"), sec.get("subtopics", [])
+                )
+            if self.journal:
+                self.journal.put_section(key, index, text)
+            return text
+
+        if self.max_workers <= 1 or len(pending) <= 1:
+            for index, text in enumerate(saved):
+                if text is None:
+                    try:
+                        text = write(self, index)
+                    except Exception as e:
+                        raise self._section_failed(main_sections[index], e) from e
+                yield text
+            return
+
+        workers = min(self.max_workers, len(pending))
+        logger.info(f"Generating {len(pending)} sections with {workers} workers")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Метки метрик (тема статьи) живут в contextvars — переносим их в потоки пула
+            futures = {
+                index: executor.submit(contextvars.copy_context().run, write, self._fork(), index)
+                for index in pending
+            }
+            for index, text in enumerate(saved):
+                if text is None:
+                    try:
+                        text = futures[index].result()
+                    except Exception as e:
+                        # Еще не начатые разделы не запускаем; выполняющиеся допишутся в журнал
+                        for future in futures.values():
+                            future.cancel()
+                        raise self._section_failed(main_sections[index], e) from e
+                yield text
+
+    def _stream_section(self, topic: str, main_sections: list, index: int, key: str | None = None) -> Iterator[str]:
+        """
+        Отдает текст раздела по мере генерации моделью.
+        """
+        key = key or topic
+        sec = main_sections[index]
+        saved = self.journal.get_section(key, index) if self.journal else None
+        if saved is not None:
+            yield saved
+            return
+
+        parts = []
+        try:
+            user_prompt = self._section_prompt(topic, sec.get("title", "Untitled Section"), sec.get("subtopics", []))
+            with labels(stage=f"section {index + 1}"):
+                for part in self.gpt.chat_stream(user_prompt, context_policy=self.context_policies.get("section")):
+                    parts.append(part)
+                    yield part
+        except Exception as e:
+            raise self._section_failed(sec, e) from e
+
+        if self.journal:
+            self.journal.put_section(key, index, "".join(parts))
+
+    def _iter_pipelined(self, topic: str) -> Iterator[str]:
+        """
+        Запрашивает outline потоком и запускает генерацию каждого основного
+        раздела, как только его пункт outline разобран. Оформленные разделы
+        отдаются в порядке outline так же, как в _iter_body.
+        Каждый пункт проверяется схемой OutlineItem по мере поступления.
+        После завершения потока проверяется весь ответ: пункты, уже отданные
+        в работу, должны совпасть с его началом, а не разобранные по ходу
+        потока добираются из его хвоста. Расхождение — ArticleGenerationError.
+        Разделы, сохраненные в журнале с тем же заголовком (после падения
+        во время потока outline), не генерируются заново.
+        """
+        user_prompt = self.prompts.render("outline_prompt", self.language, topic=topic)
+        ready: queue.Queue = queue.Queue()
+        futures = []
+
+        def write(generator: "ArticleGenerator", index: int, sec: dict) -> str:
+            with labels(stage=f"section {index + 1}"):
+                text = generator._write_section(
+                    topic, sec.get("title", "Untitled Section"), sec.get("subtopics", [])
+                )
+            if self.journal:
+                self.journal.put_section(topic, index, text, title=sec.get("title"))
+            return text
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            def dispatch(items: list) -> None:
+                for sec in self._select_main_sections(items):
+                    if self.max_sections and len(futures) >= self.max_sections:
+                        return
+                    position = len(futures)
+                    # Новый outline может отличаться от прерванного: раздел берется, только если заголовок совпал
+                    saved = self.journal.get_section(topic, position, title=sec.get("title")) if self.journal else None
+                    if saved is not None:
+                        future = Future()
+                        future.set_result(saved)
+                    else:
+                        future = executor.submit(contextvars.copy_context().run, write, self._fork(), position, sec)
+                    futures.append(future)
+                    ready.put((sec, future))
+
+            def produce() -> None:
+                raw = []
+
+                def record(chunks: Iterable[str]) -> Iterator[str]:
+                    for chunk in chunks:
+                        raw.append(chunk)
+                        yield chunk
+
+                try:
+                    items = []
+                    with labels(stage="outline"):
+                        chunks = self.gpt.chat_stream(
+                            user_prompt, context_policy=self.context_policies.get("outline"),
+                            response_format=OutlineResponse
+                        )
+                        for item in iter_outline_items(record(chunks)):
+                            # Непроверенный пункт не должен запускать генерацию раздела
+                            item = OutlineItem.parse_obj(item).dict()
+                            items.append(item)
+                            dispatch([item])
+                    outline = self.validate_outline_json("".join(raw))
+                    if outline[:len(items)] != items:
+                        raise ValueError("streamed outline items do not match the complete outline")
+                    remaining = outline[len(items):]
+                    dispatch(remaining)
+                    items.extend(remaining)
+                    if items and self.journal:
+                        self.journal.put(topic, "outline", items)
+                    ready.put(_OUTLINE_DONE)
+                except Exception as e:
+                    ready.put(e)
+
+            threading.Thread(target=contextvars.copy_context().run, args=(produce,), daemon=True).start()
+
+            index = 0
+            while True:
+                entry = ready.get()
+                if entry is _OUTLINE_DONE:
+                    break
+                try:
+                    if isinstance(entry, Exception):
+                        logger.error("Failed to generate outline: %s", entry)
+                        raise ArticleGenerationError(f"Failed to generate outline for topic '{topic}'") from entry
+                    sec, future = entry
+                    try:
+                        text = future.result()
+                    except Exception as e:
+                        raise self._section_failed(sec, e) from e
+                except ArticleGenerationError:
+                    for pending in futures:
+                        pending.cancel()
+                    raise
+
+                separator = "\n" if index else ""
+                yield f"{separator}## {sec.get('title', 'Untitled Section')}\n{text}\n"
+                index += 1
+
+        if not index:
+            logger.warning("No sections found in outline.")
+            raise ArticleGenerationError(f"No outline sections for topic '{topic}'")
+
+    @staticmethod
+    def _iter_body(main_sections: list, section_texts: Iterable[str]) -> Iterator[str]:
+        """
+        Оформляет разделы в markdown: заголовок, текст и пустая строка между разделами.
+        """
+        for index, (sec, section_text) in enumerate(zip(main_sections, section_texts)):
+            separator = "\n" if index else ""
+            yield f"{separator}## {sec.get('title', 'Untitled Section')}\n{section_text}\n"
+
+    @classmethod
+    def assemble_article(cls, topic: str, main_sections: list, section_texts: list[str]) -> str:
+        """
+        Собирает статью из готовых текстов разделов так же, как generate_article.
+        """
+        return "".join([f"# {topic}\n\n", *cls._iter_body(main_sections, section_texts), "\n\n"])
+
     def generate_article(self, topic: str) -> str:
         """
         Генерирует полную статью, включая структуру, введение, основной текст 
         и заключение.
         """
+        return "".join(self.iter_article(topic))
+
+    def _prepare(self, topic: str) -> list | None:
+        """
+        Системный промпт и outline темы из журнала (или outline похожей темы);
+        системный промпт генерируется, если его нет. None — outline еще нет.
+        """
         # 0) Генерируем специализированный системный промпт для темы
-        system_prompt = self.generate_system_prompt(topic)
+        system_prompt = self.journal.get(topic, "system_prompt") if self.journal else None
+        if system_prompt is None:
+            system_prompt = self.generate_system_prompt(topic)
+            if self.journal:
+                self.journal.put(topic, "system_prompt", system_prompt)
         # Обновляем системный промпт в GPT клиенте
         self.gpt.update_system_prompt(system_prompt)
         logger.info(f"Updated system prompt for topic: {topic}")
-        
+
+        sections = self.journal.get(topic, "outline") if self.journal else None
+        if sections is None and self.outline_from and self.journal:
+            sections = self.journal.get(self.outline_from, "outline")
+            if sections:
+                logger.info(f"Reusing outline of '{self.outline_from}' for topic: {topic}")
+                self.journal.put(topic, "outline", sections)
+        return sections
+
+    def _outline(self, topic: str) -> list:
+        """
+        Генерирует outline и сохраняет его в журнал; пустой outline — ошибка статьи.
+        """
+        # Outline уже проверен по схеме; в журнал и дальше идут словари разделов
+        sections = [item.dict() for item in self.generate_outline(topic).outline]
+        if not sections:
+            logger.warning("No sections found in outline.")
+            raise ArticleGenerationError(f"No outline sections for topic '{topic}'")
+        if self.journal:
+            self.journal.put(topic, "outline", sections)
+        return sections
+
+    def iter_article(self, topic: str) -> Iterator[str]:
+        """
+        Генерирует статью по частям: заголовок, затем разделы по мере готовности.
+        Склеенные части побайтно совпадают с результатом generate_article.
+        """
         # 1) Генерируем outline
-        outline_raw = self.generate_outline(topic)
-        sections = self.parse_outline_json(outline_raw)
+        sections = self._prepare(topic)
+        if sections is None and self.pipeline_outline:
+            # Outline и разделы генерируются внахлест
+            yield f"# {topic}\n\n"
+            yield from self._iter_pipelined(topic)
+            yield "\n\n"
+            return
+        if sections is None:
+            sections = self._outline(topic)
 
         if not sections:
             logger.warning("No sections found in outline.")
-            return f"# {topic}\n\nНе удалось сгенерировать статью по теме."
+            raise ArticleGenerationError(f"No outline sections for topic '{topic}'")
 
         # Флаги для определения, нужно ли генерировать введение и заключение
         with_introduction = False
         with_conclusion = False
 
-        body_parts = []
-        
+        yield f"# {topic}\n\n"
+
         # 2) Генерируем введение
-        introduction = ""
         if with_introduction:
             introduction = self.generate_introduction(topic)
-        
-        # 3) Фильтруем разделы: исключаем разделы введения и заключения из основного содержания
-        main_sections = []
-        for sec in sections:
-            section_title = sec.get("title", "").lower()
-            # Исключаем разделы с заголовками, похожими на "введение" и "заключение"
-            if not any(keyword in section_title for keyword in ["введение", "вступление", "обзор", "заключение", "вывод", "итог"]):
-                main_sections.append(sec)
-            elif "введение" in section_title or "вступление" in section_title or "обзор" in section_title:
-                # Используем подтемы из раздела введения для улучшения нашего введения
-                if with_introduction:
-                    logger.info(f"Found introduction section in outline: {section_title}")
-            elif "заключение" in section_title or "вывод" in section_title or "итог" in section_title:
-                # Используем подтемы из раздела заключения для улучшения нашего заключения
-                if with_conclusion:
-                    logger.info(f"Found conclusion section in outline: {section_title}")
+            yield f"## Введение\n{introduction}\n\n"
 
-        # 4) Генерируем текст для каждого основного раздела
-        for sec in main_sections:
-            section_title = sec.get("title", "Untitled Section")
-            subtopics = sec.get("subtopics", [])
-
-            # Генерируем одним вызовом
-            section_text = self.generate_section_with_subtopics(topic, section_title, subtopics)
+        # 3) Фильтруем разделы: исключаем разделы введения и заключения из основного содержания
+        main_sections = self._main_sections(sections, with_introduction, with_conclusion)
 
-            # Добавляем заголовок
-            body_parts.append(f"## {section_title}\n{section_text}\n")
+        # 4) Генерируем текст для каждого основного раздела; разделы разделены пустой строкой
+        yield from self._iter_main_sections(topic, main_sections)
 
-        body_full = "\n".join(body_parts)
+        yield "\n\n"
 
         # 5) Генерируем заключение
-        conclusion = ""
         if with_conclusion:
             conclusion = self.generate_conclusion(topic)
-            
-        # 6) Собираем статью
-        article_parts = [f"# {topic}\n\n"]
-        
-        if with_introduction:
-            article_parts.append(f"## Введение\n{introduction}\n\n")
-            
-        article_parts.append(f"{body_full}\n\n")
-        
-        if with_conclusion:
-            article_parts.append(f"## Заключение\n{conclusion}\n")
-            
-        return "".join(article_parts)
+            yield f"## Заключение\n{conclusion}\n"
+
+    def _main_sections(self, sections: list, with_introduction: bool = False, with_conclusion: bool = False) -> list:
+        main_sections = self._select_main_sections(sections, with_introduction, with_conclusion)
+        if self.max_sections:
+            main_sections = main_sections[:self.max_sections]
+        return main_sections
+
+    def _iter_main_sections(self, topic: str, main_sections: list, key: str | None = None) -> Iterator[str]:
+        """
+        Оформленные основные разделы; key — ключ журнала, если он отличается от темы.
+        """
+        if self.stream_tokens and self.max_workers <= 1:
+            for index, sec in enumerate(main_sections):
+                separator = "\n" if index else ""
+                yield f"{separator}## {sec.get('title', 'Untitled Section')}\n"
+                yield from self._stream_section(topic, main_sections, index, key)
+                yield "\n"
+        else:
+            yield from self._iter_body(main_sections, self._iter_sections(topic, main_sections, key))
+
+    def translate_outline(self, topic: str, main_sections: list, key: str | None = None) -> tuple[str, list]:
+        """
+        Переводит заголовок статьи и ее разделы на язык генератора одним запросом
+        со схемой TranslatedOutline. Возвращает (заголовок, разделы) в том же порядке.
+        """
+        key = key or topic
+        saved = self.journal.get(key, "translation") if self.journal else None
+        if saved is not None:
+            return saved["title"], saved["outline"]
+
+        outline = json.dumps({"title": topic, "outline": main_sections}, ensure_ascii=False)
+        if self.prompts.has("outline_translation_prompt", self.language):
+            user_prompt = self.prompts.render("outline_translation_prompt", self.language, outline=outline)
+        else:
+            user_prompt = DEFAULT_TRANSLATION_PROMPT.format(language=self.language, outline=outline)
+        try:
+            with labels(stage="translation"):
+                translated = self.gpt.chat_with_format(
+                    user_prompt, response_format=TranslatedOutline,
+                    context_policy=self.context_policies.get("translation")
+                )
+        except Exception as e:
+            logger.error("Failed to translate outline to %s: %s", self.language, e)
+            raise ArticleGenerationError(f"Failed to translate outline for topic '{topic}' to {self.language}") from e
+        if len(translated.outline) != len(main_sections):
+            raise ArticleGenerationError(
+                f"Outline translation to {self.language} has {len(translated.outline)} sections "
+                f"instead of {len(main_sections)} for topic '{topic}'"
+            )
+
+        sections = [item.dict() for item in translated.outline]
+        if self.journal:
+            self.journal.put(key, "translation", {"title": translated.title, "outline": sections})
+        logger.info(f"Outline translated to {self.language} for topic: {topic}")
+        return translated.title, sections
+
+    def generate_translations(self, topic: str, languages: list[str]) -> dict[str, str]:
+        """
+        Генерирует статью на нескольких языках по одному системному промпту и outline:
+        outline строится на языке генератора, для остальных языков переводится
+        (заголовок и разделы), а разделы пишутся по шаблонам своего языка.
+        Языки генерируются параллельно. Разделы переводов хранятся в журнале
+        под ключом "тема [ЯЗЫК]". Возвращает статьи по языкам в порядке languages.
+        """
+        if list(dict.fromkeys(languages)) == [self.language]:
+            return {self.language: self.generate_article(topic)}
+        sections = self._prepare(topic)
+        if not sections:
+            sections = self._outline(topic)
+        main_sections = self._main_sections(sections)
+
+        def generate(language: str, generator: "ArticleGenerator") -> str:
+            if language == self.language:
+                title, localized, key = topic, main_sections, None
+            else:
+                key = f"{topic} [{language}]"
+                title, localized = generator.translate_outline(topic, main_sections, key)
+            return "".join([f"# {title}\n\n", *generator._iter_main_sections(title, localized, key), "\n\n"])
+
+        generators = {}
+        for language in dict.fromkeys(languages):
+            generator = self if language == self.language else self._fork()
+            generator.language = language
+            generators[language] = generator
+        with ThreadPoolExecutor(max_workers=len(generators)) as executor:
+            futures = {
+                language: executor.submit(contextvars.copy_context().run, generate, language, generator)
+                for language, generator in generators.items()
+            }
+            try:
+                return {language: future.result() for language, future in futures.items()}
+            except Exception:
+                for future in futures.values():
+                    future.cancel()
+                raise
@@ -0,0 +1,318 @@
+import contextvars
+import copy
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+from article_generator import ArticleGenerator, OutlineResponse
+from gpt_client import json_schema_format, parse_structured_response
+from metrics import labels
+from model_router import Route
+from transport import Transport
+from utils import TopicJob
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_BATCH_DIR = "batches"
+DEFAULT_POLL_INTERVAL = 30.0
+BATCH_ENDPOINT = "/v1/chat/completions"
+# Статусы OpenAI Batch API, после которых опрашивать задание больше не нужно
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+# Ограничения OpenAI Batch API на один входной файл
+MAX_BATCH_REQUESTS = 50_000
+MAX_BATCH_BYTES = 200 * 1024 * 1024
+
+
+class BatchBackend:
+    """
+    Исполнитель пакетов запросов: принимает список строк JSONL
+    (custom_id, method, url, body) и возвращает ответы по custom_id.
+    """
+
+    def submit(self, stage: str, requests: list[dict], stages: dict[str, str] | None = None) -> str:
+        """
+        stages — метки этапа отдельных запросов по custom_id (например, "section 2")
+        для метрик; без метки запрос относится к stage.
+        """
+        raise NotImplementedError
+
+    def status(self, job_id: str) -> str:
+        raise NotImplementedError
+
+    def results(self, job_id: str) -> dict[str, str]:
+        raise NotImplementedError
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """
+    Пакеты через OpenAI Batch API: файл JSONL загружается с purpose="batch",
+    результат скачивается из output_file_id после завершения задания.
+    """
+
+    def __init__(self, client: "OpenAI", directory: str = DEFAULT_BATCH_DIR,
+                 completion_window: str = "24h"):
+        self.client = client
+        self.directory = directory
+        self.completion_window = completion_window
+        os.makedirs(directory, exist_ok=True)
+
+    def submit(self, stage: str, requests: list[dict], stages: dict[str, str] | None = None) -> str:
+        # Большой этап уходит несколькими пакетами в одну секунду: имя файла должно быть уникальным
+        path = os.path.join(self.directory, f"{stage}-{int(time.time())}-{uuid.uuid4().hex[:8]}.jsonl")
+        with open(path, "w", encoding="utf-8") as file:
+            for request in requests:
+                file.write(json.dumps(request, ensure_ascii=False) + "\n")
+
+        with open(path, "rb") as file:
+            input_file = self.client.files.create(file=file, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=self.completion_window,
+            metadata={"stage": stage}
+        )
+        logger.info(f"Submitted batch {batch.id} for stage '{stage}' with {len(requests)} requests")
+        return batch.id
+
+    def status(self, job_id: str) -> str:
+        return self.client.batches.retrieve(job_id).status
+
+    def results(self, job_id: str) -> dict[str, str]:
+        batch = self.client.batches.retrieve(job_id)
+        if not batch.output_file_id:
+            return {}
+
+        results = {}
+        for line in self.client.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            if response.get("status_code") != 200:
+                logger.warning(f"Batch request {record.get('custom_id')} failed: {record.get('error')}")
+                continue
+            results[record["custom_id"]] = response["body"]["choices"][0]["message"]["content"].strip()
+        return results
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    Локальная замена Batch API: выполняет запросы пакета сразу через Transport
+    (с его кэшем и ограничением скорости) в пуле потоков.
+    """
+
+    def __init__(self, transport: Transport, max_workers: int = 8):
+        self.transport = transport
+        self.max_workers = max_workers
+        self._results: dict[str, dict[str, str]] = {}
+
+    def _execute(self, request: dict, stage: str | None) -> str | None:
+        try:
+            with labels(stage=stage):
+                return self.transport.complete(**request["body"])
+        except Exception as e:
+            logger.warning(f"Batch request {request['custom_id']} failed: {e}")
+            return None
+
+    def submit(self, stage: str, requests: list[dict], stages: dict[str, str] | None = None) -> str:
+        job_id = f"local-{stage}-{uuid.uuid4().hex}"
+        stages = stages or {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, self._execute, request,
+                                stages.get(request["custom_id"]))
+                for request in requests
+            ]
+            contents = [future.result() for future in futures]
+        self._results[job_id] = {
+            request["custom_id"]: content
+            for request, content in zip(requests, contents)
+            if content is not None
+        }
+        return job_id
+
+    def status(self, job_id: str) -> str:
+        return "completed"
+
+    def results(self, job_id: str) -> dict[str, str]:
+        return self._results.pop(job_id, {})
+
+
+class BatchRunner:
+    """
+    Пакетный режим генерации: каждый этап конвейера (системные промпты,
+    outline, разделы) для всех тем собирается в один пакет, отправляется
+    в BatchBackend, и его результаты становятся входом следующего этапа.
+
+    Промпты, разбор outline и сборка статьи берутся из ArticleGenerator,
+    поэтому статьи оформлены так же, как в интерактивном режиме, а параметры
+    заданий (язык, модель, число разделов) и модели этапов из router
+    клиента учитываются так же. Раздел видит системный промпт и outline
+    своей темы, но не соседние разделы.
+
+    Этап, не помещающийся в один входной файл (max_requests строк или
+    max_bytes байт JSONL), отправляется несколькими пакетами, результаты
+    которых объединяются по custom_id.
+    """
+
+    def __init__(self, backend: BatchBackend, generator: ArticleGenerator,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 max_requests: int = MAX_BATCH_REQUESTS, max_bytes: int = MAX_BATCH_BYTES):
+        self.backend = backend
+        self.generator = generator
+        self.poll_interval = poll_interval
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+
+    def _job_generator(self, job: TopicJob) -> ArticleGenerator:
+        """
+        Генератор с языком и ограничением разделов задания.
+        """
+        generator = copy.copy(self.generator)
+        generator.language = job.language or self.generator.language
+        generator.max_sections = job.sections or self.generator.max_sections
+        return generator
+
+    def _request(self, custom_id: str, job: TopicJob, stage: str, messages: list[dict], **params) -> dict:
+        gpt = self.generator.gpt
+        model = job.model or gpt.model
+        # Как GPTClient: модель, температура и max_tokens этапа берутся из router
+        route = gpt.router.routes(stage, model, gpt.temperature)[0] if gpt.router else Route(model, gpt.temperature)
+        return {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": {
+                "model": route.model,
+                "messages": messages,
+                "temperature": route.temperature,
+                **route.params(),
+                **params,
+            },
+        }
+
+    def _split(self, requests: list[dict]) -> list[list[dict]]:
+        """
+        Делит запросы этапа на пакеты не больше max_requests строк и max_bytes байт.
+        """
+        batches = [[]]
+        size = 0
+        for request in requests:
+            line_size = len((json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8"))
+            if line_size > self.max_bytes:
+                raise ValueError(f"Batch request {request['custom_id']} is {line_size} bytes, "
+                                 f"over the {self.max_bytes} bytes limit")
+            if len(batches[-1]) >= self.max_requests or size + line_size > self.max_bytes:
+                batches.append([])
+                size = 0
+            batches[-1].append(request)
+            size += line_size
+        return batches
+
+    def _execute(self, stage: str, requests: list[dict], stages: dict[str, str] | None = None) -> dict[str, str]:
+        if not requests:
+            return {}
+        batches = self._split(requests)
+        with labels(stage=stage):
+            job_ids = [self.backend.submit(stage, batch, stages) for batch in batches]
+
+        results = {}
+        for job_id in job_ids:
+            status = self.backend.status(job_id)
+            while status not in TERMINAL_STATUSES:
+                time.sleep(self.poll_interval)
+                status = self.backend.status(job_id)
+            results.update(self.backend.results(job_id))
+            if status != "completed":
+                logger.warning(f"Batch {job_id} of stage '{stage}' finished with status '{status}'")
+
+        logger.info(f"Batch stage '{stage}' finished in {len(batches)} batches: "
+                    f"{len(results)}/{len(requests)} responses")
+        return results
+
+    def run(self, jobs: list[TopicJob]) -> dict[str, str]:
+        """
+        Генерирует статьи для всех заданий и возвращает {тема: текст статьи}.
+        Темы без outline или с неудавшимися разделами в результат не попадают.
+        """
+        prompts = self.generator.prompts
+        generators = [self._job_generator(job) for job in jobs]
+        default_system_prompts = [prompts.text("system_prompt", generator.language) for generator in generators]
+
+        # 1) Системные промпты
+        system_results = self._execute("system_prompt", [
+            self._request(f"system-{i}", job, "system_prompt", [
+                {"role": "system", "content": default_system_prompts[i]},
+                {"role": "user", "content": prompts.render(
+                    "system_prompt_generator", generators[i].language, topic=job.topic
+                )},
+            ])
+            for i, job in enumerate(jobs)
+        ])
+        system_prompts = [system_results.get(f"system-{i}") or default_system_prompts[i] for i in range(len(jobs))]
+
+        # 2) Outline
+        outline_prompts = [
+            prompts.render("outline_prompt", generator.language, topic=job.topic)
+            for job, generator in zip(jobs, generators)
+        ]
+        outline_results = self._execute("outline", [
+            self._request(f"outline-{i}", job, "outline", [
+                {"role": "system", "content": system_prompts[i]},
+                {"role": "user", "content": outline_prompts[i]},
+            ], response_format=json_schema_format(OutlineResponse))
+            for i, job in enumerate(jobs)
+        ])
+
+        outlines = {}
+        for i, job in enumerate(jobs):
+            raw = outline_results.get(f"outline-{i}")
+            try:
+                outline = parse_structured_response(raw, OutlineResponse).outline if raw else []
+                sections = [item.dict() for item in outline]
+            except ValueError as e:
+                logger.warning(f"Invalid outline for topic '{job.topic}': {e}")
+                sections = []
+            if not sections:
+                logger.warning(f"No outline for topic '{job.topic}', skipping")
+                continue
+            outlines[i] = (raw, generators[i]._main_sections(sections))
+
+        # 3) Разделы
+        section_requests = []
+        section_stages = {}
+        for i, (raw, main_sections) in outlines.items():
+            for j, sec in enumerate(main_sections):
+                section_prompt = generators[i]._section_prompt(
+                    jobs[i].topic, sec.get("title", "Untitled Section"), sec.get("subtopics", [])
+                )
+                custom_id = f"section-{i}-{j}"
+                section_stages[custom_id] = f"section {j + 1}"
+                section_requests.append(self._request(custom_id, jobs[i], "section", [
+                    {"role": "system", "content": system_prompts[i]},
+                    {"role": "user", "content": outline_prompts[i]},
+                    {"role": "assistant", "content": raw},
+                    {"role": "user", "content": section_prompt},
+                ]))
+        section_results = self._execute("section", section_requests, section_stages)
+
+        articles = {}
+        for i, (_, main_sections) in outlines.items():
+            topic = jobs[i].topic
+            section_texts = [section_results.get(f"section-{i}-{j}") for j in range(len(main_sections))]
+            missing = sum(text is None for text in section_texts)
+            if missing:
+                # Неполная статья не сохраняется: тема останется незавершенной для --resume
+                logger.warning(f"{missing} sections failed for topic '{topic}', skipping")
+                continue
+            articles[topic] = generators[i].assemble_article(topic, main_sections, section_texts)
+        return articles
@@ -0,0 +1,331 @@
+"""
+Локальный OpenAI-совместимый сервер для тестов и бенчмарков без расходов на API.
+
+    python -m benchmarks.mock_llm_server --port 8089 --latency lognormal:-1.5,0.5 --error-rate 0.02
+
+Отвечает на POST /v1/chat/completions (обычный и потоковый режим):
+запросы outline (в последнем сообщении есть слово "outline" или передан
+response_format) получают готовый JSON с разделами, запросы перевода outline
+(в схеме ответа есть поле title) — outline из запроса, остальные — текст
+заданной длины. Задержка складывается из времени до первого токена
+(распределение --latency) и генерации ответа со скоростью --tokens-per-second.
+Доля ответов 500 и 429 (с Retry-After) задается --error-rate и --rate-limit-rate.
+Кэш промптов провайдера имитируется как у OpenAI: начало запроса, уже
+встречавшееся в предыдущих запросах к той же модели, считается кэшированным
+блоками по --prompt-cache-block токенов, если оно не короче --prompt-cache-min
+токенов, и попадает в usage.prompt_tokens_details.cached_tokens.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+CHARS_PER_TOKEN = 4
+WORDS = (
+    "system model token latency request context section outline article cache "
+    "stream batch queue worker budget prompt response throughput provider retry"
+).split()
+
+
+def parse_latency(spec: str, rng: random.Random | None = None):
+    """
+    Распределение задержки до первого токена, в секундах:
+    fixed:0.2, uniform:0.1,0.5, normal:0.3,0.1 или lognormal:mu,sigma.
+    """
+    rng = rng or random.Random()
+    kind, _, params = spec.partition(":")
+    values = [float(value) for value in params.split(",")] if params else []
+    if kind == "fixed":
+        return lambda: values[0] if values else 0.0
+    if kind == "uniform":
+        return lambda: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda: rng.lognormvariate(values[0], values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+@dataclass
+class MockConfig:
+    latency: str = "fixed:0"
+    tokens_per_second: float | None = None
+    completion_tokens: int = 300
+    outline_sections: int = 5
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: float = 1.0
+    seed: int | None = None
+    # 0 отключает имитацию кэша промптов
+    prompt_cache_min: int = 1024
+    prompt_cache_block: int = 128
+
+
+class MockLLMServer:
+    """
+    Сервер в фоновом потоке: with MockLLMServer(config) as server: server.base_url ...
+    Считает запросы (requests, errors, rate_limited); с keep_requests=True
+    сохраняет тела запросов в received для проверок в тестах.
+    """
+
+    def __init__(self, config: MockConfig | None = None, host: str = "127.0.0.1", port: int = 0,
+                 keep_requests: bool = False):
+        self.config = config or MockConfig()
+        self.keep_requests = keep_requests
+        self._random = random.Random(self.config.seed)
+        self._latency = parse_latency(self.config.latency, self._random)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.received: list[dict] = []
+        self._cached_prefixes: set[bytes] = set()
+
+        server = self
+
+        class Handler(_Handler):
+            mock = server
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "MockLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _roll(self) -> str | None:
+        with self._lock:
+            self.requests += 1
+            roll = self._random.random()
+            if roll < self.config.rate_limit_rate:
+                self.rate_limited += 1
+                return "rate_limited"
+            if roll < self.config.rate_limit_rate + self.config.error_rate:
+                self.errors += 1
+                return "error"
+        return None
+
+    def _content(self, body: dict) -> str:
+        messages = body.get("messages") or []
+        last = (messages[-1].get("content") or "") if messages else ""
+        schema = ((body.get("response_format") or {}).get("json_schema") or {}).get("schema") or {}
+        if "title" in (schema.get("properties") or {}):
+            # Перевод outline: возвращается outline из запроса с пометкой в заголовке
+            try:
+                source = json.loads(last[last.index("{"):])
+                return json.dumps({"title": f"{source['title']} (translated)", "outline": source["outline"]})
+            except (ValueError, KeyError):
+                pass
+        if body.get("response_format") or "outline" in last.lower():
+            return json.dumps({"outline": [
+                {"title": f"Section {i + 1}", "subtopics": [f"Point {i + 1}.{j + 1}" for j in range(3)]}
+                for i in range(self.config.outline_sections)
+            ]})
+        words = max(1, self.config.completion_tokens * CHARS_PER_TOKEN // 7)
+        return " ".join(self._random.choice(WORDS) for _ in range(words))
+
+    def _cached_tokens(self, body: dict) -> int:
+        """
+        Длина самого длинного уже встречавшегося префикса запроса, в токенах
+        (целыми блоками), или 0, если он короче prompt_cache_min.
+        """
+        if not self.config.prompt_cache_min:
+            return 0
+        prompt = "".join(
+            f"{message.get('role')}\n{message.get('content') or ''}\n" for message in body.get("messages") or []
+        )
+        block_chars = self.config.prompt_cache_block * CHARS_PER_TOKEN
+        digest = hashlib.sha1(str(body.get("model")).encode("utf-8"))
+        prefixes = []
+        for end in range(block_chars, len(prompt) + 1, block_chars):
+            digest.update(prompt[end - block_chars:end].encode("utf-8"))
+            prefixes.append(digest.copy().digest())
+        with self._lock:
+            blocks = next((i for i, prefix in enumerate(prefixes) if prefix not in self._cached_prefixes), len(prefixes))
+            self._cached_prefixes.update(prefixes)
+        cached = blocks * self.config.prompt_cache_block
+        return cached if cached >= self.config.prompt_cache_min else 0
+
+    def _usage(self, body: dict, content: str) -> dict:
+        prompt_chars = sum(len(message.get("content") or "") for message in body.get("messages") or [])
+        prompt_tokens = prompt_chars // CHARS_PER_TOKEN
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": max(1, len(content) // CHARS_PER_TOKEN),
+            "total_tokens": prompt_tokens + max(1, len(content) // CHARS_PER_TOKEN),
+            "prompt_tokens_details": {"cached_tokens": min(prompt_tokens, self._cached_tokens(body))},
+        }
+
+    def _generation_time(self, content: str) -> float:
+        if not self.config.tokens_per_second:
+            return 0.0
+        return len(content) / CHARS_PER_TOKEN / self.config.tokens_per_second
+
+
+class _Handler(BaseHTTPRequestHandler):
+    mock: MockLLMServer
+    protocol_version = "HTTP/1.1"
+    # Заголовки и тело уходят отдельными записями: без этого задержанный ACK добавляет ~40 мс к ответу
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _send_json(self, status: int, payload: dict, headers: dict | None = None) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self) -> None:
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        mock = self.mock
+        if mock.keep_requests:
+            with mock._lock:
+                mock.received.append(body)
+
+        with mock._lock:
+            latency = mock._latency()
+        time.sleep(latency)
+        outcome = mock._roll()
+        if outcome == "rate_limited":
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}},
+                            headers={"retry-after": str(mock.config.retry_after)})
+            return
+        if outcome == "error":
+            self._send_json(500, {"error": {"message": "Internal server error", "type": "server_error"}})
+            return
+
+        content = mock._content(body)
+        usage = mock._usage(body, content)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        if body.get("stream"):
+            self._stream(body, completion_id, content, usage)
+            return
+
+        time.sleep(mock._generation_time(content))
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model") or "mock",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        })
+
+    def _stream(self, body: dict, completion_id: str, content: str, usage: dict) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        def event(choices: list, chunk_usage: dict | None = None) -> None:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model") or "mock",
+                "choices": choices,
+            }
+            if chunk_usage is not None:
+                chunk["usage"] = chunk_usage
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        pieces = [content[i:i + 4 * CHARS_PER_TOKEN] for i in range(0, len(content), 4 * CHARS_PER_TOKEN)]
+        pause = self.mock._generation_time(content) / max(1, len(pieces))
+        for piece in pieces:
+            time.sleep(pause)
+            event([{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+        event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (body.get("stream_options") or {}).get("include_usage"):
+            event([], usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = MockConfig()
+    parser.add_argument("--latency", default=defaults.latency,
+                        help="time to first token: fixed:S, uniform:A,B, normal:MU,SD or lognormal:MU,SIGMA")
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second)
+    parser.add_argument("--completion-tokens", type=int, default=defaults.completion_tokens)
+    parser.add_argument("--outline-sections", type=int, default=defaults.outline_sections)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--rate-limit-rate", type=float, default=defaults.rate_limit_rate)
+    parser.add_argument("--retry-after", type=float, default=defaults.retry_after)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--prompt-cache-min", type=int, default=defaults.prompt_cache_min,
+                        help="minimum cached prefix in tokens, 0 disables prompt cache simulation")
+    parser.add_argument("--prompt-cache-block", type=int, default=defaults.prompt_cache_block)
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        outline_sections=args.outline_sections,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        seed=args.seed,
+        prompt_cache_min=args.prompt_cache_min,
+        prompt_cache_block=args.prompt_cache_block,
+    )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = MockLLMServer(config_from_args(args), host=args.host, port=args.port)
+    print(f"Mock LLM server listening on {server.base_url} (set OPENAI_BASE_URL to use it)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
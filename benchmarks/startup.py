@@ -0,0 +1,57 @@
+"""
+Время старта процесса: сколько стоит импорт модулей генератора.
+
+    python -m benchmarks.startup [--runs 10]
+
+Каждый замер — отдельный интерпретатор, поэтому учитывается холодный импорт,
+как у короткоживущего воркера или запуска из CLI. Для сравнения замеряется
+пустой интерпретатор и импорт самого openai.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = {
+    "python": "pass",
+    "gpt_client": "import gpt_client",
+    "summarizer": "import summarizer",
+    "main": "import main",
+    "openai (reference)": "import openai",
+}
+
+CHECK = "import sys, main; print(int('openai' in sys.modules))"
+
+
+def measure(code: str, runs: int) -> list[float]:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Measure interpreter startup with the generator modules imported")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    baseline = statistics.median(measure(CASES["python"], args.runs))
+    print(f"{'case':<20} {'median ms':>10} {'over python':>12}")
+    for name, code in CASES.items():
+        median = statistics.median(measure(code, args.runs))
+        print(f"{name:<20} {median * 1000:>10.1f} {(median - baseline) * 1000:>12.1f}")
+
+    loaded = subprocess.run([sys.executable, "-c", CHECK], cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout.strip()
+    print(f"openai imported by 'import main': {'yes' if loaded == '1' else 'no'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Сквозной бенчмарк пропускной способности на локальном mock-сервере.
+
+    python -m benchmarks.throughput --topics 40 --article-workers 8 --section-workers 4 \
+        --latency lognormal:-1.2,0.4 --tokens-per-second 80
+
+Запускает пакет ArticleGenerator.generate_article так же, как main.py
+(BatchScheduler, общий транспорт, провайдер системных промптов, политики
+контекста), против benchmarks/mock_llm_server.py и печатает статьи в минуту,
+p50/p99 задержки по этапам из MetricsRecorder и пиковую память.
+Параметры сервера (задержки, ошибки, скорость токенов) — как у mock_llm_server.
+"""
+import argparse
+import json
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.mock_llm_server import MockLLMServer, add_arguments, config_from_args
+from context_policy import Stateless, TokenBudget
+from metrics import MetricsRecorder, labels
+from prompt_registry import PromptRegistry
+from response_cache import ResponseCache
+from retry import RetryPolicy
+from scheduler import BatchScheduler
+from settings import ClientFactory, Settings
+from system_prompts import ClientPool, SystemPromptProvider
+from transport import Transport
+
+
+LANGUAGE = "EN"
+# Шаблоны, похожие по размеру на боевые; слово outline есть только в запросе outline
+PROMPTS = {
+    "system_prompt": "You are an experienced technical writer. Write clear, accurate, well structured text.",
+    "system_prompt_generator": "Write a system prompt for an expert who writes an article about {topic}.",
+    "outline_prompt": "Create a JSON outline for an article about {topic} with sections and subtopics.",
+    "introduction_prompt": "Write an introduction for an article about {topic}.",
+    "subtopics_prompt": "Write the section '{section_title}' of an article about {topic}. Cover:\n{bullets}",
+    "conclusion_prompt": "Write a conclusion for an article about {topic}.",
+}
+
+
+def write_prompts(directory: str) -> None:
+    for name, text in PROMPTS.items():
+        with open(os.path.join(directory, f"{name}_{LANGUAGE}.txt"), "w", encoding="utf-8") as file:
+            file.write(text)
+
+
+def run_benchmark(args: argparse.Namespace) -> dict:
+    """
+    Выполняет args.repeat прогонов одного пакета тем и возвращает сводку последнего.
+    """
+    with tempfile.TemporaryDirectory() as workdir, MockLLMServer(config_from_args(args)) as server:
+        write_prompts(workdir)
+        prompts = PromptRegistry(workdir, languages=[LANGUAGE])
+        cache = ResponseCache(os.path.join(workdir, "cache.sqlite")) if args.cache else None
+        transport = Transport(
+            "sk-mock", base_url=server.base_url, max_connections=args.max_connections,
+            cache=cache, retry_policy=RetryPolicy(base_delay=0.05, max_delay=1.0)
+        )
+        clients = ClientFactory(Settings(openai_api_key="sk-mock", model_advanced="mock-model"), transport=transport)
+        pool = ClientPool(lambda: clients.gpt_client(context_policy=Stateless(), system_prompt=""))
+        context_policies = {"section": TokenBudget(6000, keep_first=2, trim_step=8)}
+        base_prompt = prompts.text("system_prompt", LANGUAGE)
+        topics = [f"Benchmark topic {i}" for i in range(args.topics)]
+
+        def process(topic: str) -> None:
+            generator = clients.article_generator(
+                LANGUAGE, gpt=clients.gpt_client(
+                    system_prompt=base_prompt, prefix=[{"role": "system", "content": base_prompt}]
+                ),
+                max_workers=args.section_workers, context_policies=context_policies,
+                prompts=prompts, system_prompts=system_prompts, pipeline_outline=args.pipeline_outline
+            )
+            with labels(article=topic):
+                generator.generate_article(topic)
+
+        if args.tracemalloc:
+            tracemalloc.start()
+        for _ in range(args.repeat):
+            # Каждый прогон — как новый запуск main.py: свои метрики и системные промпты
+            metrics = transport.metrics = MetricsRecorder(per_article=False)
+            system_prompts = SystemPromptProvider(prompts, pool=pool)
+            report = BatchScheduler(max_concurrency=args.article_workers).run(topics, process, total=len(topics))
+        python_peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+        if args.tracemalloc:
+            tracemalloc.stop()
+        transport.close()
+        if cache is not None:
+            cache.close()
+
+        return {
+            "topics": args.topics,
+            "succeeded": report.succeeded,
+            "failed": report.failed,
+            "elapsed_seconds": round(report.elapsed, 3),
+            "articles_per_minute": round(report.articles_per_minute, 2),
+            "requests": server.requests,
+            "server_errors": server.errors + server.rate_limited,
+            "stages": metrics.snapshot()["run"],
+            # ru_maxrss в Linux — в килобайтах
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "python_peak_mb": round(python_peak / 2 ** 20, 1) if python_peak is not None else None,
+        }
+
+
+def print_report(result: dict) -> None:
+    print(f"Articles: {result['succeeded']}/{result['topics']} in {result['elapsed_seconds']:.1f}s "
+          f"({result['articles_per_minute']:.1f} articles/min), {result['failed']} failed")
+    print(f"Mock server: {result['requests']} requests, {result['server_errors']} injected errors")
+    print(f"{'stage':<16} {'calls':>7} {'p50 s':>8} {'p99 s':>8} {'retries':>8} {'cache':>6} {'tokens':>9}")
+    for stage, stats in sorted(result["stages"].items()):
+        tokens = stats["prompt_tokens"] + stats["completion_tokens"]
+        print(f"{stage:<16} {stats['calls']:>7} {stats['latency_p50']:>8.3f} {stats['latency_p99']:>8.3f} "
+              f"{stats['retries']:>8} {stats['cache_hits']:>6} {tokens:>9}")
+    memory = f"Peak RSS: {result['peak_rss_mb']} MB"
+    if result["python_peak_mb"] is not None:
+        memory += f", Python heap peak: {result['python_peak_mb']} MB"
+    print(memory)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="End-to-end article throughput against the mock LLM server")
+    parser.add_argument("--topics", type=int, default=20)
+    parser.add_argument("--article-workers", type=int, default=4)
+    parser.add_argument("--section-workers", type=int, default=4)
+    parser.add_argument("--max-connections", type=int, default=100)
+    parser.add_argument("--pipeline-outline", action="store_true",
+                        help="start sections while the outline is still streaming")
+    parser.add_argument("--cache", action="store_true", help="use a ResponseCache (in a temporary directory)")
+    parser.add_argument("--repeat", type=int, default=1, help="run the batch N times; with --cache later runs hit it")
+    parser.add_argument("--tracemalloc", action="store_true", help="also report the Python heap peak (slower)")
+    parser.add_argument("--json", help="write the report to this file")
+    add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    started = time.perf_counter()
+    result = run_benchmark(args)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(result, file, indent=2)
+    print(f"Total wall time: {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
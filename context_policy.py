@@ -0,0 +1,151 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from rate_limiter import CHARS_PER_TOKEN
+
+
+logger = logging.getLogger(__name__)
+
+
+# Служебные токены, которые API добавляет к каждому сообщению
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_CACHE_SIZE = 256
+
+
+def message_tokens(message: dict) -> int:
+    return len(message.get("content") or "") // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+
+def _split(conversation: list[dict], keep_first: int) -> tuple[list[dict], list[dict], list[dict]]:
+    """
+    Делит conversation на системные сообщения в начале, первые keep_first
+    сообщений диалога (например, outline) и остальную историю.
+    """
+    head = 0
+    while head < len(conversation) and conversation[head]["role"] == "system":
+        head += 1
+    pinned = conversation[head:head + keep_first]
+    return conversation[:head], pinned, conversation[head + keep_first:]
+
+
+class ContextPolicy:
+    """
+    Политика контекста: решает, какие сообщения из conversation отправить в API.
+    Базовая реализация отправляет всю историю.
+    """
+
+    def build(self, conversation: list[dict]) -> list[dict]:
+        return list(conversation)
+
+
+class FullHistory(ContextPolicy):
+    """
+    Вся история разговора (исходное поведение GPTClient).
+    """
+
+
+class Stateless(ContextPolicy):
+    """
+    Только системные сообщения и текущий запрос.
+    """
+
+    def build(self, conversation: list[dict]) -> list[dict]:
+        system, _, rest = _split(conversation, 0)
+        return system + rest[-1:]
+
+
+class SlidingWindow(ContextPolicy):
+    """
+    Системные сообщения, первые keep_first сообщений диалога
+    и последние max_messages сообщений (включая текущий запрос).
+    """
+
+    def __init__(self, max_messages: int = 4, keep_first: int = 0):
+        self.max_messages = max(1, max_messages)
+        self.keep_first = keep_first
+
+    def build(self, conversation: list[dict]) -> list[dict]:
+        system, pinned, rest = _split(conversation, self.keep_first)
+        return system + pinned + rest[-self.max_messages:]
+
+
+class TokenBudget(ContextPolicy):
+    """
+    Как SlidingWindow, но окно ограничено не числом сообщений,
+    а оценкой входных токенов: берутся самые свежие сообщения, пока они
+    помещаются в max_tokens. Текущий запрос отправляется всегда.
+
+    trim_step > 1 сдвигает начало окна сразу на trim_step сообщений (считая
+    от начала истории), а не на одно при каждом запросе: несколько запросов
+    подряд начинаются с одних и тех же сообщений и попадают в кэш промптов
+    провайдера, ценой чуть более короткого окна.
+    """
+
+    def __init__(self, max_tokens: int = 4000, keep_first: int = 0, trim_step: int = 1):
+        self.max_tokens = max_tokens
+        self.keep_first = keep_first
+        self.trim_step = max(1, trim_step)
+
+    def build(self, conversation: list[dict]) -> list[dict]:
+        system, pinned, rest = _split(conversation, self.keep_first)
+        budget = self.max_tokens - sum(message_tokens(m) for m in system + pinned)
+        size = 0
+        for message in reversed(rest):
+            cost = message_tokens(message)
+            if size and cost > budget:
+                break
+            size += 1
+            budget -= cost
+        start = len(rest) - size
+        if start:
+            start = min(-(-start // self.trim_step) * self.trim_step, len(rest) - 1)
+        return system + pinned + rest[start:]
+
+
+class RollingSummary(ContextPolicy):
+    """
+    Последние keep_last сообщений отправляются как есть, а все более ранние
+    сжимаются в краткое summary через Summarizer и передаются одним
+    системным сообщением. Summary кэшируется, поэтому один и тот же
+    фрагмент истории не пересказывается повторно.
+    """
+
+    def __init__(self, summarizer, keep_last: int = 2, keep_first: int = 0):
+        self.summarizer = summarizer
+        self.keep_last = max(1, keep_last)
+        self.keep_first = keep_first
+        self._lock = threading.Lock()
+        self._summaries: OrderedDict[str, str] = OrderedDict()
+
+    def _summarize(self, messages: list[dict]) -> str:
+        text = "\n\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            if key in self._summaries:
+                self._summaries.move_to_end(key)
+                return self._summaries[key]
+
+        summary = self.summarizer.summarize(text)
+        with self._lock:
+            self._summaries[key] = summary
+            if len(self._summaries) > SUMMARY_CACHE_SIZE:
+                self._summaries.popitem(last=False)
+        return summary
+
+    def build(self, conversation: list[dict]) -> list[dict]:
+        system, pinned, rest = _split(conversation, self.keep_first)
+        earlier, recent = rest[:-self.keep_last], rest[-self.keep_last:]
+        if not earlier:
+            return system + pinned + recent
+
+        try:
+            summary = self._summarize(earlier)
+        except Exception as e:
+            # Без summary продолжаем с окном последних сообщений
+            logger.warning(f"Failed to summarize earlier context: {e}")
+            return system + pinned + recent
+
+        summary_message = {"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"}
+        return system + pinned + [summary_message] + recent
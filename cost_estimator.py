@@ -0,0 +1,370 @@
+import functools
+import logging
+import re
+from dataclasses import dataclass, replace
+from typing import Iterable, Iterator
+
+from article_generator import DEFAULT_TRANSLATION_PROMPT
+from context_policy import MESSAGE_OVERHEAD_TOKENS
+from model_router import ModelRouter
+from prompt_registry import PromptRegistry
+from rate_limiter import CHARS_PER_TOKEN
+from utils import TopicJob
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ModelPrice:
+    """
+    Цены в долларах за 1M токенов. cached_input — вход, взятый из кэша
+    промптов провайдера; у моделей без кэширования он равен input.
+    """
+    input: float
+    cached_input: float
+    output: float
+
+
+# Цены OpenAI; датированные версии моделей ("gpt-4o-2024-08-06")
+# ищутся по самому длинному совпадающему префиксу
+MODEL_PRICES = {
+    "gpt-4o": ModelPrice(input=2.50, cached_input=1.25, output=10.00),
+    "gpt-4o-mini": ModelPrice(input=0.15, cached_input=0.075, output=0.60),
+    "gpt-4.1": ModelPrice(input=2.00, cached_input=0.50, output=8.00),
+    "gpt-4.1-mini": ModelPrice(input=0.40, cached_input=0.10, output=1.60),
+    "gpt-4.1-nano": ModelPrice(input=0.10, cached_input=0.025, output=0.40),
+    "gpt-4-turbo": ModelPrice(input=10.00, cached_input=10.00, output=30.00),
+    "gpt-3.5-turbo": ModelPrice(input=0.50, cached_input=0.50, output=1.50),
+}
+
+
+def model_price(model: str | None) -> ModelPrice | None:
+    if not model:
+        return None
+    matches = [name for name in MODEL_PRICES if model == name or model.startswith(f"{name}-")]
+    return MODEL_PRICES[max(matches, key=len)] if matches else None
+
+
+def cost_usd(model: str | None, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> float | None:
+    """
+    Стоимость запроса(ов) в долларах или None, если цена модели неизвестна.
+    cached_tokens — часть input_tokens, взятая из кэша промптов провайдера.
+    """
+    price = model_price(model)
+    if price is None:
+        return None
+    input_cost = (input_tokens - cached_tokens) * price.input + cached_tokens * price.cached_input
+    return (input_cost + output_tokens * price.output) / 1_000_000
+
+
+def models_cost(models: dict[str, dict]) -> tuple[float, list[str]]:
+    """
+    Стоимость по агрегатам метрик по моделям (MetricsRecorder.snapshot()["models"]):
+    сумма по известным ценам и список моделей с токенами, но без цены.
+    """
+    total = 0.0
+    unpriced = []
+    for model, stats in models.items():
+        cost = cost_usd(model, stats["prompt_tokens"], stats["completion_tokens"], stats["cached_tokens"])
+        if cost is not None:
+            total += cost
+        elif stats["prompt_tokens"] or stats["completion_tokens"]:
+            unpriced.append(model)
+    return total, unpriced
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding(model: str | None):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model or "")
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+class TokenCounter:
+    """
+    Подсчет токенов токенизатором модели (tiktoken, если установлен)
+    или приближенно — по CHARS_PER_TOKEN символов на токен.
+    """
+
+    def __init__(self, model: str | None = None):
+        self.model = model
+        self._encoding = _encoding(model)
+
+    @property
+    def exact(self) -> bool:
+        return self._encoding is not None
+
+    def count(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return len(text) // CHARS_PER_TOKEN
+
+    def count_messages(self, messages: Iterable[dict]) -> int:
+        return sum(self.count(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+
+def split_text(text: str, max_tokens: int, counter: TokenCounter) -> list[str]:
+    """
+    Делит текст на куски не длиннее max_tokens: по абзацам, длинные абзацы —
+    по предложениям, а слишком длинные предложения — по символам.
+    """
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        if counter.count(paragraph) <= max_tokens:
+            pieces.append(paragraph)
+            continue
+        for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+            if counter.count(sentence) <= max_tokens:
+                pieces.append(sentence)
+                continue
+            step = max(1, max_tokens * CHARS_PER_TOKEN)
+            pieces.extend(sentence[i:i + step] for i in range(0, len(sentence), step))
+
+    chunks, current = [], []
+    for piece in pieces:
+        # Считается весь кусок целиком: разделители и округление тоже дают токены
+        if current and counter.count("\n\n".join([*current, piece])) > max_tokens:
+            chunks.append("\n\n".join(current))
+            current = []
+        current.append(piece)
+    if current:
+        chunks.append("\n\n".join(current))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+@dataclass
+class CostEstimate:
+    """
+    Прогноз для одной темы: токены всех запросов статьи и их стоимость.
+    """
+    topic: str
+    model: str | None
+    sections: int
+    input_tokens: int
+    output_tokens: int
+    cost: float | None
+
+
+@dataclass
+class RunEstimate:
+    """
+    Сумма прогнозов по всем темам запуска (без хранения прогнозов каждой темы).
+    """
+    topics: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost: float = 0.0
+    unpriced_topics: int = 0
+
+    def add(self, estimate: CostEstimate) -> None:
+        self.topics += 1
+        self.input_tokens += estimate.input_tokens
+        self.output_tokens += estimate.output_tokens
+        if estimate.cost is None:
+            self.unpriced_topics += 1
+        else:
+            self.cost += estimate.cost
+
+
+class CostEstimator:
+    """
+    Оценивает токены и стоимость статьи до запуска по тем же шаблонам из prompts/,
+    что использует ArticleGenerator: генерация системного промпта, outline
+    и запрос на каждый раздел. Ответы модели оцениваются ожидаемыми размерами
+    (outline_tokens, section_tokens, system_prompt_tokens).
+    history_tokens — сколько токенов предыдущих разделов видит запрос раздела:
+    0 при параллельной генерации (каждый раздел видит только outline),
+    иначе — бюджет политики контекста "section".
+    router — маршрутизация моделей по этапам, как у GPT-клиентов запуска:
+    каждый этап оценивается по цене своей модели.
+    output_languages — дополнительные языки статьи (как OUTPUT_LANGUAGES в main.py):
+    на каждый добавляется перевод outline (этап "translation") и все разделы
+    по шаблонам этого языка.
+    """
+
+    def __init__(self, prompts: PromptRegistry, language: str, model: str | None,
+                 sections: int = 6, subtopics: int = 3, system_prompt_tokens: int = 300,
+                 outline_tokens: int = 500, section_tokens: int = 700, history_tokens: int = 0,
+                 router: ModelRouter | None = None, output_languages: Iterable[str] = ()):
+        self.prompts = prompts
+        self.language = language
+        self.model = model
+        self.sections = sections
+        self.subtopics = subtopics
+        self.system_prompt_tokens = system_prompt_tokens
+        self.outline_tokens = outline_tokens
+        self.section_tokens = section_tokens
+        self.history_tokens = history_tokens
+        self.router = router
+        self.output_languages = list(output_languages)
+        self._counters: dict[str | None, TokenCounter] = {}
+
+    def _counter(self, model: str | None) -> TokenCounter:
+        if model not in self._counters:
+            self._counters[model] = TokenCounter(model)
+        return self._counters[model]
+
+    def stage_model(self, stage: str, model: str | None) -> str | None:
+        """
+        Модель запросов этапа: модель профиля router или model.
+        """
+        profile_model = self.router.profile(stage).model if self.router else None
+        return profile_model or model
+
+    def languages(self, language: str | None = None) -> list[str]:
+        """
+        Языки статьи: ее язык и дополнительные, как main.article_languages.
+        """
+        language = language or self.language
+        return [language, *(other for other in self.output_languages if other != language)]
+
+    def models(self, model: str | None = None) -> set[str | None]:
+        """
+        Модели, на которые пойдут запросы статьи с моделью model.
+        """
+        model = model or self.model
+        stages = ("outline", "section", "translation") if self.output_languages else ("outline", "section")
+        return {self.stage_model("system_prompt", self.model), *(self.stage_model(stage, model) for stage in stages)}
+
+    def estimate(self, topic: str, sections: int | None = None, model: str | None = None,
+                 language: str | None = None) -> CostEstimate:
+        model = model or self.model
+        language = language or self.language
+        sections = self.sections if sections is None else sections
+        counter = self._counter(model)
+        render = functools.partial(self.prompts.render, language=language, topic=topic)
+        base_system = counter.count(self.prompts.text("system_prompt", language)) + MESSAGE_OVERHEAD_TOKENS
+        overhead = MESSAGE_OVERHEAD_TOKENS
+        # Токены (вход, выход) по моделям этапов
+        usage: dict[str | None, list[int]] = {}
+
+        def add(stage_model: str | None, input_tokens: int, output_tokens: int) -> None:
+            totals = usage.setdefault(stage_model, [0, 0])
+            totals[0] += input_tokens
+            totals[1] += output_tokens
+
+        # Системный промпт темы генерирует отдельный клиент запуска с системным промптом по умолчанию
+        add(self.stage_model("system_prompt", self.model),
+            base_system + counter.count(render("system_prompt_generator")) + overhead, self.system_prompt_tokens)
+
+        system = self.system_prompt_tokens + overhead
+        outline_request = counter.count(render("outline_prompt")) + overhead
+        add(self.stage_model("outline", model), system + outline_request, self.outline_tokens)
+
+        bullets = "\n".join(f"- Subtopic {j + 1}" for j in range(self.subtopics))
+        section_model = self.stage_model("section", model)
+        # Запросы разделов и перевода видят системный промпт и обмен с outline
+        context = system + outline_request + self.outline_tokens + overhead
+        for index, output_language in enumerate(self.languages(language)):
+            if index:
+                # Outline (около outline_tokens) переводится на язык версии одним запросом
+                if self.prompts.has("outline_translation_prompt", output_language):
+                    translation = self.prompts.render("outline_translation_prompt", output_language, outline="")
+                else:
+                    translation = DEFAULT_TRANSLATION_PROMPT.format(language=output_language, outline="")
+                add(self.stage_model("translation", model),
+                    context + counter.count(translation) + self.outline_tokens + overhead, self.outline_tokens)
+            for section in range(sections):
+                section_prompt = self.prompts.render(
+                    "subtopics_prompt", output_language, topic=topic,
+                    section_title=f"Section {section + 1}", bullets=bullets
+                )
+                history = min(self.history_tokens, section * (self.section_tokens + 2 * overhead))
+                add(section_model, context + history + counter.count(section_prompt) + overhead,
+                    self.section_tokens)
+
+        costs = [cost_usd(stage_model, *totals) for stage_model, totals in usage.items()]
+        return CostEstimate(
+            topic, model, sections,
+            sum(totals[0] for totals in usage.values()), sum(totals[1] for totals in usage.values()),
+            None if None in costs else sum(costs)
+        )
+
+    def estimate_job(self, job: TopicJob) -> CostEstimate:
+        return self.estimate(job.topic, job.sections, job.model, job.language)
+
+    def estimate_run(self, jobs: Iterable[TopicJob]) -> RunEstimate:
+        run = RunEstimate()
+        for job in jobs:
+            estimate = self.estimate_job(job)
+            logger.info(
+                f"Estimate for '{job.topic}': {estimate.sections} sections, "
+                f"{estimate.input_tokens} input + {estimate.output_tokens} output tokens"
+                + (f", ${estimate.cost:.4f}" if estimate.cost is not None else "")
+            )
+            run.add(estimate)
+        return run
+
+
+class BudgetPlanner:
+    """
+    Жесткий бюджет запуска в долларах. plan() пропускает темы по порядку,
+    пока их прогнозируемая стоимость помещается в остаток бюджета; тема,
+    которая не помещается, сначала сокращается до min_sections разделов,
+    затем переводится на fallback_model (если задана), а если и так дорого —
+    пропускается. Потраченное учитывается по прогнозу, а не по факту.
+    Задание всегда получает явное число разделов: генератор не напишет больше,
+    чем заложено в бюджет, даже если outline окажется длиннее.
+    Модель без известной цены в бюджет не укладывается: для модели по умолчанию
+    и fallback_model это ValueError при создании, тема с такой моделью пропускается.
+    """
+
+    def __init__(self, estimator: CostEstimator, budget_usd: float, fallback_model: str | None = None,
+                 min_sections: int = 3):
+        models = estimator.models() | (estimator.models(fallback_model) if fallback_model else set())
+        for model in models:
+            if model_price(model) is None:
+                raise ValueError(f"No price for model '{model}', a USD budget cannot be enforced")
+        self.estimator = estimator
+        self.budget_usd = budget_usd
+        self.fallback_model = fallback_model
+        self.min_sections = min_sections
+        self.planned_cost = 0.0
+        self.trimmed = 0
+        self.downgraded = 0
+        self.skipped = 0
+
+    def _candidates(self, job: TopicJob) -> Iterator[TopicJob]:
+        sections = job.sections or self.estimator.sections
+        yield replace(job, sections=sections)
+        for count in range(sections - 1, self.min_sections - 1, -1):
+            yield replace(job, sections=count)
+        if self.fallback_model and self.fallback_model != (job.model or self.estimator.model):
+            yield replace(job, model=self.fallback_model, sections=sections)
+            for count in range(sections - 1, self.min_sections - 1, -1):
+                yield replace(job, model=self.fallback_model, sections=count)
+
+    def fit(self, job: TopicJob) -> TopicJob | None:
+        """
+        Возвращает задание (возможно, сокращенное или на другой модели),
+        укладывающееся в остаток бюджета, и резервирует его стоимость; иначе None.
+        """
+        remaining = self.budget_usd - self.planned_cost
+        sections = job.sections or self.estimator.sections
+        for candidate in self._candidates(job):
+            estimate = self.estimator.estimate_job(candidate)
+            if estimate.cost is None:
+                logger.warning(f"No price for model '{estimate.model}', topic '{job.topic}' cannot be budgeted")
+                continue
+            if estimate.cost <= remaining:
+                self.planned_cost += estimate.cost
+                if candidate.model != job.model:
+                    self.downgraded += 1
+                elif candidate.sections != sections:
+                    self.trimmed += 1
+                return candidate
+        self.skipped += 1
+        logger.warning(f"Topic '{job.topic}' does not fit the remaining budget (${remaining:.4f}), skipping")
+        return None
+
+    def plan(self, jobs: Iterable[TopicJob]) -> Iterator[TopicJob]:
+        for job in jobs:
+            planned = self.fit(job)
+            if planned is not None:
+                yield planned
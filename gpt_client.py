@@ -1,23 +1,134 @@
-from dotenv import dotenv_values
-from openai import OpenAI
 from utils import load_prompts
+from settings import get_settings, legacy_setting
+from transport import Transport, AsyncTransport, get_transport, get_async_transport
+from context_policy import ContextPolicy, FullHistory
+from metrics import current_stage
+from model_router import ModelRouter, Route, is_fallback_error
 from pydantic import BaseModel
-import json
+import copy
+import functools
 import logging
+from typing import AsyncIterator, Iterator
 
 
 logger = logging.getLogger(__name__)
-config = dotenv_values(".env")
 
 
-MODEL_ADVANCED = config["MODEL_ADVANCED"]
-TEMPERATURE = float(config["TEMPERATURE"])
-OPENAI_API_KEY = config["OPENAI_API_KEY"]
-SYSTEM_PROMPT = load_prompts("prompts/system_prompt_EN.txt")
+SYSTEM_PROMPT_FILE = "prompts/system_prompt_EN.txt"
 
-CLIENT = OpenAI(
-    api_key=OPENAI_API_KEY
-)
+
+def __getattr__(name: str):
+    # MODEL_ADVANCED, TEMPERATURE, OPENAI_API_KEY читаются из настроек при обращении
+    return legacy_setting(__name__, name)
+
+
+@functools.lru_cache(maxsize=None)
+def default_system_prompt() -> str:
+    """
+    Системный промпт по умолчанию; файл читается один раз при первом создании клиента.
+    """
+    return load_prompts(SYSTEM_PROMPT_FILE)
+
+
+@functools.lru_cache(maxsize=None)
+def json_schema_format(response_format: type[BaseModel]) -> dict:
+    """
+    response_format для Structured Outputs: строгая JSON-схема Pydantic-модели.
+    В строгом режиме API требует перечислить все поля объекта в required
+    и запретить лишние поля (additionalProperties: false).
+    """
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": response_format.__name__,
+            "strict": True,
+            "schema": _strict_schema(response_format.schema()),
+        },
+    }
+
+
+def _strict_schema(node):
+    if isinstance(node, list):
+        return [_strict_schema(value) for value in node]
+    if not isinstance(node, dict):
+        return node
+    node = {key: _strict_schema(value) for key, value in node.items()}
+    if node.get("type") == "object" and isinstance(node.get("properties"), dict):
+        node["additionalProperties"] = False
+        node["required"] = list(node["properties"])
+    return node
+
+
+def parse_structured_response(assistant_message: str, response_format: type[BaseModel]) -> BaseModel:
+    """
+    Проверяет ответ модели по Pydantic-модели за один разбор. Если модель
+    обернула JSON в ```json или текст, разбирается вырезанный JSON-объект.
+    Бросает ValueError, если ответ не соответствует схеме.
+    """
+    try:
+        return response_format.parse_raw(assistant_message)
+    except ValueError as e:
+        error = e
+
+    start, end = assistant_message.find("{"), assistant_message.rfind("}")
+    if 0 <= start < end and (start, end) != (0, len(assistant_message) - 1):
+        try:
+            return response_format.parse_raw(assistant_message[start:end + 1])
+        except ValueError as e:
+            error = e
+    raise ValueError(f"Response does not match {response_format.__name__}: {error}")
+
+
+def _repair_prompt(error: Exception) -> str:
+    # Текст ошибки валидации помогает модели исправить ответ; длинные сообщения обрезаются
+    return (
+        "Your previous reply does not match the required JSON schema: "
+        f"{str(error)[:500]}\nReply again with only the corrected JSON object."
+    )
+
+
+class _StreamStripper:
+    """
+    Потоковый аналог str.strip(): отбрасывает пробелы в начале ответа и
+    придерживает пробельные куски, пока не станет ясно, что это не конец текста.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.pending = ""
+
+    def feed(self, delta: str) -> str | None:
+        """
+        Часть ответа, которую можно отдать, или None, если отдавать пока нечего.
+        """
+        if not self.started:
+            delta = delta.lstrip()
+            if not delta:
+                return None
+            self.started = True
+        stripped = delta.rstrip()
+        if not stripped:
+            self.pending += delta
+            return None
+        part = self.pending + stripped
+        self.pending = delta[len(stripped):]
+        return part
+
+
+def _strip_stream(deltas: Iterator[str]) -> Iterator[str]:
+    stripper = _StreamStripper()
+    for delta in deltas:
+        part = stripper.feed(delta)
+        if part is not None:
+            yield part
+
+
+async def _strip_stream_async(deltas: AsyncIterator[str]) -> AsyncIterator[str]:
+    stripper = _StreamStripper()
+    async for delta in deltas:
+        part = stripper.feed(delta)
+        if part is not None:
+            yield part
 
 
 class GPTClient:
@@ -26,14 +137,35 @@ class GPTClient:
     чтобы модель имела контекст на каждом шаге.
     """
 
-    def __init__(self, model: str = MODEL_ADVANCED, temperature: float = TEMPERATURE):
-        self.model = model
-        self.temperature = temperature
+    def __init__(self, model: str | None = None, temperature: float | None = None,
+                 transport: Transport | None = None, context_policy: ContextPolicy | None = None,
+                 system_prompt: str | None = None, router: ModelRouter | None = None,
+                 prefix: list[dict] | None = None):
+        """
+        Незаданные model, temperature и transport берутся из settings.get_settings()
+        и общего транспорта процесса.
+        router выбирает модель, температуру и max_tokens по текущему этапу
+        (labels(stage=...)); без него все запросы идут на model.
+        prefix — неизменные сообщения, общие для всех тем (например, базовый
+        системный промпт). Они отправляются первыми в каждом запросе и не
+        сокращаются политикой контекста, поэтому начало запроса совпадает
+        у всех статей и попадает в кэш промптов провайдера. Дальше идут
+        контекст темы из conversation и в конце — текущий запрос.
+        """
+        settings = get_settings() if model is None or temperature is None or transport is None else None
+        self.model = settings.model_advanced if model is None else model
+        self.temperature = settings.temperature if temperature is None else temperature
+        # Общий для процесса транспорт с пулом соединений
+        self.transport = transport or get_transport(settings.openai_api_key)
+        # Какую часть истории отправлять в API; по умолчанию — всю
+        self.context_policy = context_policy or FullHistory()
+        self.router = router
+        self.prefix = prefix or []
         # Начинаем разговор с некоего system_message, описывающего стиль и цели
         self.conversation = [
             {
                 "role": "system",
-                "content": SYSTEM_PROMPT
+                "content": default_system_prompt() if system_prompt is None else system_prompt
             }
         ]
         
@@ -59,83 +191,308 @@ class GPTClient:
         # Сохраняем только системное сообщение
         self.conversation = [self.conversation[0]]
 
-    def chat(self, user_prompt: str) -> str:
+    def fork(self) -> "GPTClient":
+        """
+        Возвращает независимую копию клиента с копией текущего контекста.
+        Нужна для параллельных запросов: каждый поток пишет в свой conversation.
+        """
+        forked = copy.copy(self)
+        forked.conversation = copy.deepcopy(self.conversation)
+        return forked
+
+    def _messages(self, context_policy: ContextPolicy | None = None) -> list[dict]:
+        """
+        Сообщения для очередного запроса: общий prefix, затем conversation согласно политике контекста.
+        """
+        messages = (context_policy or self.context_policy).build(self.conversation)
+        if not self.prefix:
+            return messages
+        # Если системный промпт темы не сгенерировался, в conversation остается тот же базовый промпт
+        if messages and messages[0] == self.prefix[-1]:
+            messages = messages[1:]
+        return self.prefix + messages
+
+    def _routes(self) -> list[Route]:
+        """
+        Попытки запроса для текущего этапа: модель этапа и запасные модели.
+        """
+        if self.router is None:
+            return [Route(self.model, self.temperature)]
+        return self.router.routes(current_stage(), self.model, self.temperature)
+
+    def _complete(self, messages: list[dict], timeout: float | None, routes: list[Route],
+                  **kwargs) -> tuple[str, Route]:
+        """
+        Выполняет запрос на первой модели routes; после таймаута или исчерпанной
+        квоты — на следующей. Возвращает ответ и маршрут, который его дал.
+        """
+        for index, route in enumerate(routes):
+            try:
+                return self.transport.complete(
+                    model=route.model,
+                    messages=messages,
+                    temperature=route.temperature,
+                    timeout=timeout,
+                    **route.params(),
+                    **kwargs
+                ), route
+            except Exception as e:
+                if index + 1 == len(routes) or not is_fallback_error(e):
+                    raise
+                logger.warning(f"Model {route.model} failed ({type(e).__name__}: {e}), "
+                               f"falling back to {routes[index + 1].model}")
+
+    def chat(self, user_prompt: str, timeout: float | None = None,
+             context_policy: ContextPolicy | None = None) -> str:
         """
         Добавляет новое user-сообщение в conversation, делает запрос к OpenAI,
         затем добавляет ответ assistant в conversation и возвращает его.
+        context_policy переопределяет политику контекста клиента для одного вызова.
         """
         # Добавляем сообщение пользователя
         self.conversation.append({"role": "user", "content": user_prompt})
 
         try:
             # Вызываем API
-            response = CLIENT.chat.completions.create(
-                model=self.model,
-                messages=self.conversation,
-                temperature=self.temperature
-            )
+            assistant_message, _ = self._complete(self._messages(context_policy), timeout, self._routes())
 
-            # Текст ответа
-            assistant_message = response.choices[0].message.content.strip()
             # Сохраняем в истории
             self.conversation.append({"role": "assistant", "content": assistant_message})
 
             return assistant_message
 
         except Exception as e:
-            error_msg = f"Неожиданная ошибка при обращении к OpenAI API: {str(e)}"
-            logger.error(error_msg)
-            raise Exception(error_msg)
+            # Исходное исключение сохраняется: по его типу транспорт и вызывающий код
+            # отличают временные сбои от фатальных ошибок
+            logger.error(f"Ошибка при обращении к OpenAI API: {type(e).__name__}: {e}")
+            raise
+
+    def chat_stream(self, user_prompt: str, timeout: float | None = None,
+                    context_policy: ContextPolicy | None = None,
+                    response_format: type[BaseModel] | None = None) -> Iterator[str]:
+        """
+        Как chat, но отдает ответ по частям по мере генерации.
+        Склеенные части совпадают с тем, что вернул бы chat;
+        в conversation ответ попадает после завершения потока.
+        response_format включает Structured Outputs: поток содержит JSON по схеме модели.
+        """
+        self.conversation.append({"role": "user", "content": user_prompt})
+
+        routes = self._routes()
+        for index, route in enumerate(routes):
+            parts = []
+            try:
+                deltas = self.transport.stream(
+                    model=route.model,
+                    messages=self._messages(context_policy),
+                    temperature=route.temperature,
+                    timeout=timeout,
+                    **route.params(),
+                    **({"response_format": json_schema_format(response_format)} if response_format else {})
+                )
+                for part in _strip_stream(deltas):
+                    parts.append(part)
+                    yield part
+                break
+            except Exception as e:
+                # Переход на другую модель возможен, только пока ничего не отдано
+                if parts or index + 1 == len(routes) or not is_fallback_error(e):
+                    logger.error(f"Ошибка при обращении к OpenAI API: {type(e).__name__}: {e}")
+                    raise
+                logger.warning(f"Model {route.model} failed ({type(e).__name__}: {e}), "
+                               f"falling back to {routes[index + 1].model}")
+
+        self.conversation.append({"role": "assistant", "content": "".join(parts)})
 
-    def chat_with_format(self, user_prompt: str, response_format: BaseModel) -> BaseModel:
+    def chat_with_format(self, user_prompt: str, response_format: type[BaseModel],
+                         timeout: float | None = None,
+                         context_policy: ContextPolicy | None = None,
+                         repair_attempts: int = 1) -> BaseModel:
         """
-        Similar to `chat`, but ensures the response adheres to a specific format using Pydantic models.
+        Как chat, но запрашивает ответ по JSON-схеме response_format (Structured Outputs)
+        и возвращает проверенный экземпляр модели.
+        Если ответ не прошел проверку, модель получает текст ошибки и отвечает
+        заново (не больше repair_attempts раз); неудачные попытки из conversation удаляются.
+        Если и после этого ответ неверен, а у router есть escalation_model,
+        запрос повторяется на ней.
         """
-        # Add user message to the conversation
         self.conversation.append({"role": "user", "content": user_prompt})
+        first_reply = len(self.conversation)
+        routes = self._routes()
 
         try:
-            # Call the OpenAI API
-            response = CLIENT.chat.completions.create(
-                model=self.model,
-                messages=self.conversation,
-                temperature=self.temperature
+            try:
+                return self._structured(response_format, timeout, context_policy, repair_attempts, routes)
+            except ValueError as e:
+                escalation = self.router.escalation(routes[0]) if self.router else None
+                if escalation is None:
+                    raise
+                logger.warning(f"{routes[0].model} returned an invalid {response_format.__name__}, "
+                               f"escalating to {escalation.model}: {e}")
+                del self.conversation[first_reply:]
+                return self._structured(response_format, timeout, context_policy, repair_attempts, [escalation])
+
+        except Exception as e:
+            logger.error(f"Ошибка при обращении к OpenAI API: {type(e).__name__}: {e}")
+            raise
+
+    def _structured(self, response_format: type[BaseModel], timeout: float | None,
+                    context_policy: ContextPolicy | None, repair_attempts: int, routes: list[Route]) -> BaseModel:
+        first_reply = len(self.conversation)
+        for attempt in range(repair_attempts + 1):
+            assistant_message, route = self._complete(
+                self._messages(context_policy), timeout, routes,
+                response_format=json_schema_format(response_format)
             )
+            # Исправление просим у той модели, которая ответила
+            routes = [route]
+            self.conversation.append({"role": "assistant", "content": assistant_message})
+            try:
+                parsed = parse_structured_response(assistant_message, response_format)
+            except ValueError as e:
+                if attempt == repair_attempts:
+                    raise
+                logger.warning(f"Invalid structured response, asking the model to repair it: {e}")
+                self.conversation.append({"role": "user", "content": _repair_prompt(e)})
+                continue
+            del self.conversation[first_reply:-1]
+            return parsed
+
+
+class AsyncGPTClient(GPTClient):
+    """
+    Асинхронный вариант GPTClient с тем же интерфейсом chat / chat_stream / chat_with_format
+    (chat_stream — асинхронный генератор: async for part in client.chat_stream(...)).
+    Все экземпляры используют общий AsyncTransport с пулом keep-alive соединений.
+    """
+
+    def __init__(self, model: str | None = None, temperature: float | None = None,
+                 transport: AsyncTransport | None = None, context_policy: ContextPolicy | None = None,
+                 system_prompt: str | None = None, router: ModelRouter | None = None,
+                 prefix: list[dict] | None = None):
+        super().__init__(
+            model=model,
+            temperature=temperature,
+            transport=transport or get_async_transport(get_settings().openai_api_key),
+            context_policy=context_policy,
+            system_prompt=system_prompt,
+            router=router,
+            prefix=prefix
+        )
+
+    async def _complete(self, messages: list[dict], timeout: float | None, routes: list[Route],
+                        **kwargs) -> tuple[str, Route]:
+        """
+        Асинхронный аналог GPTClient._complete.
+        """
+        for index, route in enumerate(routes):
+            try:
+                return await self.transport.complete(
+                    model=route.model,
+                    messages=messages,
+                    temperature=route.temperature,
+                    timeout=timeout,
+                    **route.params(),
+                    **kwargs
+                ), route
+            except Exception as e:
+                if index + 1 == len(routes) or not is_fallback_error(e):
+                    raise
+                logger.warning(f"Model {route.model} failed ({type(e).__name__}: {e}), "
+                               f"falling back to {routes[index + 1].model}")
 
-            # Extract the assistant's message
-            assistant_message = response.choices[0].message.content.strip()
+    async def chat(self, user_prompt: str, timeout: float | None = None,
+                   context_policy: ContextPolicy | None = None) -> str:
+        """
+        Асинхронный аналог GPTClient.chat.
+        """
+        self.conversation.append({"role": "user", "content": user_prompt})
 
-            # Save the assistant's response in the conversation
+        try:
+            assistant_message, _ = await self._complete(self._messages(context_policy), timeout, self._routes())
             self.conversation.append({"role": "assistant", "content": assistant_message})
+            return assistant_message
+        except Exception as e:
+            logger.error(f"Ошибка при обращении к OpenAI API: {type(e).__name__}: {e}")
+            raise
 
-            # Удаляем маркеры JSON, если они есть
-            cleaned_message = assistant_message
-            if "```json" in assistant_message:
-                cleaned_message = assistant_message.replace("```json", "").replace("```", "").strip()
+    async def chat_stream(self, user_prompt: str, timeout: float | None = None,
+                          context_policy: ContextPolicy | None = None,
+                          response_format: type[BaseModel] | None = None) -> AsyncIterator[str]:
+        """
+        Асинхронный аналог GPTClient.chat_stream.
+        """
+        self.conversation.append({"role": "user", "content": user_prompt})
 
-            # Parse the response into the specified format
+        routes = self._routes()
+        for index, route in enumerate(routes):
+            parts = []
             try:
-                parsed_response = response_format.parse_raw(cleaned_message)
-                return parsed_response
+                deltas = self.transport.stream(
+                    model=route.model,
+                    messages=self._messages(context_policy),
+                    temperature=route.temperature,
+                    timeout=timeout,
+                    **route.params(),
+                    **({"response_format": json_schema_format(response_format)} if response_format else {})
+                )
+                async for part in _strip_stream_async(deltas):
+                    parts.append(part)
+                    yield part
+                break
             except Exception as e:
-                # Если не удалось распарсить напрямую, пробуем загрузить как JSON
-                try:
-                    data = json.loads(cleaned_message)
-                    parsed_response = response_format.parse_obj(data)
-                    return parsed_response
-                except Exception as json_e:
-                    logger.error(f"Failed to parse response: {e}, JSON error: {json_e}")
-                    raise ValueError(f"Failed to parse response into the specified format: {e}")
-                
-        except RateLimitError:
-            error_msg = "Превышен лимит запросов к OpenAI API. Пожалуйста, повторите попытку позже."
-            logger.error(error_msg)
-            raise Exception(error_msg)
-        except APIError as e:
-            error_msg = f"Ошибка OpenAI API: {str(e)}"
-            logger.error(error_msg)
-            raise Exception(error_msg)
+                if parts or index + 1 == len(routes) or not is_fallback_error(e):
+                    logger.error(f"Ошибка при обращении к OpenAI API: {type(e).__name__}: {e}")
+                    raise
+                logger.warning(f"Model {route.model} failed ({type(e).__name__}: {e}), "
+                               f"falling back to {routes[index + 1].model}")
+
+        self.conversation.append({"role": "assistant", "content": "".join(parts)})
+
+    async def chat_with_format(self, user_prompt: str, response_format: type[BaseModel],
+                               timeout: float | None = None,
+                               context_policy: ContextPolicy | None = None,
+                               repair_attempts: int = 1) -> BaseModel:
+        """
+        Асинхронный аналог GPTClient.chat_with_format.
+        """
+        self.conversation.append({"role": "user", "content": user_prompt})
+        first_reply = len(self.conversation)
+        routes = self._routes()
+
+        try:
+            try:
+                return await self._structured(response_format, timeout, context_policy, repair_attempts, routes)
+            except ValueError as e:
+                escalation = self.router.escalation(routes[0]) if self.router else None
+                if escalation is None:
+                    raise
+                logger.warning(f"{routes[0].model} returned an invalid {response_format.__name__}, "
+                               f"escalating to {escalation.model}: {e}")
+                del self.conversation[first_reply:]
+                return await self._structured(response_format, timeout, context_policy, repair_attempts, [escalation])
         except Exception as e:
-            error_msg = f"Неожиданная ошибка при обращении к OpenAI API: {str(e)}"
-            logger.error(error_msg)
-            raise Exception(error_msg)
+            logger.error(f"Ошибка при обращении к OpenAI API: {type(e).__name__}: {e}")
+            raise
+
+    async def _structured(self, response_format: type[BaseModel], timeout: float | None,
+                          context_policy: ContextPolicy | None, repair_attempts: int,
+                          routes: list[Route]) -> BaseModel:
+        first_reply = len(self.conversation)
+        for attempt in range(repair_attempts + 1):
+            assistant_message, route = await self._complete(
+                self._messages(context_policy), timeout, routes,
+                response_format=json_schema_format(response_format)
+            )
+            routes = [route]
+            self.conversation.append({"role": "assistant", "content": assistant_message})
+            try:
+                parsed = parse_structured_response(assistant_message, response_format)
+            except ValueError as e:
+                if attempt == repair_attempts:
+                    raise
+                logger.warning(f"Invalid structured response, asking the model to repair it: {e}")
+                self.conversation.append({"role": "user", "content": _repair_prompt(e)})
+                continue
+            del self.conversation[first_reply:-1]
+            return parsed
@@ -0,0 +1,298 @@
+import itertools
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator
+
+from rate_limiter import RateLimiter
+from retry import CircuitBreaker
+from scheduler import BatchReport, BatchScheduler
+from utils import TopicJob
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_QUEUE_PATH = "queue/jobs.sqlite"
+DEFAULT_LEASE_SECONDS = 600.0
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_HEARTBEAT_INTERVAL = 60.0
+DEFAULT_POLL_INTERVAL = 5.0
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+DEAD = "dead"
+
+
+@dataclass
+class Job:
+    topic: str
+    attempts: int
+    options: dict
+
+    def topic_job(self) -> TopicJob:
+        return TopicJob(self.topic, **self.options)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobQueue:
+    """
+    Очередь тем на SQLite, общая для нескольких процессов (и машин с общим диском).
+
+    Воркер берет тему в аренду (lease) на lease_seconds и продлевает ее
+    heartbeat'ами, пока генерирует статью. Тему с истекшей арендой (воркер упал)
+    может взять другой воркер. После max_attempts неудачных попыток тема
+    переходит в статус dead и больше не выдается, пока ее не вернут requeue_dead().
+    """
+
+    def __init__(self, path: str = DEFAULT_QUEUE_PATH, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Транзакции открываются явно (BEGIN IMMEDIATE), чтобы выдача темы была атомарной между процессами
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "topic TEXT PRIMARY KEY, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+            "options TEXT, worker TEXT, lease_until REAL, last_error TEXT, "
+            "created REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+
+    def enqueue(self, topics: Iterable[str | TopicJob], batch_size: int = 1000) -> int:
+        """
+        Добавляет темы, которых еще нет в очереди (в любом статусе); возвращает число добавленных.
+        Параметры TopicJob (язык, число разделов, путь) сохраняются вместе с темой.
+        Темы пишутся пачками по batch_size в отдельных транзакциях, чтобы загрузка
+        большого файла не блокировала очередь для работающих воркеров.
+        """
+        added = 0
+        topic_iter = iter(topics)
+        while batch := list(itertools.islice(topic_iter, batch_size)):
+            now = time.time()
+            with self._lock:
+                before = self._conn.total_changes
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO jobs (topic, options, status, created, updated) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (str(topic), json.dumps(topic.options()) if isinstance(topic, TopicJob) else None,
+                         PENDING, now, now)
+                        for topic in batch
+                    ]
+                )
+                self._conn.execute("COMMIT")
+                added += self._conn.total_changes - before
+        return added
+
+    def lease(self, worker_id: str) -> Job | None:
+        """
+        Атомарно берет в аренду самую старую доступную тему или возвращает None.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Темы с истекшей арендой и исчерпанными попытками уходят в dead
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, last_error = COALESCE(last_error, 'lease expired'), updated = ? "
+                    "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                    (DEAD, now, LEASED, now, self.max_attempts)
+                )
+                row = self._conn.execute(
+                    "SELECT topic, attempts, options FROM jobs "
+                    "WHERE status = ? OR (status = ? AND lease_until < ?) "
+                    "ORDER BY created, topic LIMIT 1",
+                    (PENDING, LEASED, now)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                topic, attempts, options = row
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, worker = ?, lease_until = ?, attempts = ?, updated = ? "
+                    "WHERE topic = ?",
+                    (LEASED, worker_id, now + self.lease_seconds, attempts + 1, now, topic)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return Job(topic, attempts + 1, json.loads(options) if options else {})
+
+    def heartbeat(self, worker_id: str) -> int:
+        """
+        Продлевает аренду всех тем воркера; возвращает число продленных.
+        """
+        now = time.time()
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET lease_until = ?, updated = ? WHERE status = ? AND worker = ?",
+                (now + self.lease_seconds, now, LEASED, worker_id)
+            ).rowcount
+
+    def complete(self, topic: str, worker_id: str) -> bool:
+        """
+        Отмечает тему выполненной. False — аренда уже перешла к другому воркеру.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET status = ?, lease_until = NULL, last_error = NULL, updated = ? "
+                "WHERE topic = ? AND status = ? AND worker = ?",
+                (DONE, time.time(), topic, LEASED, worker_id)
+            ).rowcount == 1
+
+    def fail(self, topic: str, worker_id: str, error: str) -> str | None:
+        """
+        Возвращает тему в очередь или, если попытки исчерпаны, переводит в dead.
+        Возвращает новый статус (None, если аренда уже не принадлежит воркеру).
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute(
+                "SELECT attempts FROM jobs WHERE topic = ? AND status = ? AND worker = ?",
+                (topic, LEASED, worker_id)
+            ).fetchone()
+            if row is None:
+                self._conn.execute("COMMIT")
+                return None
+            status = DEAD if row[0] >= self.max_attempts else PENDING
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, lease_until = NULL, last_error = ?, updated = ? WHERE topic = ?",
+                (status, error, time.time(), topic)
+            )
+            self._conn.execute("COMMIT")
+        if status == DEAD:
+            logger.error(f"Topic '{topic}' moved to dead letter after {row[0]} attempts: {error}")
+        return status
+
+    def requeue_dead(self) -> int:
+        """
+        Возвращает темы из dead в очередь с обнуленным счетчиком попыток.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET status = ?, attempts = 0, updated = ? WHERE status = ?",
+                (PENDING, time.time(), DEAD)
+            ).rowcount
+
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: 0 for status in (PENDING, LEASED, DONE, DEAD)} | dict(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class QueueWorker:
+    """
+    Воркер: берет темы из JobQueue и обрабатывает их через BatchScheduler
+    (не больше concurrency тем одновременно). Пока темы в работе, фоновый
+    поток продлевает их аренду. process(job) получает TopicJob и должен бросить исключение,
+    если статья не сохранена, — тогда тема возвращается в очередь.
+    С wait=True воркер ждет новые темы, иначе завершается, когда брать нечего.
+    run(feed=...) параллельно добавляет темы в очередь: работа начинается
+    с первой добавленной темы, не дожидаясь загрузки всего файла.
+    """
+
+    def __init__(self, queue: "JobQueue", process: Callable[[TopicJob], None], worker_id: str | None = None,
+                 concurrency: int = 4, heartbeat_interval: float = DEFAULT_HEARTBEAT_INTERVAL,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL, wait: bool = False,
+                 rate_limiter: RateLimiter | None = None, circuit_breaker: CircuitBreaker | None = None):
+        self.queue = queue
+        self.process = process
+        self.worker_id = worker_id or default_worker_id()
+        self.concurrency = concurrency
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        self.wait = wait
+        self.rate_limiter = rate_limiter
+        self.circuit_breaker = circuit_breaker
+        self._stopped = threading.Event()
+        self._fed = threading.Event()
+        self.enqueued = 0
+
+    def stop(self) -> None:
+        """
+        Перестает брать новые темы; начатые дорабатываются.
+        """
+        self._stopped.set()
+
+    def _topics(self) -> Iterator[TopicJob]:
+        while not self._stopped.is_set():
+            job = self.queue.lease(self.worker_id)
+            if job is not None:
+                logger.info(f"Worker {self.worker_id} leased '{job.topic}' (attempt {job.attempts})")
+                yield job.topic_job()
+            elif not self._fed.is_set():
+                self._fed.wait(self.poll_interval)
+            elif self.wait:
+                self._stopped.wait(self.poll_interval)
+            else:
+                return
+
+    def _feed(self, topics: Iterable[str | TopicJob]) -> None:
+        try:
+            self.enqueued = self.queue.enqueue(topics)
+            logger.info(f"Worker {self.worker_id}: {self.enqueued} new topics queued")
+        except Exception as e:
+            logger.error(f"Failed to enqueue topics: {e}")
+        finally:
+            self._fed.set()
+
+    def _heartbeat(self, done: threading.Event) -> None:
+        while not done.wait(self.heartbeat_interval):
+            try:
+                self.queue.heartbeat(self.worker_id)
+            except sqlite3.Error as e:
+                logger.warning(f"Heartbeat failed: {e}")
+
+    def _run_job(self, job: TopicJob) -> None:
+        topic = job.topic
+        try:
+            self.process(job)
+        except Exception as e:
+            self.queue.fail(topic, self.worker_id, f"{type(e).__name__}: {e}")
+            raise
+        if not self.queue.complete(topic, self.worker_id):
+            logger.warning(f"Lease on '{topic}' was lost before completion")
+
+    def run(self, feed: Iterable[str | TopicJob] | None = None) -> BatchReport:
+        """
+        Обрабатывает темы очереди; feed — темы, которые нужно добавить в нее по ходу работы.
+        """
+        if feed is None:
+            self._fed.set()
+        else:
+            threading.Thread(target=self._feed, args=(feed,), daemon=True).start()
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(done,), daemon=True)
+        heartbeat.start()
+        try:
+            scheduler = BatchScheduler(
+                max_concurrency=self.concurrency, rate_limiter=self.rate_limiter,
+                circuit_breaker=self.circuit_breaker
+            )
+            return scheduler.run(self._topics(), self._run_job)
+        finally:
+            done.set()
+            heartbeat.join()
+            logger.info(f"Queue status: {self.queue.counts()}")
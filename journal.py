@@ -0,0 +1,106 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_JOURNAL_DIR = "journal"
+
+
+class JobJournal:
+    """
+    Журнал этапов генерации статей: по одному JSON-файлу на тему.
+
+    Каждый завершенный этап (системный промпт, outline, отдельные разделы)
+    сохраняется сразу после получения, поэтому после падения процесса
+    генерацию можно продолжить с последнего готового шага.
+    """
+
+    def __init__(self, directory: str = DEFAULT_JOURNAL_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+
+    def _path(self, topic: str) -> str:
+        digest = hashlib.sha1(topic.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def _load(self, topic: str) -> dict:
+        entry = self._entries.get(topic)
+        if entry is not None:
+            return entry
+
+        entry = {"topic": topic, "stages": {}, "sections": {}, "done": False}
+        path = self._path(topic)
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as file:
+                    entry = json.load(file)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Journal for topic '{topic}' is unreadable, starting over: {e}")
+        self._entries[topic] = entry
+        return entry
+
+    def _save(self, topic: str, entry: dict) -> None:
+        # Пишем во временный файл и атомарно подменяем, чтобы журнал не был полузаписан
+        path = self._path(topic)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(entry, file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def get(self, topic: str, stage: str):
+        with self._lock:
+            return self._load(topic)["stages"].get(stage)
+
+    def put(self, topic: str, stage: str, value) -> None:
+        with self._lock:
+            entry = self._load(topic)
+            entry["stages"][stage] = value
+            self._save(topic, entry)
+
+    def get_section(self, topic: str, index: int, title: str | None = None) -> str | None:
+        """
+        Сохраненный текст раздела; с title — только если раздел сохранен с тем же заголовком.
+        """
+        with self._lock:
+            entry = self._load(topic)
+            if title is not None and entry.get("section_titles", {}).get(str(index)) != title:
+                return None
+            return entry["sections"].get(str(index))
+
+    def put_section(self, topic: str, index: int, text: str, title: str | None = None) -> None:
+        with self._lock:
+            entry = self._load(topic)
+            entry["sections"][str(index)] = text
+            if title is not None:
+                entry.setdefault("section_titles", {})[str(index)] = title
+            self._save(topic, entry)
+
+    def is_done(self, topic: str) -> bool:
+        with self._lock:
+            return self._load(topic)["done"]
+
+    def mark_done(self, topic: str) -> None:
+        with self._lock:
+            entry = self._load(topic)
+            entry["done"] = True
+            self._save(topic, entry)
+            # Завершенной теме промежуточные результаты в памяти больше не нужны
+            self._entries.pop(topic, None)
+
+    def reset(self, topic: str) -> None:
+        """
+        Удаляет сохраненные результаты темы, чтобы сгенерировать ее заново.
+        """
+        with self._lock:
+            self._entries.pop(topic, None)
+            try:
+                os.remove(self._path(topic))
+            except FileNotFoundError:
+                pass
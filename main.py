@@ -1,10 +1,31 @@
+import argparse
+import itertools
 import logging
+import os
+import threading
 import traceback
+from concurrent.futures import Future
+from typing import Iterable
 
-from gpt_client import GPTClient
-from summarizer import Summarizer
-from article_generator import ArticleGenerator
-from utils import load_topics_from_file, save_article_to_file
+from settings import ClientFactory
+from journal import JobJournal
+from job_queue import JobQueue, QueueWorker, default_worker_id
+from batch import BatchRunner, OpenAIBatchBackend, LocalBatchBackend, MAX_BATCH_BYTES, MAX_BATCH_REQUESTS
+from prompt_registry import PromptRegistry
+from context_policy import Stateless, TokenBudget
+from cost_estimator import BudgetPlanner, CostEstimator, models_cost
+from rate_limiter import RateLimiter
+from retry import CircuitBreaker, RetryPolicy
+from response_cache import ResponseCache
+from metrics import MetricsRecorder, labels
+from model_router import ModelRouter, StageProfile
+from scheduler import BatchScheduler
+from system_prompts import ClientPool, SystemPromptProvider, TopicGrouper
+from topic_index import TopicIndex, article_topics, deduplicate_topics
+from utils import (
+    ArticleIndex, BackgroundSink, FileSink, JsonlSink, SqliteSink, TopicJob, article_path, iter_topic_jobs,
+    skip_existing_articles, stream_article_to_file
+)
 
 
 logging.basicConfig(
@@ -14,42 +35,495 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+# Файл тем: текст (тема на строку), JSONL или CSV с необязательными полями
+# language, sections и output_path; читается потоково, можно сжать в .gz
 TOPICS_FILE = "files/topics.txt"
+ARTICLES_DIR = "articles"
+# Куда сохранять статьи: "files" — .md на статью в ARTICLES_DIR, "jsonl" — все статьи
+# в одном сжатом JSONL, "sqlite" — в базу с метаданными. Запись идет в фоновом
+# потоке пачками до SINK_BATCH_SIZE статей, не задерживая генерацию
+ARTICLE_SINK = "files"
+ARTICLES_JSONL_PATH = "articles/articles.jsonl.gz"
+ARTICLES_SQLITE_PATH = "articles/articles.sqlite"
+SINK_BATCH_SIZE = 100
+SINK_FLUSH_INTERVAL = 1.0
+PROMPTS_DIR = "prompts"
+# Перечитывать шаблоны при изменении файлов без перезапуска
+PROMPTS_HOT_RELOAD = False
 LANGUAGE = "EN"
+# Мультиязычный режим: каждая статья дополнительно пишется на этих языках.
+# Системный промпт и outline генерируются один раз на языке темы, для остальных
+# языков переводятся заголовок и outline, а разделы всех языков пишутся параллельно
+# по шаблонам своего языка. Переводы сохраняются рядом: ARTICLES_DIR/{ЯЗЫК}/
+# (или с суффиксом языка у output_path темы); [] — только язык темы
+OUTPUT_LANGUAGES = []
+# Языки, шаблоны которых загружаются: язык темы из JSONL/CSV должен быть в этом списке
+LANGUAGES = [LANGUAGE, *OUTPUT_LANGUAGES]
+SECTION_WORKERS = 4
+# Потоковая выдача текста разделов от API (работает при SECTION_WORKERS = 1)
+STREAM_TOKENS = False
+# Запускать разделы по мере потоковой генерации outline, не дожидаясь его целиком
+# (быстрее для длинных outline, но разделы не видят полный outline в контексте)
+PIPELINE_OUTLINE = False
+# Сколько статей генерируется одновременно
+ARTICLE_WORKERS = 4
+# Бюджеты аккаунта OpenAI; None — без ограничения
+REQUESTS_PER_MINUTE = 500
+TOKENS_PER_MINUTE = 200_000
+# Повторы временных ошибок API и пауза всего пакета при сбое провайдера
+RETRY_MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RECOVERY_TIMEOUT = 30.0
+# Кэш ответов модели: повторный запуск с теми же промптами не платит за запросы
+RESPONSE_CACHE_PATH = "cache/responses.sqlite"
+RESPONSE_CACHE_TTL = 30 * 24 * 3600
+RESPONSE_CACHE_MAX_ENTRIES = 200_000
+# bypass — не использовать кэш вовсе, refresh — игнорировать сохраненные ответы и перезаписать их
+RESPONSE_CACHE_BYPASS = False
+RESPONSE_CACHE_REFRESH = False
+# Политики контекста по шагам: разделы видят системный промпт, outline
+# и ограниченное по токенам окно предыдущих разделов вместо всей истории.
+# Окно сдвигается сразу на 4 раздела (8 сообщений), чтобы запросы подряд
+# начинались одинаково и попадали в кэш промптов провайдера
+CONTEXT_POLICIES = {
+    "section": TokenBudget(max_tokens=6000, keep_first=2, trim_step=8),
+}
+# Базовый системный промпт языка отправляется первым в каждом запросе статьи,
+# до системного промпта темы: этот префикс общий для всех тем и кэшируется
+# провайдером (OpenAI кэширует префиксы от 1024 токенов)
+SHARED_PROMPT_PREFIX = True
+# Модели по этапам (метки labels(stage=...)): служебные короткие ответы — на FAST_MODEL,
+# разделы — на MODEL_ADVANCED с переходом на FAST_MODEL при таймауте или исчерпанной
+# квоте. Outline, не прошедший проверку схемы на FAST_MODEL, повторяется на MODEL_ADVANCED.
+# Профиль без model использует MODEL_ADVANCED; None — все этапы на MODEL_ADVANCED
+FAST_MODEL = "gpt-4o-mini"
+MODEL_ROUTING = {
+    "system_prompt": StageProfile(model=FAST_MODEL, max_tokens=600),
+    "outline": StageProfile(model=FAST_MODEL, temperature=0.3, max_tokens=1500),
+    "translation": StageProfile(model=FAST_MODEL, temperature=0.2, max_tokens=1500),
+    "section": StageProfile(fallback_models=(FAST_MODEL,)),
+}
+# Оценка стоимости до запуска (--estimate) и бюджет: ожидаемый размер статьи
+# (разделов в outline и токенов ответа на раздел) и лимит расходов на запуск в $.
+# Темы сверх бюджета сокращаются до BUDGET_MIN_SECTIONS разделов, затем
+# переводятся на BUDGET_FALLBACK_MODEL, а если и это не помогает — пропускаются
+EXPECTED_SECTIONS = 6
+EXPECTED_OUTLINE_TOKENS = 500
+EXPECTED_SECTION_TOKENS = 700
+RUN_BUDGET_USD = None
+BUDGET_FALLBACK_MODEL = "gpt-4o-mini"
+BUDGET_MIN_SECTIONS = 3
+# Почти одинаковые темы (перестановка слов, регистр, другие формы слов) ищутся по
+# MinHash/LSH среди тем запуска и статей в ARTICLES_DIR. None — не искать, иначе политика:
+# "skip" — дубликат не генерируется, "merge" — не генерируется, а пара "тема -> статья"
+# дописывается в TOPIC_ALIASES_PATH, "reuse_outline" — генерируется в конце запуска
+# по outline похожей темы. DEDUP_THRESHOLD — порог сходства наборов признаков от 0 до 1
+DEDUP_POLICY = None
+DEDUP_THRESHOLD = 0.7
+TOPIC_ALIASES_PATH = "articles/aliases.jsonl"
+# Журнал этапов генерации для продолжения после падения (--resume)
+JOURNAL_DIR = "journal"
+# Системные промпты: число переиспользуемых клиентов и объединение похожих тем
+# (None — отключено, иначе порог сходства наборов слов темы от 0 до 1)
+SYSTEM_PROMPT_CLIENTS = 4
+SYSTEM_PROMPT_GROUP_SIMILARITY = None
+# Куда выгружать метрики запуска (JSON и текстовый формат Prometheus)
+METRICS_DIR = "metrics"
+# Пакетный режим (--batch): каталог JSONL-файлов и интервал опроса заданий
+BATCH_DIR = "batches"
+BATCH_POLL_INTERVAL = 60.0
+# Ограничения одного входного файла пакета; больший этап делится на несколько пакетов
+BATCH_MAX_REQUESTS = MAX_BATCH_REQUESTS
+BATCH_MAX_BYTES = MAX_BATCH_BYTES
+# Режим воркера (--worker): общая очередь тем на диске для нескольких процессов.
+# Аренда темы продлевается каждые QUEUE_HEARTBEAT_INTERVAL секунд, пока статья
+# генерируется; после QUEUE_MAX_ATTEMPTS неудач тема уходит в dead letter
+QUEUE_PATH = "queue/jobs.sqlite"
+QUEUE_LEASE_SECONDS = 600.0
+QUEUE_HEARTBEAT_INTERVAL = 60.0
+QUEUE_MAX_ATTEMPTS = 3
+QUEUE_POLL_INTERVAL = 5.0
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Batch article generation")
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="skip finished topics and reuse saved stages of unfinished ones"
+    )
+    parser.add_argument(
+        "--skip-existing", action="store_true",
+        help="skip topics whose article file already exists in the output directory"
+    )
+    parser.add_argument(
+        "--estimate", action="store_true",
+        help="print the expected tokens and cost per topic and for the run, then exit"
+    )
+    parser.add_argument(
+        "--batch", choices=["openai", "local"],
+        help="generate all topics stage by stage as offline batch jobs "
+             "(OpenAI Batch API or a local stand-in)"
+    )
+    parser.add_argument(
+        "--worker", action="store_true",
+        help="pull topics from the shared job queue; several workers can run at once"
+    )
+    parser.add_argument(
+        "--wait", action="store_true",
+        help="with --worker: keep polling the queue for new topics instead of exiting when it is empty"
+    )
+    parser.add_argument(
+        "--requeue-dead", action="store_true",
+        help="with --worker: return dead-lettered topics to the queue before starting"
+    )
+    return parser.parse_args(argv)
+
+
+def export_metrics(metrics: MetricsRecorder) -> None:
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        with open(os.path.join(METRICS_DIR, "run.json"), "w", encoding="utf-8") as file:
+            file.write(metrics.to_json())
+        with open(os.path.join(METRICS_DIR, "run.prom"), "w", encoding="utf-8") as file:
+            file.write(metrics.to_prometheus())
+        logger.info(f"Metrics exported to {METRICS_DIR}/")
+    except OSError as e:
+        logger.error(f"Failed to export metrics: {e}")
+
+
+def open_sink() -> BackgroundSink:
+    if ARTICLE_SINK == "jsonl":
+        sink = JsonlSink(ARTICLES_JSONL_PATH)
+    elif ARTICLE_SINK == "sqlite":
+        sink = SqliteSink(ARTICLES_SQLITE_PATH)
+    else:
+        sink = FileSink(ARTICLES_DIR)
+    return BackgroundSink(sink, batch_size=SINK_BATCH_SIZE, flush_interval=SINK_FLUSH_INTERVAL)
+
+
+def new_cost_estimator(prompts: PromptRegistry, model: str | None, router: ModelRouter | None) -> CostEstimator:
+    # Параллельные разделы видят только outline, последовательные — и окно предыдущих разделов
+    sequential = SECTION_WORKERS <= 1 and not PIPELINE_OUTLINE
+    history = getattr(CONTEXT_POLICIES.get("section"), "max_tokens", EXPECTED_SECTIONS * EXPECTED_SECTION_TOKENS)
+    return CostEstimator(
+        prompts, LANGUAGE, model, sections=EXPECTED_SECTIONS, outline_tokens=EXPECTED_OUTLINE_TOKENS,
+        section_tokens=EXPECTED_SECTION_TOKENS, history_tokens=history if sequential else 0, router=router,
+        output_languages=OUTPUT_LANGUAGES
+    )
+
+
+def log_run_cost(metrics: MetricsRecorder, planner: BudgetPlanner | None) -> None:
+    models = metrics.snapshot()["models"]
+    prompt_tokens = sum(s["prompt_tokens"] for s in models.values())
+    cached_tokens = sum(s["cached_tokens"] for s in models.values())
+    if prompt_tokens:
+        logger.info(f"Prompt cache: {cached_tokens / prompt_tokens:.0%} of {prompt_tokens} input tokens cached")
+    # Каждая модель (этапы могут идти на разные) считается по своей цене
+    actual, unpriced = models_cost(models)
+    logger.info(f"Run cost: ${actual:.4f} (cached responses are free)"
+                + (f", without models with unknown prices: {', '.join(unpriced)}" if unpriced else ""))
+    if planner is not None:
+        logger.info(
+            f"Budget: ${planner.planned_cost:.4f} of ${planner.budget_usd:.2f} planned; "
+            f"{planner.trimmed} topics trimmed, {planner.downgraded} moved to {planner.fallback_model}, "
+            f"{planner.skipped} skipped"
+        )
+
+
+def article_metadata(job: TopicJob) -> dict:
+    return {**job.options(), "language": job.language or LANGUAGE}
+
+
+def article_languages(job: TopicJob) -> list[str]:
+    language = job.language or LANGUAGE
+    return [language, *(other for other in OUTPUT_LANGUAGES if other != language)]
+
+
+def write_article_versions(sink: BackgroundSink, job: TopicJob, articles: dict[str, str]) -> Future:
+    """
+    Отдает в хранилище статью на всех языках; возвращает Future, который
+    завершается, когда записаны все версии (или с первой ошибкой записи).
+    """
+    futures = []
+    for language, article_text in articles.items():
+        metadata = {**article_metadata(job), "language": language}
+        if isinstance(sink.sink, FileSink) and language != (job.language or LANGUAGE):
+            if job.output_path:
+                root, ext = os.path.splitext(job.output_path)
+                metadata["output_path"] = f"{root}.{language.lower()}{ext}"
+            else:
+                metadata["output_path"] = article_path(job.topic, os.path.join(ARTICLES_DIR, language))
+        futures.append(sink.write(job.topic, article_text, metadata))
+
+    combined = Future()
+    pending = [len(futures)]
+    lock = threading.Lock()
+
+    def written(_) -> None:
+        with lock:
+            pending[0] -= 1
+            if pending[0]:
+                return
+        errors = [future.exception() for future in futures if future.exception() is not None]
+        if errors:
+            combined.set_exception(errors[0])
+        else:
+            combined.set_result([future.result() for future in futures])
+
+    for future in futures:
+        future.add_done_callback(written)
+    return combined
+
 
+def run_batch(backend_name: str, jobs: list[TopicJob], clients: ClientFactory, prompts: PromptRegistry,
+              journal: JobJournal, sink: BackgroundSink) -> None:
+    if backend_name == "openai":
+        backend = OpenAIBatchBackend(clients.transport.client, directory=BATCH_DIR)
+    else:
+        backend = LocalBatchBackend(clients.transport, max_workers=ARTICLE_WORKERS * SECTION_WORKERS)
 
-def main() -> None:
-    topics = load_topics_from_file(TOPICS_FILE)
-    if not topics:
+    generator = clients.article_generator(LANGUAGE, prompts=prompts)
+    runner = BatchRunner(backend, generator, poll_interval=BATCH_POLL_INTERVAL,
+                         max_requests=BATCH_MAX_REQUESTS, max_bytes=BATCH_MAX_BYTES)
+    # Язык, модель и число разделов берутся из заданий; переводы в пакетном режиме не создаются
+    jobs_by_topic = {job.topic: job for job in jobs}
+    articles = runner.run(list(jobs_by_topic.values()))
+
+    writes = {
+        topic: sink.write(topic, article_text, article_metadata(jobs_by_topic[topic]))
+        for topic, article_text in articles.items()
+    }
+    saved = 0
+    for topic, future in writes.items():
+        if future.exception() is None:
+            journal.mark_done(topic)
+            saved += 1
+    logger.info(f"Batch generation completed: {saved}/{len(jobs_by_topic)} articles")
+
+
+def run_worker(args: argparse.Namespace, jobs: Iterable[TopicJob], new_article_generator, journal: JobJournal,
+               rate_limiter: RateLimiter, circuit_breaker: CircuitBreaker, metrics: MetricsRecorder,
+               log_article_summary, sink: BackgroundSink) -> None:
+    queue = JobQueue(QUEUE_PATH, lease_seconds=QUEUE_LEASE_SECONDS, max_attempts=QUEUE_MAX_ATTEMPTS)
+    if args.requeue_dead:
+        logger.info(f"Requeued {queue.requeue_dead()} dead-lettered topics")
+    worker_id = default_worker_id()
+    logger.info(f"Worker {worker_id}: queue status {queue.counts()}")
+
+    def process(job: TopicJob) -> None:
+        topic = job.topic
+        # Журнал не сбрасывается: повторная попытка темы продолжает с сохраненных этапов
+        try:
+            with labels(article=topic):
+                articles = new_article_generator(job).generate_translations(topic, article_languages(job))
+            # Тема закрывается в очереди только после записи статьи; ошибка записи вернет ее в очередь
+            write_article_versions(sink, job, articles).result()
+        except Exception:
+            metrics.pop_article(topic)
+            raise
+        journal.mark_done(topic)
+        log_article_summary(topic)
+
+    worker = QueueWorker(
+        queue, process, worker_id=worker_id, concurrency=ARTICLE_WORKERS,
+        heartbeat_interval=QUEUE_HEARTBEAT_INTERVAL, poll_interval=QUEUE_POLL_INTERVAL, wait=args.wait,
+        rate_limiter=rate_limiter, circuit_breaker=circuit_breaker
+    )
+    try:
+        # Темы, уже добавленные другим воркером (в том числе готовые), повторно не ставятся
+        report = worker.run(feed=jobs)
+    finally:
+        queue.close()
+    if report.failed_topics:
+        logger.warning(f"Failed topics: {report.failed_topics}")
+    logger.info(f"Worker {worker_id} finished: {report.succeeded} articles generated")
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    # Все шаблоны загружаются и проверяются сразу: ошибка в них останавливает запуск
+    prompts = PromptRegistry(PROMPTS_DIR, languages=LANGUAGES, watch=PROMPTS_HOT_RELOAD)
+
+    # Темы читаются по мере запуска статей, файл целиком в память не загружается
+    jobs = iter_topic_jobs(TOPICS_FILE, languages=prompts.available_languages())
+    first = next(jobs, None)
+    # Воркер может работать по очереди, которую заполнил другой процесс
+    if first is None and not args.worker:
         logger.warning("No topics found in '%s'.", TOPICS_FILE)
         return
+    if first is not None:
+        jobs = itertools.chain([first], jobs)
 
-    logger.info(f"Loaded {len(topics)} topics for article generation")
+    journal = JobJournal(JOURNAL_DIR)
+    if args.resume and not args.worker:
+        logger.info("Resuming: topics marked done in the journal are skipped")
+        jobs = (job for job in jobs if not journal.is_done(job.topic))
+    if args.skip_existing:
+        jobs = skip_existing_articles(jobs, ArticleIndex(ARTICLES_DIR))
+    if DEDUP_POLICY:
+        topic_index = TopicIndex(DEDUP_THRESHOLD)
+        # Статьи других хранилищ (jsonl, sqlite) в индекс не попадают, только .md из ARTICLES_DIR
+        for topic in article_topics(ARTICLES_DIR):
+            topic_index.add(topic, existing=True)
+        jobs = deduplicate_topics(jobs, topic_index, DEDUP_POLICY, aliases_path=TOPIC_ALIASES_PATH)
 
+    sink = None
     try:
-        advanced_client = GPTClient()
+        rate_limiter = RateLimiter(
+            requests_per_minute=REQUESTS_PER_MINUTE,
+            tokens_per_minute=TOKENS_PER_MINUTE
+        )
+        cache = ResponseCache(
+            RESPONSE_CACHE_PATH,
+            ttl_seconds=RESPONSE_CACHE_TTL,
+            max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+            bypass=RESPONSE_CACHE_BYPASS,
+            refresh=RESPONSE_CACHE_REFRESH
+        )
+        metrics = MetricsRecorder()
+        # Настройки из .env и сетевой клиент создаются фабрикой при первом запросе клиента
+        circuit_breaker = CircuitBreaker(
+            failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+            recovery_timeout=CIRCUIT_RECOVERY_TIMEOUT
+        )
+        clients = ClientFactory(
+            rate_limiter=rate_limiter, cache=cache, metrics=metrics, circuit_breaker=circuit_breaker,
+            retry_policy=RetryPolicy(RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY)
+        )
+        if MODEL_ROUTING:
+            clients.router = ModelRouter(MODEL_ROUTING, escalation_model=clients.settings.model_advanced)
         # Создаем summarizer только если он понадобится
-        # summarizer = Summarizer()
-        article_generator = ArticleGenerator(gpt=advanced_client, language=LANGUAGE)
+        # summarizer = clients.summarizer()
+
+        model = clients.settings.model_advanced
+        if args.estimate:
+            run = new_cost_estimator(prompts, model, clients.router).estimate_run(jobs)
+            cost = f"${run.cost:.2f}" + (f" ({run.unpriced_topics} topics without a price)"
+                                         if run.unpriced_topics else "")
+            logger.info(
+                f"Estimated run: {run.topics} topics, {run.input_tokens} input + "
+                f"{run.output_tokens} output tokens, {cost}"
+            )
+            return
+
+        planner = None
+        if RUN_BUDGET_USD is not None:
+            planner = BudgetPlanner(
+                new_cost_estimator(prompts, model, clients.router), RUN_BUDGET_USD,
+                fallback_model=BUDGET_FALLBACK_MODEL, min_sections=BUDGET_MIN_SECTIONS
+            )
+            jobs = planner.plan(jobs)
 
-        for i, topic in enumerate(topics, 1):
-            logger.info(f"[{i}/{len(topics)}] Starting article generation for topic: {topic}")
-            logger.info(f"Step 1: Generating custom system prompt for topic: {topic}")
-            
+        sink = open_sink()
+
+        if args.batch:
+            run_batch(args.batch, list(jobs), clients, prompts, journal, sink)
+            export_metrics(metrics)
+            return
+
+        system_prompts = SystemPromptProvider(
+            prompts,
+            pool=ClientPool(
+                lambda: clients.gpt_client(context_policy=Stateless(), system_prompt=""),
+                size=SYSTEM_PROMPT_CLIENTS
+            ),
+            grouper=TopicGrouper(SYSTEM_PROMPT_GROUP_SIMILARITY) if SYSTEM_PROMPT_GROUP_SIMILARITY else None
+        )
+
+        def new_article_generator(job: TopicJob):
+            language = job.language or LANGUAGE
+            base_prompt = prompts.text("system_prompt", language)
+            # У каждой статьи свой клиент: conversation не должен смешиваться между темами
+            return clients.article_generator(
+                language, gpt=clients.gpt_client(
+                    system_prompt=base_prompt,
+                    prefix=[{"role": "system", "content": base_prompt}] if SHARED_PROMPT_PREFIX else None,
+                    **({"model": job.model} if job.model else {})
+                ),
+                max_workers=SECTION_WORKERS, journal=journal,
+                context_policies=CONTEXT_POLICIES, stream_tokens=STREAM_TOKENS, prompts=prompts,
+                system_prompts=system_prompts, pipeline_outline=PIPELINE_OUTLINE, max_sections=job.sections,
+                outline_from=job.outline_from
+            )
+
+        def log_article_summary(topic: str) -> None:
+            # Сводка статьи больше не нужна после записи: запись в метриках освобождается
+            summary = metrics.pop_article(topic)
+            logger.info(
+                f"Article successfully generated for topic: {topic} "
+                f"({sum(s['calls'] for s in summary.values())} calls, "
+                f"{sum(s['prompt_tokens'] + s['completion_tokens'] for s in summary.values())} tokens)"
+            )
+
+        if args.worker:
+            run_worker(args, jobs, new_article_generator, journal, rate_limiter, circuit_breaker, metrics,
+                       log_article_summary, sink)
+            logger.info(f"Response cache: {cache.hits} hits, {cache.misses} misses")
+            log_run_cost(metrics, planner)
+            export_metrics(metrics)
+            return
+
+        def generate(job: TopicJob) -> None:
+            topic = job.topic
+            if not args.resume:
+                journal.reset(topic)
+            article_generator = new_article_generator(job)
+            logger.info(f"Starting article generation for topic: {topic}")
+            languages = article_languages(job)
+            if isinstance(sink.sink, FileSink) and len(languages) == 1:
+                with labels(article=topic):
+                    # Разделы пишутся на диск по мере готовности, .md появляется атомарно в конце
+                    path = sink.sink.claim(topic, job.output_path)
+                    if stream_article_to_file(article_generator.iter_article(topic), topic, filepath=path) is None:
+                        raise RuntimeError(f"Article for topic '{topic}' was not saved")
+                journal.mark_done(topic)
+                log_article_summary(topic)
+                return
+
+            with labels(article=topic):
+                articles = article_generator.generate_translations(topic, languages)
+
+            def saved(future) -> None:
+                if future.exception() is None:
+                    journal.mark_done(topic)
+                    log_article_summary(topic)
+                else:
+                    metrics.pop_article(topic)
+
+            # Запись идет в фоне, поток генерации сразу берет следующую тему
+            write_article_versions(sink, job, articles).add_done_callback(saved)
+
+        def process(job: TopicJob) -> None:
             try:
-                article_text = article_generator.generate_article(topic)
-                save_article_to_file(article_text, topic)
-                logger.info(f"Article successfully generated for topic: {topic}")
-            except Exception as e:
-                logger.error(f"Failed to generate article for topic '{topic}': {e}")
-                logger.debug(traceback.format_exc())
-                # Продолжаем со следующей темой
-                continue
+                generate(job)
+            except Exception:
+                # Неудавшаяся тема тоже не должна оставлять свою статистику в памяти
+                metrics.pop_article(job.topic)
+                raise
+
+        scheduler = BatchScheduler(
+            max_concurrency=ARTICLE_WORKERS, rate_limiter=rate_limiter, circuit_breaker=circuit_breaker
+        )
+        report = scheduler.run(jobs, process)
+        sink.close()
+        if sink.failed:
+            logger.warning(f"{sink.failed} articles were generated but could not be saved")
 
+        logger.info(f"Response cache: {cache.hits} hits, {cache.misses} misses")
+        logger.info(f"System prompts: {system_prompts.misses} generated, {system_prompts.hits} reused")
+        log_run_cost(metrics, planner)
+        export_metrics(metrics)
+        if report.failed_topics:
+            logger.warning(f"Failed topics: {report.failed_topics}")
         logger.info("Article generation completed!")
     except Exception as e:
         logger.error(f"Critical error in article generation process: {e}")
         logger.debug(traceback.format_exc())
+    finally:
+        if sink is not None:
+            sink.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,213 @@
+import bisect
+import contextvars
+import json
+import re
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+
+_stage = contextvars.ContextVar("metrics_stage", default=None)
+_article = contextvars.ContextVar("metrics_article", default=None)
+
+# "section 12" -> "section": в агрегатах за запуск номера разделов не различаются
+_STAGE_NUMBER_RE = re.compile(r"\s+\d+$")
+
+# Верхние границы корзин гистограммы задержек, секунды (последняя корзина — +Inf)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def stage_name(stage: str | None) -> str | None:
+    """
+    Этап без номера раздела ("section 3" -> "section").
+    """
+    return _STAGE_NUMBER_RE.sub("", stage) if stage else stage
+
+
+@contextmanager
+def labels(stage: str | None = None, article: str | None = None):
+    """
+    Помечает все вызовы API внутри блока этапом и/или темой статьи.
+    Метки хранятся в contextvars, поэтому в пулах потоков задачи нужно
+    запускать через contextvars.copy_context().run.
+    """
+    tokens = []
+    if stage is not None:
+        tokens.append((_stage, _stage.set(stage)))
+    if article is not None:
+        tokens.append((_article, _article.set(article)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def current_stage() -> str | None:
+    return _stage.get()
+
+
+def current_article() -> str | None:
+    return _article.get()
+
+
+@dataclass
+class StageStats:
+    """
+    Накопленная статистика вызовов API одного этапа.
+    Задержки хранятся гистограммой с фиксированными корзинами LATENCY_BUCKETS:
+    память не растет с числом вызовов, а перцентили оцениваются по верхней
+    границе корзины (не выше максимальной задержки).
+    """
+    calls: int = 0
+    errors: int = 0
+    retries: int = 0
+    cache_hits: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    latency_total: float = 0.0
+    latency_max: float = 0.0
+    latency_buckets: list[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+
+    def add(self, latency: float, prompt_tokens: int, completion_tokens: int, cached_tokens: int,
+            retries: int, cache_hit: bool, error: bool) -> None:
+        self.calls += 1
+        self.errors += int(error)
+        self.retries += retries
+        self.cache_hits += int(cache_hit)
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.cached_tokens += cached_tokens
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        self.latency_buckets[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+    def percentile(self, q: float) -> float:
+        if not self.calls:
+            return 0.0
+        rank = min(self.calls - 1, int(q * self.calls))
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.latency_buckets):
+            seen += count
+            if seen > rank:
+                return min(bound, self.latency_max)
+        return self.latency_max
+
+    @property
+    def cached_ratio(self) -> float:
+        """
+        Доля входных токенов, которые провайдер взял из кэша промптов.
+        """
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "cache_hits": self.cache_hits,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cached_ratio": round(self.cached_ratio, 4),
+            "latency_total": round(self.latency_total, 4),
+            "latency_p50": round(self.percentile(0.5), 4),
+            "latency_p99": round(self.percentile(0.99), 4),
+        }
+
+
+class MetricsRecorder:
+    """
+    Собирает задержки, токены, повторы и попадания в кэш по каждому вызову API.
+    Агрегирует их по этапам за весь запуск и по этапам внутри каждой статьи,
+    экспортирует в JSON и текстовый формат Prometheus.
+    Отдельно агрегируется запуск по моделям (model — модель запроса): этапы
+    могут идти на разные модели, и стоимость считается по цене каждой из них.
+    """
+
+    def __init__(self, per_article: bool = True):
+        self.per_article = per_article
+        self._lock = threading.Lock()
+        self._run: dict[str, StageStats] = {}
+        self._models: dict[str, StageStats] = {}
+        self._articles: dict[str, dict[str, StageStats]] = {}
+
+    def record(self, latency: float, prompt_tokens: int = 0, completion_tokens: int = 0,
+               cached_tokens: int = 0, retries: int = 0, cache_hit: bool = False,
+               error: bool = False, model: str | None = None) -> None:
+        stage = current_stage() or "unknown"
+        article = current_article()
+        values = (latency, prompt_tokens, completion_tokens, cached_tokens, retries, cache_hit, error)
+        with self._lock:
+            run_stage = stage_name(stage)
+            self._run.setdefault(run_stage, StageStats()).add(*values)
+            self._models.setdefault(model or "unknown", StageStats()).add(*values)
+            if self.per_article and article is not None:
+                self._articles.setdefault(article, {}).setdefault(stage, StageStats()).add(*values)
+
+    def article_summary(self, article: str) -> dict:
+        with self._lock:
+            stages = self._articles.get(article, {})
+            return {stage: stats.to_dict() for stage, stats in stages.items()}
+
+    def pop_article(self, article: str) -> dict:
+        """
+        Возвращает сводку статьи и забывает ее: после записи статьи (или отказа
+        от нее) ее этапы больше не нужны, а на длинном запуске копились бы.
+        """
+        with self._lock:
+            stages = self._articles.pop(article, {})
+        return {stage: stats.to_dict() for stage, stats in stages.items()}
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "run": {stage: stats.to_dict() for stage, stats in self._run.items()},
+                "models": {model: stats.to_dict() for model, stats in self._models.items()},
+                "articles": {
+                    article: {stage: stats.to_dict() for stage, stats in stages.items()}
+                    for article, stages in self._articles.items()
+                },
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self) -> str:
+        """
+        Агрегаты за запуск в текстовом формате Prometheus (метки — этапы).
+        """
+        with self._lock:
+            run = {stage: stats.to_dict() for stage, stats in self._run.items()}
+            buckets = {stage: list(stats.latency_buckets) for stage, stats in self._run.items()}
+        metrics = [
+            ("llm_calls_total", "counter", "LLM API calls", "calls"),
+            ("llm_errors_total", "counter", "Failed LLM API calls", "errors"),
+            ("llm_retries_total", "counter", "Retried LLM API requests", "retries"),
+            ("llm_cache_hits_total", "counter", "Responses served from cache", "cache_hits"),
+            ("llm_prompt_tokens_total", "counter", "Prompt tokens", "prompt_tokens"),
+            ("llm_completion_tokens_total", "counter", "Completion tokens", "completion_tokens"),
+            ("llm_cached_tokens_total", "counter", "Prompt tokens served from provider cache", "cached_tokens"),
+            ("llm_cached_token_ratio", "gauge", "Share of prompt tokens served from provider cache", "cached_ratio"),
+            ("llm_latency_p50_seconds", "gauge", "Median LLM call latency", "latency_p50"),
+            ("llm_latency_p99_seconds", "gauge", "99th percentile LLM call latency", "latency_p99"),
+        ]
+        lines = []
+        for name, kind, description, key in metrics:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for stage, stats in sorted(run.items()):
+                lines.append(f'{name}{{stage="{stage}"}} {stats[key]}')
+
+        lines.append("# HELP llm_latency_seconds LLM call latency")
+        lines.append("# TYPE llm_latency_seconds histogram")
+        for stage, stats in sorted(run.items()):
+            seen = 0
+            for bound, count in zip(LATENCY_BUCKETS, buckets[stage]):
+                seen += count
+                lines.append(f'llm_latency_seconds_bucket{{stage="{stage}",le="{bound}"}} {seen}')
+            lines.append(f'llm_latency_seconds_bucket{{stage="{stage}",le="+Inf"}} {stats["calls"]}')
+            lines.append(f'llm_latency_seconds_sum{{stage="{stage}"}} {stats["latency_total"]}')
+            lines.append(f'llm_latency_seconds_count{{stage="{stage}"}} {stats["calls"]}')
+        return "\n".join(lines) + "\n"
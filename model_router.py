@@ -0,0 +1,84 @@
+from dataclasses import dataclass
+
+from metrics import stage_name
+from retry import is_quota_exhausted
+
+
+@dataclass(frozen=True)
+class StageProfile:
+    """
+    Параметры запросов этапа. None — значение клиента (модель и температура
+    из настроек, max_tokens без ограничения). fallback_models — модели,
+    на которые запрос переходит, если предыдущая не ответила из-за таймаута
+    или исчерпанной квоты.
+    """
+    model: str | None = None
+    temperature: float | None = None
+    max_tokens: int | None = None
+    fallback_models: tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class Route:
+    """
+    Конкретная попытка запроса: модель, температура и дополнительные параметры API.
+    """
+    model: str
+    temperature: float
+    max_tokens: int | None = None
+
+    def params(self) -> dict:
+        return {"max_tokens": self.max_tokens} if self.max_tokens is not None else {}
+
+
+def is_fallback_error(error: Exception) -> bool:
+    """
+    Ошибки, после которых запрос имеет смысл отправить другой модели: таймауты
+    и исчерпанная квота. Повторы на той же модели к этому моменту уже сделал
+    транспорт. Разомкнутый circuit breaker общий для провайдера, смена модели не поможет.
+    """
+    if is_quota_exhausted(error):
+        return True
+    # openai импортируется только здесь, как и в retry.is_retryable
+    from openai import APITimeoutError
+    import httpx
+    return isinstance(error, (APITimeoutError, httpx.TimeoutException, TimeoutError))
+
+
+class ModelRouter:
+    """
+    Сопоставляет этапам конвейера ("system_prompt", "outline", "section",
+    "translation", "summarize" и т.д. — метки labels(stage=...)) профили
+    модели. Этапы без профиля используют default.
+    escalation_model — модель, которой передается запрос со структурированным
+    ответом (outline), если ответ более дешевой модели не прошел проверку схемы.
+    """
+
+    def __init__(self, profiles: dict[str, StageProfile] | None = None, default: StageProfile | None = None,
+                 escalation_model: str | None = None):
+        self.profiles = profiles or {}
+        self.default = default or StageProfile()
+        self.escalation_model = escalation_model
+
+    def profile(self, stage: str | None) -> StageProfile:
+        return self.profiles.get(stage_name(stage), self.default)
+
+    def routes(self, stage: str | None, model: str, temperature: float) -> list[Route]:
+        """
+        Попытки для запроса этапа по порядку: модель профиля, затем запасные модели.
+        model и temperature — значения клиента для незаданных полей профиля.
+        """
+        profile = self.profile(stage)
+        temperature = temperature if profile.temperature is None else profile.temperature
+        models = [profile.model or model]
+        models.extend(fallback for fallback in profile.fallback_models if fallback not in models)
+        return [Route(name, temperature, profile.max_tokens) for name in models]
+
+    def escalation(self, route: Route) -> Route | None:
+        """
+        Попытка на escalation_model после неудачной проверки ответа route, если модель другая.
+        """
+        if not self.escalation_model or self.escalation_model == route.model:
+            return None
+        # Без max_tokens: невалидный JSON часто означает, что ответ обрезан лимитом
+        return Route(self.escalation_model, route.temperature)
@@ -0,0 +1,76 @@
+import json
+import logging
+from typing import Iterable, Iterator
+
+
+logger = logging.getLogger(__name__)
+
+
+class OutlineStreamParser:
+    """
+    Инкрементальный разбор outline из потока текста модели.
+
+    feed() принимает очередной кусок ответа и возвращает разделы outline,
+    чьи JSON-объекты уже закрылись. Разделом считается объект, который
+    лежит в массиве на первом или втором уровне вложенности — то есть
+    {"outline": [{...}, ...]} или просто [{...}, ...]. Текст вне JSON
+    (например, ```json) пропускается.
+    """
+
+    def __init__(self):
+        self._buffer: list[str] = []
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escape = False
+        self._capturing = False
+
+    def feed(self, chunk: str) -> list[dict]:
+        items = []
+        for char in chunk:
+            if self._capturing:
+                self._buffer.append(char)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"' and self._stack:
+                self._in_string = True
+            elif char in "{[":
+                if (char == "{" and not self._capturing and self._stack
+                        and self._stack[-1] == "[" and len(self._stack) <= 2):
+                    self._capturing = True
+                    self._buffer = [char]
+                self._stack.append(char)
+            elif char in "}]" and self._stack:
+                self._stack.pop()
+                if self._capturing and char == "}" and self._stack and self._stack[-1] == "[" \
+                        and len(self._stack) <= 2:
+                    self._capturing = False
+                    item = self._decode("".join(self._buffer))
+                    if item is not None:
+                        items.append(item)
+        return items
+
+    @staticmethod
+    def _decode(text: str) -> dict | None:
+        try:
+            item = json.loads(text)
+        except json.JSONDecodeError as e:
+            logger.warning("Skipping malformed outline item: %s", e)
+            return None
+        return item if isinstance(item, dict) else None
+
+
+def iter_outline_items(chunks: Iterable[str]) -> Iterator[dict]:
+    """
+    Отдает разделы outline по мере того, как они полностью приходят в потоке.
+    """
+    parser = OutlineStreamParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
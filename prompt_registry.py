@@ -0,0 +1,219 @@
+import logging
+import os
+import re
+import threading
+import time
+from string import Formatter
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_PROMPTS_DIR = "prompts"
+DEFAULT_RELOAD_INTERVAL = 2.0
+
+# Шаблоны, которые использует ArticleGenerator, и допустимые в них {плейсхолдеры}
+TEMPLATE_FIELDS = {
+    "system_prompt": set(),
+    "system_prompt_generator": {"topic"},
+    "outline_prompt": {"topic"},
+    "introduction_prompt": {"topic"},
+    "subtopics_prompt": {"topic", "section_title", "bullets"},
+    "conclusion_prompt": {"topic"},
+    "outline_translation_prompt": {"outline"},
+}
+# Необязательные шаблоны: без них действует текст по умолчанию в коде
+OPTIONAL_TEMPLATES = {"outline_translation_prompt"}
+
+_TEMPLATE_FILE_RE = re.compile(r"^(?P<name>.+)_(?P<language>[A-Z]{2})\.txt$")
+
+
+class PromptTemplateError(ValueError):
+    """
+    Шаблон промпта отсутствует или содержит недопустимые плейсхолдеры.
+    """
+
+
+class PromptTemplate:
+    """
+    Шаблон, разобранный один раз при загрузке: render() только склеивает
+    готовые куски текста с подставленными значениями.
+    """
+
+    def __init__(self, name: str, text: str):
+        self.name = name
+        self.text = text
+        try:
+            parsed = list(Formatter().parse(text))
+        except ValueError as e:
+            raise PromptTemplateError(f"Template '{name}' is malformed: {e}")
+
+        self.fields = {field for _, field, _, _ in parsed if field is not None}
+        # Спецификаторы формата и конверсии встречаются редко — для них используем str.format
+        self._simple = all(not spec and not conversion for _, _, spec, conversion in parsed)
+        self._parts = [(literal, field) for literal, field, _, _ in parsed]
+
+    def render(self, **values) -> str:
+        if not self._simple:
+            return self.text.format(**values)
+
+        try:
+            return "".join(
+                literal + (str(values[field]) if field is not None else "")
+                for literal, field in self._parts
+            )
+        except KeyError as e:
+            raise PromptTemplateError(f"Missing value {e} for template '{self.name}'")
+
+
+class PromptRegistry:
+    """
+    Загружает все шаблоны prompts/{name}_{LANG}.txt один раз и отдает их из памяти.
+
+    При загрузке проверяет, что для каждого языка есть все шаблоны из required
+    и что в них нет неизвестных плейсхолдеров. В строгом режиме ошибки
+    приводят к исключению (падение на старте, а не пустой промпт посреди
+    пакета), в нестрогом — логируются, а отсутствующий шаблон рендерится
+    пустой строкой, как раньше делал utils.load_prompts.
+    watch=True включает перечитывание шаблонов при изменении файлов.
+    """
+
+    def __init__(self, directory: str = DEFAULT_PROMPTS_DIR, languages: list[str] | None = None,
+                 required: list[str] | None = None, strict: bool = True, watch: bool = False,
+                 reload_interval: float = DEFAULT_RELOAD_INTERVAL):
+        self.directory = directory
+        self.languages = languages
+        if required is None:
+            required = [name for name in TEMPLATE_FIELDS if name not in OPTIONAL_TEMPLATES]
+        self.required = required
+        self.strict = strict
+        self.watch = watch
+        self.reload_interval = reload_interval
+
+        self._lock = threading.Lock()
+        self._templates: dict[tuple[str, str], PromptTemplate] = {}
+        self._mtimes: dict[str, float] = {}
+        self._checked = 0.0
+        self.load()
+
+    def _scan(self) -> dict[str, float]:
+        mtimes = {}
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.is_file() and _TEMPLATE_FILE_RE.match(entry.name):
+                        mtimes[entry.name] = entry.stat().st_mtime
+        except FileNotFoundError:
+            pass
+        return mtimes
+
+    def _compile(self, mtimes: dict[str, float]) -> tuple[dict, list[str]]:
+        templates = {}
+        errors = []
+        for filename in sorted(mtimes):
+            match = _TEMPLATE_FILE_RE.match(filename)
+            name, language = match.group("name"), match.group("language")
+            if self.languages is not None and language not in self.languages:
+                continue
+            try:
+                with open(os.path.join(self.directory, filename), "r", encoding="utf-8") as file:
+                    template = PromptTemplate(filename, file.read())
+            except (OSError, UnicodeDecodeError, PromptTemplateError) as e:
+                errors.append(f"{filename}: {e}")
+                continue
+
+            unknown = template.fields - TEMPLATE_FIELDS.get(name, template.fields)
+            if unknown:
+                errors.append(f"{filename}: unknown placeholders {sorted(unknown)}")
+                continue
+            templates[(name, language)] = template
+
+        languages = self.languages or sorted({language for _, language in templates})
+        for language in languages:
+            for name in self.required:
+                if (name, language) not in templates and not any(
+                    error.startswith(f"{name}_{language}.txt") for error in errors
+                ):
+                    errors.append(f"{name}_{language}.txt: template not found in '{self.directory}'")
+        return templates, errors
+
+    def load(self) -> None:
+        """
+        Загружает и проверяет все шаблоны. В строгом режиме при ошибках
+        бросает PromptTemplateError и оставляет ранее загруженные шаблоны.
+        """
+        mtimes = self._scan()
+        templates, errors = self._compile(mtimes)
+        if errors:
+            message = "Invalid prompt templates:\n" + "\n".join(errors)
+            if self.strict:
+                raise PromptTemplateError(message)
+            logger.error(message)
+
+        with self._lock:
+            self._templates = templates
+            self._mtimes = mtimes
+            self._checked = time.monotonic()
+        logger.info(f"Loaded {len(templates)} prompt templates from '{self.directory}'")
+
+    def _maybe_reload(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked < self.reload_interval:
+                return
+            self._checked = now
+        if self._scan() == self._mtimes:
+            return
+        try:
+            self.load()
+            logger.info("Prompt templates reloaded")
+        except PromptTemplateError as e:
+            logger.error(f"Prompt templates were not reloaded: {e}")
+
+    def get(self, name: str, language: str) -> PromptTemplate:
+        if self.watch:
+            self._maybe_reload()
+        template = self._templates.get((name, language))
+        if template is None:
+            if self.strict:
+                raise PromptTemplateError(f"Template '{name}_{language}.txt' is not loaded")
+            return PromptTemplate(f"{name}_{language}.txt", "")
+        return template
+
+    def has(self, name: str, language: str) -> bool:
+        if self.watch:
+            self._maybe_reload()
+        return (name, language) in self._templates
+
+    def available_languages(self) -> set[str]:
+        """
+        Языки, для которых загружены шаблоны.
+        """
+        if self.watch:
+            self._maybe_reload()
+        return {language for _, language in self._templates}
+
+    def text(self, name: str, language: str) -> str:
+        """
+        Исходный текст шаблона без подстановки (например, системный промпт).
+        """
+        return self.get(name, language).text
+
+    def render(self, name: str, language: str, **values) -> str:
+        return self.get(name, language).render(**values)
+
+
+_registry_lock = threading.Lock()
+_registry: PromptRegistry | None = None
+
+
+def get_registry() -> PromptRegistry:
+    """
+    Общий для процесса нестрогий реестр шаблонов из prompts/.
+    Используется, если реестр не передан явно.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = PromptRegistry(strict=False)
+        return _registry
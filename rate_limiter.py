@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+# Грубая оценка: ~4 символа на токен; уточняется фактическим usage из ответа
+CHARS_PER_TOKEN = 4
+DEFAULT_COMPLETION_TOKENS = 1000
+
+
+def estimate_tokens(messages: list[dict], max_tokens: int | None = None) -> int:
+    """
+    Оценивает число токенов запроса (промпт + ожидаемый ответ) до его отправки.
+    """
+    prompt_chars = sum(len(message.get("content") or "") for message in messages)
+    return prompt_chars // CHARS_PER_TOKEN + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+
+def retry_after_seconds(error: Exception) -> float | None:
+    """
+    Достает значение заголовка Retry-After из ошибки OpenAI, если оно есть.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """
+    Ограничитель скорости по бюджетам запросов (RPM) и токенов (TPM) в минуту.
+
+    Реализован как пара token bucket'ов с "долгом": reserve() сразу списывает
+    стоимость запроса и возвращает, сколько нужно подождать. После ответа 429
+    включается адаптивная пауза, которая удваивается при повторных 429
+    и постепенно снимается при успешных запросах.
+    """
+
+    def __init__(self, requests_per_minute: int | None = None, tokens_per_minute: int | None = None,
+                 backoff_base: float = 1.0, backoff_max: float = 60.0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._lock = threading.Lock()
+        self._requests = float(requests_per_minute or 0)
+        self._tokens = float(tokens_per_minute or 0)
+        self._updated = time.monotonic()
+        self._backoff = 0.0
+        self._cooldown_until = 0.0
+        self.rate_limited_count = 0
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        if self.requests_per_minute:
+            self._requests = min(
+                self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60
+            )
+        if self.tokens_per_minute:
+            self._tokens = min(
+                self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60
+            )
+
+    def reserve(self, tokens: int = 0) -> float:
+        """
+        Резервирует один запрос и tokens токенов, возвращает время ожидания в секундах.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0.0, self._cooldown_until - now)
+            if self.requests_per_minute:
+                self._requests -= 1
+                if self._requests < 0:
+                    wait = max(wait, -self._requests * 60 / self.requests_per_minute)
+            if self.tokens_per_minute and tokens:
+                self._tokens -= tokens
+                if self._tokens < 0:
+                    wait = max(wait, -self._tokens * 60 / self.tokens_per_minute)
+            return wait
+
+    def acquire(self, tokens: int = 0) -> None:
+        """
+        Блокирует поток, пока бюджет не позволит отправить запрос.
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int = 0) -> None:
+        """
+        Асинхронный аналог acquire.
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int | None) -> None:
+        """
+        Корректирует бюджет токенов по фактическому usage из ответа API.
+        """
+        if not self.tokens_per_minute or actual_tokens is None:
+            return
+        with self._lock:
+            self._tokens -= actual_tokens - estimated_tokens
+
+    def on_rate_limited(self, retry_after: float | None = None) -> float:
+        """
+        Регистрирует ответ 429: увеличивает паузу и возвращает ее длительность.
+        """
+        with self._lock:
+            self.rate_limited_count += 1
+            self._backoff = min(self.backoff_max, self._backoff * 2 if self._backoff else self.backoff_base)
+            pause = max(self._backoff, retry_after or 0.0)
+            self._cooldown_until = max(self._cooldown_until, time.monotonic() + pause)
+        logger.warning(f"Rate limited by OpenAI API, backing off for {pause:.1f}s")
+        return pause
+
+    def on_success(self) -> None:
+        """
+        Постепенно снимает адаптивную паузу после успешных запросов.
+        """
+        with self._lock:
+            if self._backoff:
+                self._backoff = self._backoff / 2 if self._backoff / 2 >= self.backoff_base else 0.0
+
+    def cooldown_remaining(self) -> float:
+        with self._lock:
+            return max(0.0, self._cooldown_until - time.monotonic())
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+
+from rate_limiter import retry_after_seconds
+
+
+logger = logging.getLogger(__name__)
+
+
+# HTTP-статусы, после которых запрос имеет смысл повторить
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Запрос не отправлен: circuit breaker разомкнут после серии сбоев провайдера.
+    """
+
+
+def is_rate_limit(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429
+
+
+def is_quota_exhausted(error: Exception) -> bool:
+    """
+    429 из-за исчерпанной квоты (insufficient_quota): в отличие от лимита
+    RPM/TPM, повтор на той же модели не поможет.
+    """
+    if not is_rate_limit(error):
+        return False
+    body = getattr(error, "body", None)
+    code = getattr(error, "code", None) or (body.get("code") if isinstance(body, dict) else None)
+    return code == "insufficient_quota"
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Временные сбои (таймауты, обрывы соединения, 429, 5xx) — повторяемые.
+    Ошибки запроса и доступа (400, 401, 403, 404, 422), исчерпанная квота
+    и все прочие — фатальные.
+    """
+    if isinstance(error, CircuitOpenError) or is_quota_exhausted(error):
+        return False
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES or status_code >= 500
+
+    # openai импортируется только здесь: ошибки без статуса — сетевые
+    from openai import APIConnectionError
+    import httpx
+    return isinstance(error, (APIConnectionError, httpx.TransportError, TimeoutError, ConnectionError))
+
+
+class RetryPolicy:
+    """
+    Повторы временных ошибок с экспоненциальной задержкой и "полным" джиттером:
+    пауза перед попыткой n выбирается случайно из [0, min(max_delay, base * 2**(n-1))].
+    Если сервер прислал Retry-After, ждем не меньше указанного.
+    """
+
+    def __init__(self, max_attempts: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, error: Exception, attempt: int) -> bool:
+        """
+        attempt — номер неудачной попытки, начиная с 1.
+        """
+        return attempt < self.max_attempts and is_retryable(error)
+
+    def delay(self, attempt: int, retry_after: float | None = None) -> float:
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        return max(backoff, min(retry_after or 0.0, self.max_delay))
+
+
+class CircuitBreaker:
+    """
+    Размыкается после failure_threshold подряд идущих временных сбоев и
+    на recovery_timeout секунд перестает пропускать запросы. Затем пропускает
+    один пробный запрос: успех замыкает цепь, сбой снова размыкает ее.
+
+    acquire() ждет, пока запрос можно отправить (не дольше max_wait), а
+    cooldown_remaining() позволяет BatchScheduler не начинать новые темы,
+    пока провайдер недоступен.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0,
+                 max_wait: float | None = 300.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_timeout = recovery_timeout
+        self.max_wait = max_wait
+
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.opened_count = 0
+
+    def reserve(self) -> float:
+        """
+        Возвращает 0, если запрос можно отправить сейчас, иначе — сколько подождать.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return 0.0
+            now = time.monotonic()
+            remaining = self._opened_at + self.recovery_timeout - now
+            if self.state == self.OPEN and remaining <= 0:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return 0.0
+            # Пока идет пробный запрос, остальные ждут его результата
+            return max(remaining, min(1.0, self.recovery_timeout))
+
+    def acquire(self) -> None:
+        deadline = None if self.max_wait is None else time.monotonic() + self.max_wait
+        while True:
+            wait = self.reserve()
+            if wait <= 0:
+                return
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise CircuitOpenError("LLM provider is unavailable, circuit breaker is open")
+            time.sleep(wait)
+
+    async def acquire_async(self) -> None:
+        deadline = None if self.max_wait is None else time.monotonic() + self.max_wait
+        while True:
+            wait = self.reserve()
+            if wait <= 0:
+                return
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise CircuitOpenError("LLM provider is unavailable, circuit breaker is open")
+            await asyncio.sleep(wait)
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("LLM provider recovered, circuit breaker closed")
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        """
+        Учитывает временный сбой; фатальные ошибки сюда передавать не нужно.
+        """
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened_count += 1
+                    logger.warning(
+                        f"Circuit breaker opened after {self._failures} failures, "
+                        f"pausing requests for {self.recovery_timeout:.0f}s"
+                    )
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """
+        Снимает пробный запрос, исход которого ничего не говорит о провайдере
+        (локальная ошибка без ответа, отмена): цепь остается полуоткрытой,
+        и следующий запрос станет новым пробным.
+        """
+        with self._lock:
+            self._probing = False
+
+    def cooldown_remaining(self) -> float:
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self.recovery_timeout - time.monotonic())
+
+
+def retry_delay(error: Exception, attempt: int, policy: RetryPolicy | None) -> float | None:
+    """
+    Пауза перед повтором после ошибки или None, если повторять не нужно.
+    """
+    if policy is None or not policy.should_retry(error, attempt):
+        return None
+    return policy.delay(attempt, retry_after_seconds(error))
@@ -0,0 +1,124 @@
+import logging
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Callable, Iterable
+
+from rate_limiter import RateLimiter
+from retry import CircuitBreaker
+
+
+logger = logging.getLogger(__name__)
+
+_EXHAUSTED = object()
+
+
+@dataclass
+class BatchReport:
+    """
+    Итоги пакетного запуска.
+    """
+    succeeded: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+    failed_topics: list[str] = field(default_factory=list)
+
+    @property
+    def completed(self) -> int:
+        return self.succeeded + self.failed
+
+    @property
+    def articles_per_minute(self) -> float:
+        return self.succeeded * 60 / self.elapsed if self.elapsed else 0.0
+
+
+class BatchScheduler:
+    """
+    Запускает генерацию нескольких статей одновременно.
+
+    Темы берутся из итератора лениво: в работе одновременно не больше
+    max_concurrency тем, поэтому входной поток может быть сколь угодно большим.
+    Пока общий RateLimiter держит паузу после 429 или разомкнут CircuitBreaker
+    транспорта, новые темы не запускаются.
+    """
+
+    def __init__(self, max_concurrency: int = 4, rate_limiter: RateLimiter | None = None,
+                 progress_every: int = 1, circuit_breaker: CircuitBreaker | None = None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.rate_limiter = rate_limiter
+        self.progress_every = max(1, progress_every)
+        self.circuit_breaker = circuit_breaker
+
+    def _wait_for_provider(self) -> None:
+        """
+        Ждет окончания паузы rate_limiter и восстановления после сбоя провайдера.
+        """
+        while True:
+            if self.rate_limiter:
+                cooldown = self.rate_limiter.cooldown_remaining()
+                if cooldown > 0:
+                    logger.info(f"Rate limit cooldown, delaying new topics for {cooldown:.1f}s")
+                    time.sleep(cooldown)
+                    continue
+            if self.circuit_breaker is not None:
+                cooldown = self.circuit_breaker.cooldown_remaining()
+                if cooldown > 0:
+                    logger.warning(f"LLM provider unavailable, pausing new topics for {cooldown:.1f}s")
+                    time.sleep(cooldown)
+                    continue
+            return
+
+    def _log_progress(self, report: BatchReport, total: int | None, started: float) -> None:
+        report.elapsed = time.monotonic() - started
+        position = f"{report.completed}/{total}" if total else str(report.completed)
+        logger.info(
+            f"Progress: [{position}] done, {report.failed} failed, "
+            f"{report.articles_per_minute:.2f} articles/min"
+        )
+
+    def run(self, topics: Iterable[str], process: Callable[[str], None],
+            total: int | None = None) -> BatchReport:
+        """
+        Вызывает process(topic) для каждой темы с ограниченным параллелизмом.
+        Ошибки обработки темы не прерывают пакет, а учитываются в отчете.
+        """
+        report = BatchReport()
+        started = time.monotonic()
+        topic_iter = iter(topics)
+        in_flight = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            exhausted = False
+            while in_flight or not exhausted:
+                while not exhausted and len(in_flight) < self.max_concurrency:
+                    topic = next(topic_iter, _EXHAUSTED)
+                    if topic is _EXHAUSTED:
+                        exhausted = True
+                        break
+                    self._wait_for_provider()
+                    in_flight[executor.submit(process, topic)] = topic
+
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    topic = in_flight.pop(future)
+                    try:
+                        future.result()
+                        report.succeeded += 1
+                    except Exception as e:
+                        report.failed += 1
+                        report.failed_topics.append(str(topic))
+                        logger.error(f"Failed to generate article for topic '{topic}': {e}")
+                        logger.debug(traceback.format_exc())
+                    if report.completed % self.progress_every == 0:
+                        self._log_progress(report, total, started)
+
+        report.elapsed = time.monotonic() - started
+        logger.info(
+            f"Batch finished: {report.succeeded} succeeded, {report.failed} failed "
+            f"in {report.elapsed:.1f}s ({report.articles_per_minute:.2f} articles/min)"
+        )
+        return report
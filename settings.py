@@ -0,0 +1,149 @@
+import os
+import threading
+from dataclasses import dataclass, replace
+
+
+ENV_FILE = ".env"
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Настройки моделей и доступа к API. Читаются из .env (и переменных окружения)
+    при первом обращении к get_settings(), а не при импорте модулей.
+    """
+    openai_api_key: str | None = None
+    openai_base_url: str | None = None
+    model_advanced: str | None = None
+    model_summarizer: str | None = None
+    temperature: float = 0.7
+    summary_max_sentences: int = 3
+
+    @classmethod
+    def from_env(cls, path: str = ENV_FILE) -> "Settings":
+        """
+        Значения из файла path; переменные окружения процесса имеют приоритет.
+        """
+        from dotenv import dotenv_values
+
+        values = {**dotenv_values(path), **os.environ}
+        defaults = cls()
+        return cls(
+            openai_api_key=values.get("OPENAI_API_KEY"),
+            openai_base_url=values.get("OPENAI_BASE_URL"),
+            model_advanced=values.get("MODEL_ADVANCED"),
+            model_summarizer=values.get("MODEL_SUMMARIZER"),
+            temperature=float(values.get("TEMPERATURE") or defaults.temperature),
+            summary_max_sentences=int(values.get("SUMMARY_MAX_SENTENCES") or defaults.summary_max_sentences),
+        )
+
+    def with_overrides(self, **overrides) -> "Settings":
+        return replace(self, **overrides)
+
+
+_lock = threading.Lock()
+_settings: Settings | None = None
+
+
+def get_settings() -> Settings:
+    """
+    Настройки процесса; .env читается один раз при первом вызове.
+    """
+    global _settings
+    with _lock:
+        if _settings is None:
+            _settings = Settings.from_env()
+        return _settings
+
+
+def configure(settings: Settings | None) -> None:
+    """
+    Явно задает настройки процесса (например, в тестах); None сбрасывает их,
+    и следующий get_settings() снова прочитает .env.
+    """
+    global _settings
+    with _lock:
+        _settings = settings
+
+
+class ClientFactory:
+    """
+    Создает GPTClient, Summarizer и ArticleGenerator с явно переданными
+    настройками и общим транспортом. Транспорт (и сетевой клиент OpenAI)
+    создается при первом запросе клиента, а не при создании фабрики.
+    Без параметров транспорта (transport_options, base_url) фабрика берет общий
+    для процесса транспорт get_transport; с параметрами — создает собственный,
+    иначе параметры второй фабрики молча терялись бы.
+    router (model_router.ModelRouter) передается всем создаваемым GPT-клиентам.
+    """
+
+    def __init__(self, settings: Settings | None = None, transport=None, router=None, **transport_options):
+        self._settings = settings
+        self._transport = transport
+        self.router = router
+        self._transport_options = transport_options
+        self._lock = threading.Lock()
+
+    @property
+    def settings(self) -> Settings:
+        if self._settings is None:
+            self._settings = get_settings()
+        return self._settings
+
+    @property
+    def transport(self):
+        with self._lock:
+            if self._transport is None:
+                from transport import Transport, get_transport
+                options = dict(self._transport_options)
+                if self.settings.openai_base_url:
+                    options.setdefault("base_url", self.settings.openai_base_url)
+                if options:
+                    self._transport = Transport(self.settings.openai_api_key, **options)
+                else:
+                    self._transport = get_transport(self.settings.openai_api_key)
+            return self._transport
+
+    def gpt_client(self, **kwargs):
+        from gpt_client import GPTClient
+
+        kwargs.setdefault("model", self.settings.model_advanced)
+        kwargs.setdefault("temperature", self.settings.temperature)
+        kwargs.setdefault("transport", self.transport)
+        kwargs.setdefault("router", self.router)
+        return GPTClient(**kwargs)
+
+    def summarizer(self, **kwargs):
+        from summarizer import Summarizer
+
+        kwargs.setdefault("model", self.settings.model_summarizer)
+        kwargs.setdefault("temperature", self.settings.temperature)
+        kwargs.setdefault("transport", self.transport)
+        kwargs.setdefault("max_sentences", self.settings.summary_max_sentences)
+        return Summarizer(**kwargs)
+
+    def article_generator(self, language: str, gpt=None, **kwargs):
+        from article_generator import ArticleGenerator
+
+        return ArticleGenerator(gpt=gpt or self.gpt_client(), language=language, **kwargs)
+
+
+# Старые модульные константы -> поля Settings
+_LEGACY_NAMES = {
+    "OPENAI_API_KEY": "openai_api_key",
+    "MODEL_ADVANCED": "model_advanced",
+    "MODEL_SUMMARIZER": "model_summarizer",
+    "TEMPERATURE": "temperature",
+    "SUMMARY_MAX_SENTENCES": "summary_max_sentences",
+}
+
+
+def legacy_setting(module: str, name: str):
+    """
+    Значение для старых модульных констант (gpt_client.MODEL_ADVANCED и т.п.),
+    которые теперь вычисляются при обращении через __getattr__ модуля.
+    """
+    field = _LEGACY_NAMES.get(name)
+    if field is None:
+        raise AttributeError(f"module '{module}' has no attribute '{name}'")
+    return getattr(get_settings(), field)
@@ -1,21 +1,22 @@
-from dotenv import dotenv_values
-from openai import OpenAI
+from settings import get_settings, legacy_setting
+from transport import Transport, AsyncTransport, get_transport, get_async_transport
+from context_policy import ContextPolicy, Stateless
+from metrics import labels
+from cost_estimator import TokenCounter, split_text
+import asyncio
 import logging
 
 
 logger = logging.getLogger(__name__)
-config = dotenv_values(".env")
 
 
-MODEL_SUMMARIZER = config["MODEL_SUMMARIZER"]
-TEMPERATURE = float(config["TEMPERATURE"])
-SUMMARY_MAX_SENTENCES = int(config["SUMMARY_MAX_SENTENCES"])
-OPENAI_API_KEY = config["OPENAI_API_KEY"]
+# Текст длиннее этого пересказывается по частям (map-reduce), а не одним запросом
+MAX_INPUT_TOKENS = 12_000
 
 
-CLIENT = OpenAI(
-    api_key=OPENAI_API_KEY
-)
+def __getattr__(name: str):
+    # MODEL_SUMMARIZER, TEMPERATURE, SUMMARY_MAX_SENTENCES, OPENAI_API_KEY читаются из настроек при обращении
+    return legacy_setting(__name__, name)
 
 
 class Summarizer:
@@ -23,9 +24,24 @@ class Summarizer:
     Класс для генерации краткого summary (поддерживает собственное хранение контекста при желании).
     """
 
-    def __init__(self, model: str = MODEL_SUMMARIZER, temperature: float = TEMPERATURE):
-        self.model = model
-        self.temperature = float(temperature)  # Приводим к float (если строка)
+    def __init__(self, model: str | None = None, temperature: float | None = None,
+                 transport: Transport | None = None, context_policy: ContextPolicy | None = None,
+                 max_sentences: int | None = None, max_input_tokens: int = MAX_INPUT_TOKENS):
+        """
+        Незаданные параметры берутся из settings.get_settings() и общего транспорта процесса.
+        Текст длиннее max_input_tokens делится на части, каждая пересказывается
+        отдельно, а затем пересказываются сами пересказы.
+        """
+        settings = get_settings() if None in (model, temperature, transport, max_sentences) else None
+        self.model = settings.model_summarizer if model is None else model
+        self.temperature = float(settings.temperature if temperature is None else temperature)
+        self.max_sentences = settings.summary_max_sentences if max_sentences is None else max_sentences
+        # Тот же общий транспорт, что и у GPTClient
+        self.transport = transport or get_transport(settings.openai_api_key)
+        self.max_input_tokens = max_input_tokens
+        self.counter = TokenCounter(self.model)
+        # Тексты для summary независимы, поэтому по умолчанию прошлые запросы не отправляются
+        self.context_policy = context_policy or Stateless()
         # Отдельный контекст; можно сделать иначе, но, как правило, Summarizer —
         # отдельный, более простой сценарий
         self.conversation = [
@@ -38,29 +54,112 @@ class Summarizer:
             }
         ]
 
-    def summarize(self, text: str, max_sentences: int = SUMMARY_MAX_SENTENCES) -> str:
-        """
-        Генерирует краткое summary исходного текста (до max_sentences предложений).
-        """
-        prompt = (
+    @staticmethod
+    def _build_prompt(text: str, max_sentences: int) -> str:
+        return (
             f"Please summarize the following text in no more than {max_sentences} sentences:\n\n{text}"
         )
 
-        self.conversation.append({"role": "user", "content": prompt})
+    def _chunks(self, text: str) -> list[str]:
+        if self.counter.count(text) <= self.max_input_tokens:
+            return [text]
+        chunks = split_text(text, self.max_input_tokens, self.counter)
+        logger.info(f"Summarizing a long text in {len(chunks)} parts")
+        return chunks
+
+    def _request(self, prompt: str, keep: bool) -> list[dict]:
+        """
+        Сообщения запроса; keep=False — запрос не остается в conversation.
+        """
+        message = {"role": "user", "content": prompt}
+        if not keep:
+            return self.context_policy.build([*self.conversation, message])
+        self.conversation.append(message)
+        return self.context_policy.build(self.conversation)
 
+    def _complete(self, text: str, max_sentences: int, timeout: float | None, keep: bool = True) -> str:
+        """
+        Пересказ одного куска текста. Части длинного текста пересказываются
+        с keep=False: в conversation остается только итоговый пересказ,
+        иначе на больших текстах память растет с каждым вызовом.
+        """
+        messages = self._request(self._build_prompt(text, max_sentences), keep)
         try:
-            response = CLIENT.chat.completions.create(
-                model=self.model,
-                messages=self.conversation,
-                temperature=self.temperature
-            )
+            with labels(stage="summarize"):
+                summary = self.transport.complete(
+                    model=self.model,
+                    messages=messages,
+                    temperature=self.temperature,
+                    timeout=timeout
+                )
 
-            summary = response.choices[0].message.content.strip()
             # Сохраняем ответ
-            self.conversation.append({"role": "assistant", "content": summary})
+            if keep:
+                self.conversation.append({"role": "assistant", "content": summary})
             return summary
             
         except Exception as e:
-            error_msg = f"Неожиданная ошибка при обращении к OpenAI API: {str(e)}"
-            logger.error(error_msg)
-            raise Exception(error_msg)
+            logger.error(f"Ошибка при обращении к OpenAI API: {type(e).__name__}: {e}")
+            raise
+
+    def summarize(self, text: str, max_sentences: int | None = None,
+                  timeout: float | None = None) -> str:
+        """
+        Генерирует краткое summary исходного текста (до max_sentences предложений).
+        """
+        max_sentences = max_sentences or self.max_sentences
+        chunks = self._chunks(text)
+        if len(chunks) == 1:
+            return self._complete(text, max_sentences, timeout)
+        partial = [self._complete(chunk, max_sentences, timeout, keep=False) for chunk in chunks]
+        return self.summarize("\n\n".join(partial), max_sentences, timeout)
+
+
+class AsyncSummarizer(Summarizer):
+    """
+    Асинхронный вариант Summarizer поверх общего AsyncTransport.
+    """
+
+    def __init__(self, model: str | None = None, temperature: float | None = None,
+                 transport: AsyncTransport | None = None, context_policy: ContextPolicy | None = None,
+                 max_sentences: int | None = None, max_input_tokens: int = MAX_INPUT_TOKENS):
+        super().__init__(
+            model=model,
+            temperature=temperature,
+            transport=transport or get_async_transport(get_settings().openai_api_key),
+            context_policy=context_policy,
+            max_sentences=max_sentences,
+            max_input_tokens=max_input_tokens
+        )
+
+    async def _complete(self, text: str, max_sentences: int, timeout: float | None, keep: bool = True) -> str:
+        # Сообщения собираются до первого await, поэтому параллельные части не путаются
+        messages = self._request(self._build_prompt(text, max_sentences), keep)
+        try:
+            with labels(stage="summarize"):
+                summary = await self.transport.complete(
+                    model=self.model,
+                    messages=messages,
+                    temperature=self.temperature,
+                    timeout=timeout
+                )
+            if keep:
+                self.conversation.append({"role": "assistant", "content": summary})
+            return summary
+        except Exception as e:
+            logger.error(f"Ошибка при обращении к OpenAI API: {type(e).__name__}: {e}")
+            raise
+
+    async def summarize(self, text: str, max_sentences: int | None = None,
+                        timeout: float | None = None) -> str:
+        """
+        Асинхронный аналог Summarizer.summarize; части длинного текста пересказываются параллельно.
+        """
+        max_sentences = max_sentences or self.max_sentences
+        chunks = self._chunks(text)
+        if len(chunks) == 1:
+            return await self._complete(text, max_sentences, timeout)
+        partial = await asyncio.gather(*(
+            self._complete(chunk, max_sentences, timeout, keep=False) for chunk in chunks
+        ))
+        return await self.summarize("\n\n".join(partial), max_sentences, timeout)
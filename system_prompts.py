@@ -0,0 +1,182 @@
+import logging
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Callable
+
+from gpt_client import GPTClient
+from context_policy import Stateless
+from prompt_registry import PromptRegistry, get_registry
+from metrics import labels
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_POOL_SIZE = 4
+# Сколько ждать свободного клиента пула, секунды
+DEFAULT_LEASE_TIMEOUT = 300.0
+# Шаг ожидания: между шагами проверяется, не освободилось ли место после неудачного создания клиента
+_LEASE_POLL_INTERVAL = 1.0
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_SIMILARITY = 0.8
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize_topic(topic: str) -> str:
+    """
+    Ключ темы для кэша: регистр, пунктуация и лишние пробелы не учитываются.
+    """
+    return " ".join(_WORD_RE.findall(topic.lower()))
+
+
+class ClientPool:
+    """
+    Пул GPT-клиентов для одиночных запросов без истории.
+    Клиенты создаются фабрикой по мере надобности (не больше size)
+    и переиспользуются; при выдаче их conversation сбрасывается.
+    Если свободного клиента нет дольше timeout секунд, lease бросает TimeoutError.
+    """
+
+    def __init__(self, factory: Callable[[], GPTClient] | None = None, size: int = DEFAULT_POOL_SIZE,
+                 timeout: float = DEFAULT_LEASE_TIMEOUT):
+        # Системный промпт клиента задается при выдаче, поэтому файл по умолчанию не читаем
+        self.factory = factory or (lambda: GPTClient(context_policy=Stateless(), system_prompt=""))
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._idle: queue.LifoQueue[GPTClient] = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+
+    @contextmanager
+    def lease(self, system_prompt: str):
+        """
+        Выдает свободный клиент с указанным системным промптом и возвращает его в пул после блока.
+        """
+        client = self._acquire()
+        client.conversation = [{"role": "system", "content": system_prompt}]
+        try:
+            yield client
+        finally:
+            self._idle.put(client)
+
+    def _acquire(self) -> GPTClient:
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            if create:
+                try:
+                    return self.factory()
+                except BaseException:
+                    # Неудачное создание не должно навсегда занять место в пуле
+                    with self._lock:
+                        self._created -= 1
+                    raise
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"No free client in pool after {self.timeout}s")
+            try:
+                return self._idle.get(timeout=min(remaining, _LEASE_POLL_INTERVAL))
+            except queue.Empty:
+                continue
+
+
+class TopicGrouper:
+    """
+    Объединяет похожие темы в группы: тема попадает в группу первой темы,
+    с которой ее множество слов совпадает по коэффициенту Жаккара не меньше threshold.
+    Ключ группы — нормализованная первая тема.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_SIMILARITY):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._groups: list[tuple[str, frozenset[str]]] = []
+
+    def key(self, topic: str) -> str:
+        normalized = normalize_topic(topic)
+        words = frozenset(normalized.split())
+        with self._lock:
+            for group_key, group_words in self._groups:
+                union = words | group_words
+                if union and len(words & group_words) / len(union) >= self.threshold:
+                    return group_key
+            self._groups.append((normalized, words))
+        return normalized
+
+
+class SystemPromptProvider:
+    """
+    Генерирует системные промпты для тем через общий пул клиентов и
+    запоминает их по нормализованной теме и языку. Одновременные запросы
+    одного ключа ждут один и тот же вызов API. С grouper похожие темы
+    получают промпт, сгенерированный для первой темы группы.
+    При ошибке возвращается стандартный system_prompt из реестра (он не кэшируется).
+    """
+
+    def __init__(self, prompts: PromptRegistry | None = None, pool: ClientPool | None = None,
+                 grouper: TopicGrouper | None = None, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.prompts = prompts or get_registry()
+        self.pool = pool or ClientPool()
+        self.grouper = grouper
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._prompts: OrderedDict[tuple[str, str], str] = OrderedDict()
+        self._pending: dict[tuple[str, str], Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, topic: str, language: str) -> tuple[str, str]:
+        group = self.grouper.key(topic) if self.grouper else normalize_topic(topic)
+        return group, language
+
+    def get(self, topic: str, language: str) -> str:
+        key = self._key(topic, language)
+        with self._lock:
+            if key in self._prompts:
+                self._prompts.move_to_end(key)
+                self.hits += 1
+                return self._prompts[key]
+            pending = self._pending.get(key)
+            if pending is None:
+                self.misses += 1
+                future = self._pending[key] = Future()
+        if pending is not None:
+            return pending.result()
+
+        system_prompt = None
+        try:
+            system_prompt = self._generate(topic, language)
+            with self._lock:
+                self._prompts[key] = system_prompt
+                if len(self._prompts) > self.max_entries:
+                    self._prompts.popitem(last=False)
+        except Exception as e:
+            logger.error(f"Failed to generate system prompt: {e}")
+            system_prompt = self.prompts.text("system_prompt", language)
+        finally:
+            with self._lock:
+                del self._pending[key]
+            future.set_result(system_prompt)
+        return system_prompt
+
+    def _generate(self, topic: str, language: str) -> str:
+        user_prompt = self.prompts.render("system_prompt_generator", language, topic=topic)
+        with self.pool.lease(self.prompts.text("system_prompt", language)) as client:
+            with labels(stage="system_prompt"):
+                system_prompt = client.chat(user_prompt)
+        logger.info(f"Generated custom system prompt for topic: {topic}")
+        return system_prompt
@@ -0,0 +1,111 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from article_generator import ArticleGenerator
+from batch import BatchRunner, LocalBatchBackend, OpenAIBatchBackend
+from gpt_client import GPTClient
+from metrics import current_stage
+from prompt_registry import PromptRegistry, TEMPLATE_FIELDS
+from utils import TopicJob
+
+
+OUTLINE = json.dumps({"outline": [
+    {"title": "Раздел A", "subtopics": ["1"]},
+    {"title": "Заключение", "subtopics": ["2"]},
+    {"title": "Раздел B", "subtopics": ["3"]},
+]}, ensure_ascii=False)
+
+
+def fake_complete(model, messages, temperature, **kwargs):
+    prompt = messages[-1]["content"]
+    if prompt.startswith("system_prompt_generator"):
+        return "Системный промпт"
+    if prompt.startswith("outline_prompt"):
+        return OUTLINE
+    return f"Текст для {prompt}"
+
+
+class TestBatchRunner(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        for name in TEMPLATE_FIELDS:
+            fields = " ".join(f"{{{field}}}" for field in sorted(TEMPLATE_FIELDS[name]))
+            with open(os.path.join(self.tmpdir.name, f"{name}_RU.txt"), "w", encoding="utf-8") as file:
+                file.write(f"{name} {fields}")
+        self.prompts = PromptRegistry(self.tmpdir.name)
+        self.transport = MagicMock()
+        self.transport.complete.side_effect = fake_complete
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_local_backend_runs_all_stages(self):
+        generator = ArticleGenerator(GPTClient(transport=self.transport), "RU", prompts=self.prompts)
+        runner = BatchRunner(LocalBatchBackend(self.transport), generator, poll_interval=0)
+        articles = runner.run([TopicJob("Тема 1"), TopicJob("Тема 2")])
+
+        self.assertEqual(set(articles), {"Тема 1", "Тема 2"})
+        self.assertTrue(articles["Тема 1"].startswith("# Тема 1\n\n## Раздел A\n"))
+        self.assertIn("## Раздел B\nТекст для subtopics_prompt", articles["Тема 1"])
+        self.assertNotIn("Заключение", articles["Тема 1"])
+        # 2 системных промпта + 2 outline + 4 раздела
+        self.assertEqual(self.transport.complete.call_count, 8)
+        section_messages = self.transport.complete.call_args_list[-1].kwargs["messages"]
+        self.assertEqual(section_messages[0]["content"], "Системный промпт")
+
+    def test_honours_job_options_and_stage_labels(self):
+        stages = []
+        self.transport.complete.side_effect = lambda **kwargs: stages.append(current_stage()) or fake_complete(**kwargs)
+        generator = ArticleGenerator(GPTClient(model="big", transport=self.transport), "RU", prompts=self.prompts)
+        runner = BatchRunner(LocalBatchBackend(self.transport, max_workers=1), generator, poll_interval=0)
+        articles = runner.run([TopicJob("Тема 1", sections=1, model="small"), TopicJob("Тема 2")])
+
+        self.assertIn("## Раздел A", articles["Тема 1"])
+        self.assertNotIn("## Раздел B", articles["Тема 1"])
+        self.assertIn("## Раздел B", articles["Тема 2"])
+        models = [call.kwargs["model"] for call in self.transport.complete.call_args_list]
+        self.assertEqual(models, ["small", "big", "small", "big", "small", "big", "big"])
+        self.assertEqual(stages, ["system_prompt"] * 2 + ["outline"] * 2 + ["section 1", "section 1", "section 2"])
+
+    def test_large_stage_is_split_into_batches(self):
+        backend = LocalBatchBackend(self.transport)
+        submitted = []
+        submit = backend.submit
+        backend.submit = lambda stage, requests, stages=None: submitted.append((stage, len(requests))) or submit(
+            stage, requests, stages)
+        generator = ArticleGenerator(GPTClient(transport=self.transport), "RU", prompts=self.prompts)
+        runner = BatchRunner(backend, generator, poll_interval=0, max_requests=3)
+        articles = runner.run([TopicJob(f"Тема {i}") for i in range(4)])
+
+        self.assertEqual(len(articles), 4)
+        self.assertEqual(submitted, [("system_prompt", 3), ("system_prompt", 1), ("outline", 3), ("outline", 1),
+                                     ("section", 3), ("section", 3), ("section", 2)])
+
+        runner.max_bytes = 10
+        with self.assertRaises(ValueError):
+            runner.run([TopicJob("Тема 1")])
+
+    def test_split_respects_byte_limit(self):
+        generator = ArticleGenerator(GPTClient(transport=self.transport), "RU", prompts=self.prompts)
+        requests = [{"custom_id": str(i), "body": {"messages": "x" * 50}} for i in range(5)]
+        size = len(json.dumps(requests[0]).encode("utf-8")) + 1
+        runner = BatchRunner(LocalBatchBackend(self.transport), generator, max_bytes=2 * size)
+        self.assertEqual([len(batch) for batch in runner._split(requests)], [2, 2, 1])
+
+    def test_openai_backend_parses_output_file(self):
+        client = MagicMock()
+        client.batches.retrieve.return_value.output_file_id = "file-out"
+        client.files.content.return_value.text = "\n".join([
+            json.dumps({"custom_id": "a", "response": {"status_code": 200, "body": {
+                "choices": [{"message": {"content": " Ответ "}}]}}}),
+            json.dumps({"custom_id": "b", "response": {"status_code": 500}, "error": "boom"}),
+        ])
+        backend = OpenAIBatchBackend(client, directory=self.tmpdir.name)
+        self.assertEqual(backend.results("batch-1"), {"a": "Ответ"})
+
+
+if __name__ == "__main__":
+    unittest.main()
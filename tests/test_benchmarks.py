@@ -0,0 +1,124 @@
+import asyncio
+import tempfile
+import unittest
+
+from benchmarks import throughput
+from benchmarks.mock_llm_server import MockConfig, MockLLMServer
+from gpt_client import AsyncGPTClient, GPTClient
+from metrics import MetricsRecorder
+from prompt_registry import PromptRegistry
+from retry import RetryPolicy
+from settings import ClientFactory
+from system_prompts import SystemPromptProvider, ClientPool
+from transport import AsyncTransport, Transport
+
+
+class TestMockLLMServer(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        throughput.write_prompts(self.tmpdir.name)
+        self.prompts = PromptRegistry(self.tmpdir.name, languages=["EN"])
+
+    def test_generates_article_end_to_end(self):
+        with MockLLMServer(MockConfig(outline_sections=3, completion_tokens=20), keep_requests=True) as server:
+            transport = Transport("sk-mock", base_url=server.base_url)
+            gpt = GPTClient(model="mock", temperature=0.5, transport=transport, system_prompt="")
+            provider = SystemPromptProvider(self.prompts, ClientPool(lambda: gpt.fork()))
+            generator = ClientFactory(transport=transport).article_generator(
+                "EN", gpt=gpt, prompts=self.prompts, system_prompts=provider
+            )
+            article = generator.generate_article("Mock topic")
+            streamed = list(gpt.chat_stream("Continue"))
+            transport.close()
+
+        self.assertEqual([line for line in article.splitlines() if line.startswith("## ")],
+                         ["## Section 1", "## Section 2", "## Section 3"])
+        self.assertGreater(len(streamed), 1)
+        # system prompt, outline, 3 раздела и потоковый запрос
+        self.assertEqual(server.requests, 6)
+        self.assertTrue(server.received[-1]["stream"])
+
+    def test_async_chat_stream(self):
+        async def run(base_url: str) -> tuple[list[str], list[dict]]:
+            transport = AsyncTransport("sk-mock", base_url=base_url)
+            client = AsyncGPTClient(model="mock", temperature=0.5, transport=transport, system_prompt="")
+            parts = [part async for part in client.chat_stream("Hello")]
+            await transport.close()
+            return parts, client.conversation
+
+        with MockLLMServer(MockConfig(completion_tokens=20), keep_requests=True) as server:
+            parts, conversation = asyncio.run(run(server.base_url))
+
+        self.assertGreater(len(parts), 1)
+        self.assertEqual(conversation[-1], {"role": "assistant", "content": "".join(parts)})
+        self.assertTrue(server.received[0]["stream"])
+
+    def test_injected_errors_are_retried(self):
+        with MockLLMServer(MockConfig(error_rate=0.3, rate_limit_rate=0.2, retry_after=0, seed=3)) as server:
+            transport = Transport("sk-mock", base_url=server.base_url,
+                                  retry_policy=RetryPolicy(max_attempts=20, base_delay=0.001))
+            for _ in range(10):
+                transport.complete("mock", [{"role": "user", "content": "Hello"}], 0.5)
+            transport.close()
+        self.assertGreater(server.errors + server.rate_limited, 0)
+        self.assertEqual(server.requests - server.errors - server.rate_limited, 10)
+
+    def test_prompt_cache_counts_repeated_prefix(self):
+        system = {"role": "system", "content": "Общий префикс " * 40}
+        with MockLLMServer(MockConfig(completion_tokens=5, prompt_cache_min=64, prompt_cache_block=16)) as server:
+            metrics = MetricsRecorder()
+            transport = Transport("sk-mock", base_url=server.base_url, metrics=metrics)
+            transport.complete("mock", [system, {"role": "user", "content": "Первый"}], 0.5)
+            transport.complete("mock", [system, {"role": "user", "content": "Второй"}], 0.5)
+            # Другое начало запроса в кэш не попадает, даже если дальше текст тот же
+            transport.complete("mock", [{"role": "user", "content": "Новый"}, system], 0.5)
+            transport.close()
+
+        stats = metrics.snapshot()["run"]["unknown"]
+        self.assertGreaterEqual(stats["cached_tokens"], 64)
+        self.assertLessEqual(stats["cached_tokens"], len(system["content"]) // 4)
+        self.assertGreater(stats["cached_ratio"], 0)
+
+    def test_article_requests_keep_stable_prefix(self):
+        config = MockConfig(outline_sections=3, completion_tokens=40, prompt_cache_min=32, prompt_cache_block=16)
+        with MockLLMServer(config, keep_requests=True) as server:
+            metrics = MetricsRecorder()
+            transport = Transport("sk-mock", base_url=server.base_url, metrics=metrics)
+            base_prompt = self.prompts.text("system_prompt", "EN")
+            provider = SystemPromptProvider(self.prompts, ClientPool(
+                lambda: GPTClient(model="mock", temperature=0.5, transport=transport, system_prompt="")
+            ))
+            for topic in ("First topic", "Second topic"):
+                gpt = GPTClient(model="mock", temperature=0.5, transport=transport, system_prompt=base_prompt,
+                                prefix=[{"role": "system", "content": base_prompt}])
+                ClientFactory(transport=transport).article_generator(
+                    "EN", gpt=gpt, prompts=self.prompts, system_prompts=provider
+                ).generate_article(topic)
+            transport.close()
+
+        requests = [body["messages"] for body in server.received]
+        # Системный промпт темы, outline и 3 раздела для каждой темы — все с общим началом
+        self.assertEqual(len(requests), 10)
+        self.assertTrue(all(messages[0]["content"] == base_prompt for messages in requests))
+        # Каждый следующий запрос статьи продолжает предыдущий: меняется только конец
+        for previous, current in zip(requests[1:4], requests[2:5]):
+            self.assertEqual(current[:len(previous)], previous)
+        self.assertGreater(metrics.snapshot()["run"]["section"]["cached_ratio"], 0.5)
+
+
+class TestThroughputBenchmark(unittest.TestCase):
+    def test_reports_stages_and_rate(self):
+        args = throughput.parse_args(["--topics", "3", "--article-workers", "2", "--section-workers", "2",
+                                      "--completion-tokens", "20", "--outline-sections", "2"])
+        result = throughput.run_benchmark(args)
+
+        self.assertEqual(result["succeeded"], 3)
+        self.assertGreater(result["articles_per_minute"], 0)
+        self.assertEqual(result["stages"]["section"]["calls"], 6)
+        self.assertIn("latency_p99", result["stages"]["outline"])
+        self.assertGreater(result["peak_rss_mb"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
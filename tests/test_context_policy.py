@@ -0,0 +1,86 @@
+import unittest
+from unittest.mock import MagicMock
+
+from context_policy import Stateless, SlidingWindow, TokenBudget, RollingSummary
+from gpt_client import GPTClient
+
+
+def make_conversation(exchanges: int) -> list[dict]:
+    conversation = [{"role": "system", "content": "Системный промпт"}]
+    for i in range(exchanges):
+        conversation.append({"role": "user", "content": f"Вопрос {i}"})
+        conversation.append({"role": "assistant", "content": f"Ответ {i}"})
+    conversation.append({"role": "user", "content": "Текущий вопрос"})
+    return conversation
+
+
+class TestContextPolicies(unittest.TestCase):
+    def test_stateless(self):
+        messages = Stateless().build(make_conversation(3))
+        self.assertEqual([m["content"] for m in messages], ["Системный промпт", "Текущий вопрос"])
+
+    def test_sliding_window_keeps_pinned_outline(self):
+        messages = SlidingWindow(max_messages=3, keep_first=2).build(make_conversation(4))
+        self.assertEqual(
+            [m["content"] for m in messages],
+            ["Системный промпт", "Вопрос 0", "Ответ 0", "Вопрос 3", "Ответ 3", "Текущий вопрос"]
+        )
+
+    def test_token_budget(self):
+        conversation = make_conversation(2)
+        conversation[-2]["content"] = "x" * 4000
+        messages = TokenBudget(max_tokens=200).build(conversation)
+        self.assertEqual([m["content"] for m in messages], ["Системный промпт", "Текущий вопрос"])
+
+    def test_token_budget_trims_in_steps(self):
+        policy = TokenBudget(max_tokens=40, trim_step=4)
+        starts = []
+        for exchanges in range(5, 10):
+            messages = policy.build(make_conversation(exchanges))
+            self.assertEqual(messages[-1]["content"], "Текущий вопрос")
+            starts.append(messages[1]["content"])
+        # Начало окна сдвигается раз в 4 сообщения (2 обмена), а не на каждом запросе
+        self.assertEqual(starts, ["Вопрос 4", "Вопрос 4", "Вопрос 6", "Вопрос 6", "Вопрос 8"])
+
+    def test_rolling_summary_is_cached(self):
+        summarizer = MagicMock()
+        summarizer.summarize.return_value = "Кратко"
+        policy = RollingSummary(summarizer, keep_last=1)
+        conversation = make_conversation(2)
+
+        messages = policy.build(conversation)
+        policy.build(conversation)
+
+        self.assertEqual(summarizer.summarize.call_count, 1)
+        self.assertIn("Кратко", messages[1]["content"])
+        self.assertEqual(messages[-1]["content"], "Текущий вопрос")
+
+    def test_client_sends_policy_messages(self):
+        transport = MagicMock()
+        transport.complete.return_value = "Ответ"
+        client = GPTClient(transport=transport, context_policy=Stateless())
+        client.chat("Первый")
+        client.chat("Второй")
+
+        sent = transport.complete.call_args.kwargs["messages"]
+        self.assertEqual([m["content"] for m in sent[1:]], ["Второй"])
+        self.assertEqual(len(client.conversation), 5)
+
+    def test_client_sends_prefix_first(self):
+        transport = MagicMock()
+        transport.complete.return_value = "Ответ"
+        prefix = [{"role": "system", "content": "Общий промпт"}]
+        client = GPTClient(transport=transport, context_policy=Stateless(), system_prompt="Общий промпт",
+                           prefix=prefix)
+        client.chat("Вопрос")
+        sent = transport.complete.call_args.kwargs["messages"]
+        self.assertEqual([m["content"] for m in sent], ["Общий промпт", "Вопрос"])
+
+        client.update_system_prompt("Промпт темы")
+        client.fork().chat("Раздел")
+        sent = transport.complete.call_args.kwargs["messages"]
+        self.assertEqual([m["content"] for m in sent], ["Общий промпт", "Промпт темы", "Раздел"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from benchmarks.throughput import LANGUAGE, write_prompts
+from cost_estimator import (
+    BudgetPlanner, CostEstimator, TokenCounter, cost_usd, model_price, models_cost, split_text
+)
+from model_router import ModelRouter, StageProfile
+from prompt_registry import PromptRegistry
+from summarizer import Summarizer
+from utils import TopicJob
+
+
+class TestTokenCounting(unittest.TestCase):
+    def test_prices_match_dated_models(self):
+        self.assertEqual(model_price("gpt-4o-2024-08-06"), model_price("gpt-4o"))
+        self.assertEqual(model_price("gpt-4o-mini-2024-07-18"), model_price("gpt-4o-mini"))
+        self.assertIsNone(model_price("mock-model"))
+        self.assertAlmostEqual(cost_usd("gpt-4o", 1_000_000, 100_000), 3.5)
+        # Скидка на кэшированный вход своя у каждой модели
+        self.assertAlmostEqual(cost_usd("gpt-4o", 1_000_000, 0, cached_tokens=1_000_000), 1.25)
+        self.assertAlmostEqual(cost_usd("gpt-4.1", 1_000_000, 0, cached_tokens=500_000), 1.25)
+        self.assertAlmostEqual(cost_usd("gpt-4-turbo", 1_000_000, 0, cached_tokens=1_000_000), 10.0)
+
+    def test_split_text_respects_limit(self):
+        counter = TokenCounter()
+        paragraph = "Первое предложение. " * 30
+        text = "\n\n".join([paragraph, "Короткий абзац.", "x" * 2000])
+        chunks = split_text(text, 50, counter)
+        self.assertGreater(len(chunks), 3)
+        self.assertTrue(all(counter.count(chunk) <= 50 for chunk in chunks))
+        self.assertEqual(split_text("Коротко.", 50, counter), ["Коротко."])
+
+
+class TestCostEstimator(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        write_prompts(self.tmpdir.name)
+        self.prompts = PromptRegistry(self.tmpdir.name, languages=[LANGUAGE])
+
+    def estimator(self, **kwargs) -> CostEstimator:
+        return CostEstimator(self.prompts, LANGUAGE, "gpt-4o", **kwargs)
+
+    def test_estimate_scales_with_sections_and_history(self):
+        estimator = self.estimator(sections=6)
+        full = estimator.estimate("Кэширование")
+        short = estimator.estimate("Кэширование", sections=3)
+        self.assertEqual(full.output_tokens - short.output_tokens, 3 * estimator.section_tokens)
+        self.assertGreater(full.cost, short.cost)
+        # Последовательные разделы видят предыдущие, поэтому вход больше
+        self.assertGreater(self.estimator(sections=6, history_tokens=4000).estimate("Кэширование").input_tokens,
+                           full.input_tokens)
+
+        run = estimator.estimate_run([TopicJob("Кэширование"), TopicJob("Кэширование", sections=3)])
+        self.assertEqual(run.topics, 2)
+        self.assertAlmostEqual(run.cost, full.cost + short.cost, places=6)
+
+    def test_stages_are_priced_at_routed_models(self):
+        router = ModelRouter({"system_prompt": StageProfile(model="gpt-4o-mini"),
+                              "outline": StageProfile(model="gpt-4o-mini")})
+        routed = self.estimator(sections=6, router=router)
+        plain = self.estimator(sections=6).estimate("A")
+        estimate = routed.estimate("A")
+        self.assertEqual((estimate.input_tokens, estimate.output_tokens), (plain.input_tokens, plain.output_tokens))
+        self.assertLess(estimate.cost, plain.cost)
+        # Модель задания меняет только этапы без своей модели в профиле
+        self.assertEqual(routed.models("gpt-4.1"), {"gpt-4o-mini", "gpt-4.1"})
+        with self.assertRaises(ValueError):
+            BudgetPlanner(self.estimator(router=ModelRouter({"outline": StageProfile(model="mock")})), 1.0)
+
+        total, unpriced = models_cost({
+            "gpt-4o": {"prompt_tokens": 1_000_000, "completion_tokens": 0, "cached_tokens": 0},
+            "gpt-4o-mini": {"prompt_tokens": 1_000_000, "completion_tokens": 0, "cached_tokens": 0},
+            "mock": {"prompt_tokens": 10, "completion_tokens": 0, "cached_tokens": 0},
+        })
+        self.assertAlmostEqual(total, 2.50 + 0.15)
+        self.assertEqual(unpriced, ["mock"])
+
+    def test_output_languages_add_translation_and_sections(self):
+        for name in os.listdir(self.tmpdir.name):
+            shutil.copy(os.path.join(self.tmpdir.name, name),
+                        os.path.join(self.tmpdir.name, name.replace(f"_{LANGUAGE}.", "_RU.")))
+        self.prompts = PromptRegistry(self.tmpdir.name, languages=[LANGUAGE, "RU"])
+        router = ModelRouter({"translation": StageProfile(model="gpt-4o-mini")})
+        single = self.estimator(sections=6, router=router)
+        plain = single.estimate("A")
+
+        import main
+        with patch.object(main, "OUTPUT_LANGUAGES", ["RU"]), patch.object(main, "LANGUAGE", LANGUAGE):
+            estimator = main.new_cost_estimator(self.prompts, "gpt-4o", router)
+        estimate = estimator.estimate("A", sections=6)
+        # Перевод outline и все разделы еще раз на втором языке
+        self.assertEqual(estimate.output_tokens,
+                         plain.output_tokens + estimator.outline_tokens + 6 * estimator.section_tokens)
+        self.assertGreater(estimate.cost, plain.cost)
+        self.assertEqual(estimator.languages("RU"), ["RU"])
+        self.assertIn("gpt-4o-mini", estimator.models())
+        # Бюджет учитывает и модель этапа перевода
+        with self.assertRaises(ValueError):
+            BudgetPlanner(CostEstimator(self.prompts, LANGUAGE, "gpt-4o", output_languages=["RU"],
+                                        router=ModelRouter({"translation": StageProfile(model="mock")})), 1.0)
+
+    def test_budget_planner_trims_downgrades_and_skips(self):
+        estimator = self.estimator(sections=6)
+        full = estimator.estimate("A").cost
+        trimmed = estimator.estimate("A", sections=3).cost
+        cheap = estimator.estimate("A", model="gpt-4o-mini").cost
+        planner = BudgetPlanner(estimator, budget_usd=full + trimmed + cheap + 0.0005, fallback_model="gpt-4o-mini")
+
+        planned = list(planner.plan([TopicJob("A"), TopicJob("B"), TopicJob("C"), TopicJob("D")]))
+        # Число разделов задается явно, чтобы генератор не вышел за заложенное в бюджет
+        self.assertEqual(planned[0], TopicJob("A", sections=6))
+        self.assertEqual(planned[1], TopicJob("B", sections=3))
+        self.assertEqual(planned[2], TopicJob("C", sections=6, model="gpt-4o-mini"))
+        self.assertLessEqual(planner.planned_cost, planner.budget_usd)
+        self.assertEqual((planner.trimmed, planner.downgraded), (1, 1))
+        self.assertEqual((len(planned), planner.skipped), (3, 1))
+
+    def test_budget_requires_known_prices(self):
+        with self.assertRaises(ValueError):
+            BudgetPlanner(CostEstimator(self.prompts, LANGUAGE, "mock-model"), budget_usd=1.0)
+        with self.assertRaises(ValueError):
+            BudgetPlanner(self.estimator(), budget_usd=1.0, fallback_model="mock-model")
+
+        planner = BudgetPlanner(self.estimator(sections=6), budget_usd=1.0)
+        self.assertIsNone(planner.fit(TopicJob("A", model="mock-model")))
+        self.assertEqual((planner.planned_cost, planner.skipped), (0.0, 1))
+
+
+class TestMapReduceSummary(unittest.TestCase):
+    def test_long_text_is_summarized_in_parts(self):
+        transport = MagicMock()
+        transport.complete.side_effect = lambda **kwargs: "Кратко."
+        summarizer = Summarizer(model="gpt-test", temperature=0.0, transport=transport, max_sentences=2,
+                                max_input_tokens=100)
+
+        self.assertEqual(summarizer.summarize("Короткий текст."), "Кратко.")
+        self.assertEqual(transport.complete.call_count, 1)
+
+        transport.complete.reset_mock()
+        long_text = "\n\n".join(f"Абзац {i}. " + "слово " * 60 for i in range(5))
+        self.assertEqual(summarizer.summarize(long_text), "Кратко.")
+        # 5 частей по отдельности и один запрос на объединение пересказов
+        self.assertEqual(transport.complete.call_count, 6)
+        prompts = [call.kwargs["messages"][-1]["content"] for call in transport.complete.call_args_list]
+        self.assertTrue(all(len(prompt) < 100 * 4 + 200 for prompt in prompts))
+        # В контексте остаются только итоговые пересказы, а не части текста
+        self.assertEqual(len(summarizer.conversation), 1 + 2 * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
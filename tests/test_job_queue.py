@@ -0,0 +1,118 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from job_queue import DEAD, DONE, PENDING, JobQueue, QueueWorker
+from utils import TopicJob
+
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "queue", "jobs.sqlite")
+        self.queues = []
+
+    def tearDown(self):
+        for queue in self.queues:
+            queue.close()
+        self.tmpdir.cleanup()
+
+    def open(self, **kwargs) -> JobQueue:
+        queue = JobQueue(self.path, **kwargs)
+        self.queues.append(queue)
+        return queue
+
+    def test_enqueue_is_idempotent(self):
+        queue = self.open()
+        self.assertEqual(queue.enqueue(["a", "b"]), 2)
+        job = queue.lease("w1")
+        queue.complete(job.topic, "w1")
+        # Готовая тема при повторной загрузке списка не возвращается в очередь
+        self.assertEqual(queue.enqueue(["a", "b", "c"]), 1)
+        self.assertEqual(queue.counts()[DONE], 1)
+        self.assertEqual(queue.counts()[PENDING], 2)
+
+    def test_job_options_survive_the_queue(self):
+        queue = self.open()
+        job = TopicJob("a", language="RU", sections=4, output_path="out/a.md")
+        queue.enqueue(iter([job, "b"]))
+        self.assertEqual(queue.lease("w1").topic_job(), job)
+        self.assertEqual(queue.lease("w1").topic_job(), TopicJob("b"))
+
+    def test_workers_never_share_a_topic(self):
+        self.open().enqueue([f"topic {i}" for i in range(30)])
+        leased = {f"w{i}": [] for i in range(3)}
+
+        def work(worker_id):
+            # У каждого воркера свое соединение, как у отдельного процесса
+            queue = JobQueue(self.path)
+            while (job := queue.lease(worker_id)) is not None:
+                leased[worker_id].append(job.topic)
+                queue.complete(job.topic, worker_id)
+            queue.close()
+
+        threads = [threading.Thread(target=work, args=(worker_id,)) for worker_id in leased]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        topics = [topic for worker_topics in leased.values() for topic in worker_topics]
+        self.assertEqual(len(topics), 30)
+        self.assertEqual(len(set(topics)), 30)
+
+    def test_expired_lease_is_taken_over(self):
+        queue = self.open(lease_seconds=0.05)
+        queue.enqueue(["a"])
+        self.assertEqual(queue.lease("w1").topic, "a")
+        self.assertIsNone(queue.lease("w2"))
+
+        time.sleep(0.06)
+        job = queue.lease("w2")
+        self.assertEqual((job.topic, job.attempts), ("a", 2))
+        # Первый воркер потерял аренду и не может закрыть тему
+        self.assertFalse(queue.complete("a", "w1"))
+        self.assertTrue(queue.complete("a", "w2"))
+
+    def test_heartbeat_extends_lease(self):
+        queue = self.open(lease_seconds=0.1)
+        queue.enqueue(["a"])
+        queue.lease("w1")
+        for _ in range(3):
+            time.sleep(0.05)
+            self.assertEqual(queue.heartbeat("w1"), 1)
+        self.assertIsNone(queue.lease("w2"))
+
+    def test_dead_letter_after_max_attempts(self):
+        queue = self.open(max_attempts=2)
+        queue.enqueue(["a"])
+        queue.lease("w1")
+        self.assertEqual(queue.fail("a", "w1", "boom"), PENDING)
+        queue.lease("w1")
+        self.assertEqual(queue.fail("a", "w1", "boom"), DEAD)
+        self.assertIsNone(queue.lease("w1"))
+
+        self.assertEqual(queue.requeue_dead(), 1)
+        self.assertEqual(queue.lease("w1").attempts, 1)
+
+    def test_worker_completes_and_requeues(self):
+        queue = self.open(max_attempts=2)
+        calls = []
+
+        def process(job):
+            calls.append(job.topic)
+            if job.topic == "flaky" and calls.count("flaky") == 1:
+                raise RuntimeError("temporary")
+
+        report = QueueWorker(queue, process, worker_id="w1", concurrency=1, poll_interval=0.01).run(
+            feed=["ok", "flaky"]
+        )
+        self.assertEqual(report.succeeded, 2)
+        self.assertEqual(report.failed, 1)
+        self.assertEqual(queue.counts()[DONE], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+from metrics import MetricsRecorder, labels
+from transport import Transport
+
+
+class TestMetricsRecorder(unittest.TestCase):
+    def test_aggregates_per_run_and_article(self):
+        recorder = MetricsRecorder()
+        with labels(article="Тема"):
+            with labels(stage="outline"):
+                recorder.record(0.5, prompt_tokens=100, completion_tokens=20)
+            for i in range(2):
+                with labels(stage=f"section {i + 1}"):
+                    recorder.record(1.0, prompt_tokens=200, completion_tokens=300, retries=1)
+        with labels(stage="outline"):
+            recorder.record(0.0, cache_hit=True)
+
+        snapshot = recorder.snapshot()
+        self.assertEqual(snapshot["run"]["section"]["calls"], 2)
+        self.assertEqual(snapshot["run"]["section"]["retries"], 2)
+        self.assertEqual(snapshot["run"]["outline"]["cache_hits"], 1)
+        self.assertEqual(set(snapshot["articles"]["Тема"]), {"outline", "section 1", "section 2"})
+        self.assertIn('llm_prompt_tokens_total{stage="section"} 400', recorder.to_prometheus())
+
+    def test_latency_histogram_is_bounded(self):
+        recorder = MetricsRecorder()
+        with labels(stage="outline"):
+            for i in range(1000):
+                recorder.record(0.3 if i < 990 else 7.0)
+
+        stats = recorder.snapshot()["run"]["outline"]
+        self.assertEqual((stats["latency_p50"], stats["latency_p99"]), (0.5, 7.0))
+        self.assertEqual(len(recorder._run["outline"].latency_buckets), 12)
+        prometheus = recorder.to_prometheus()
+        self.assertIn('llm_latency_seconds_bucket{stage="outline",le="0.5"} 990', prometheus)
+        self.assertIn('llm_latency_seconds_bucket{stage="outline",le="10.0"} 1000', prometheus)
+        self.assertIn('llm_latency_seconds_count{stage="outline"} 1000', prometheus)
+
+    def test_pop_article_forgets_summary(self):
+        recorder = MetricsRecorder()
+        with labels(stage="outline", article="Тема"):
+            recorder.record(0.5, prompt_tokens=100)
+
+        self.assertEqual(recorder.pop_article("Тема")["outline"]["prompt_tokens"], 100)
+        self.assertEqual(recorder.snapshot()["articles"], {})
+        self.assertEqual(recorder.snapshot()["run"]["outline"]["prompt_tokens"], 100)
+
+    def test_transport_records_labels_from_worker_threads(self):
+        import contextvars
+
+        recorder = MetricsRecorder()
+        transport = Transport("sk-test", metrics=recorder)
+        response = MagicMock()
+        response.choices[0].message.content = "Ответ"
+        response.usage.prompt_tokens = 10
+        response.usage.completion_tokens = 5
+        response.usage.prompt_tokens_details.cached_tokens = 8
+        transport.client = MagicMock()
+        transport.client.chat.completions.create.return_value = response
+
+        def call():
+            with labels(stage="section 1"):
+                transport.complete("gpt", [{"role": "user", "content": "Привет"}], 0.5)
+
+        with labels(article="Тема"):
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                executor.submit(contextvars.copy_context().run, call).result()
+
+        stats = recorder.article_summary("Тема")["section 1"]
+        self.assertEqual((stats["prompt_tokens"], stats["completion_tokens"], stats["cached_tokens"]), (10, 5, 8))
+        self.assertEqual(recorder.snapshot()["models"]["gpt"]["prompt_tokens"], 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
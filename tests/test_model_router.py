@@ -0,0 +1,73 @@
+import unittest
+from unittest.mock import MagicMock
+
+import httpx
+from openai import RateLimitError
+
+from article_generator import OutlineResponse
+from gpt_client import GPTClient
+from metrics import labels
+from model_router import ModelRouter, Route, StageProfile, is_fallback_error
+from retry import is_retryable
+
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+def rate_limit_error(code: str | None) -> RateLimitError:
+    return RateLimitError("rate limited", response=httpx.Response(429, request=REQUEST), body={"code": code})
+
+
+class TestModelRouter(unittest.TestCase):
+    def setUp(self):
+        self.router = ModelRouter({
+            "outline": StageProfile(model="small", temperature=0.2, max_tokens=800),
+            "section": StageProfile(fallback_models=("small", "big")),
+        }, escalation_model="big")
+
+    def test_routes_by_stage(self):
+        self.assertEqual(self.router.routes("outline", "big", 0.7), [Route("small", 0.2, 800)])
+        # Номер раздела в метке этапа не важен; модель клиента не дублируется среди запасных
+        self.assertEqual(self.router.routes("section 3", "big", 0.7), [Route("big", 0.7), Route("small", 0.7)])
+        self.assertEqual(self.router.routes(None, "big", 0.7), [Route("big", 0.7)])
+        self.assertEqual(self.router.escalation(Route("small", 0.2, 800)), Route("big", 0.2))
+        self.assertIsNone(self.router.escalation(Route("big", 0.7)))
+
+    def test_quota_exhaustion_falls_back_instead_of_retrying(self):
+        quota = rate_limit_error("insufficient_quota")
+        self.assertFalse(is_retryable(quota))
+        self.assertTrue(is_fallback_error(quota))
+        self.assertTrue(is_retryable(rate_limit_error("rate_limit_exceeded")))
+        self.assertFalse(is_fallback_error(rate_limit_error("rate_limit_exceeded")))
+        self.assertTrue(is_fallback_error(TimeoutError()))
+
+    def test_client_falls_back_on_timeout(self):
+        transport = MagicMock()
+        transport.complete.side_effect = [TimeoutError("slow"), "Текст"]
+        client = GPTClient(model="big", temperature=0.7, transport=transport, system_prompt="", router=self.router)
+        with labels(stage="section 1"):
+            self.assertEqual(client.chat("Раздел"), "Текст")
+        self.assertEqual([call.kwargs["model"] for call in transport.complete.call_args_list], ["big", "small"])
+
+        transport.complete.side_effect = ValueError("bad request")
+        with labels(stage="section 2"), self.assertRaises(ValueError):
+            client.chat("Раздел")
+
+    def test_invalid_outline_escalates(self):
+        transport = MagicMock()
+        transport.complete.side_effect = ["not json", "still not json", '{"outline": []}']
+        client = GPTClient(model="big", temperature=0.7, transport=transport, system_prompt="", router=self.router)
+        with labels(stage="outline"):
+            self.assertEqual(client.chat_with_format("Outline", OutlineResponse).outline, [])
+
+        calls = transport.complete.call_args_list
+        self.assertEqual([call.kwargs["model"] for call in calls], ["small", "small", "big"])
+        self.assertEqual(calls[0].kwargs["max_tokens"], 800)
+        self.assertNotIn("max_tokens", calls[2].kwargs)
+        # Эскалация начинается с исходного запроса, без неудачных ответов дешевой модели
+        self.assertEqual([m["content"] for m in calls[2].kwargs["messages"]], ["", "Outline"])
+        self.assertEqual([m["content"] for m in client.conversation[1:]], ["Outline", '{"outline": []}'])
+
+
+if __name__ == "__main__":
+    unittest.main()
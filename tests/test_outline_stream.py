@@ -0,0 +1,134 @@
+import json
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock
+from unittest.mock import MagicMock
+
+from article_generator import ArticleGenerator, ArticleGenerationError, OutlineResponse
+from gpt_client import GPTClient
+from journal import JobJournal
+from outline_stream import OutlineStreamParser, iter_outline_items
+
+
+OUTLINE = {"outline": [
+    {"title": "Раздел 0", "subtopics": ["A", 'B "в кавычках" {скобки} \\']},
+    {"title": "Введение", "subtopics": []},
+    {"title": "Раздел 1", "subtopics": ["C"], "extra": {"nested": [{"x": 1}]}},
+    {"title": "Раздел 2", "subtopics": ["D"]},
+]}
+
+
+def chunked(text: str, size: int) -> list[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class TestOutlineStreamParser(unittest.TestCase):
+    def test_items_are_emitted_as_they_close(self):
+        text = "```json\n" + json.dumps(OUTLINE, ensure_ascii=False, indent=2) + "\n```"
+        for size in (1, 3, 7, len(text)):
+            items = list(iter_outline_items(chunked(text, size)))
+            self.assertEqual(items, OUTLINE["outline"])
+
+        parser = OutlineStreamParser()
+        first_item_end = text.index("\n    }") + len("\n    }")
+        self.assertEqual(parser.feed(text[:first_item_end - 1]), [])
+        self.assertEqual(parser.feed(text[first_item_end - 1:first_item_end]), [OUTLINE["outline"][0]])
+
+    def test_bare_array(self):
+        self.assertEqual(list(iter_outline_items(['[{"title": "A", "subtopics": []}', ']'])),
+                         [{"title": "A", "subtopics": []}])
+
+
+class TestPipelinedOutline(unittest.TestCase):
+    def setUp(self):
+        self.mock_gpt = MagicMock(spec=GPTClient)
+        patcher = unittest.mock.patch.object(
+            ArticleGenerator, "generate_system_prompt", return_value="Системный промпт"
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_sections_start_before_outline_finishes(self):
+        text = json.dumps(OUTLINE, ensure_ascii=False)
+        stream_finished = threading.Event()
+        started_early = []
+
+        def stream(*args, **kwargs):
+            for chunk in chunked(text, 10):
+                time.sleep(0.002)
+                yield chunk
+            stream_finished.set()
+
+        def section(topic, section_title, subtopics):
+            started_early.append(not stream_finished.is_set())
+            return f"Текст {section_title}"
+
+        self.mock_gpt.chat_stream.side_effect = stream
+        pipelined = ArticleGenerator(gpt=self.mock_gpt, language="RU", max_workers=2, pipeline_outline=True)
+        with unittest.mock.patch.object(ArticleGenerator, "_write_section", side_effect=section):
+            article = pipelined.generate_article("Тема")
+            self.mock_gpt.chat_with_format.return_value = OutlineResponse.parse_obj(OUTLINE)
+            regular = ArticleGenerator(gpt=self.mock_gpt, language="RU", max_workers=2).generate_article("Тема")
+
+        self.assertEqual(article, regular)
+        self.assertNotIn("Введение", article)
+        self.assertTrue(started_early[0])
+
+    def test_outline_failure_raises(self):
+        def stream(*args, **kwargs):
+            yield '{"outline": [{"title": "A", "subtopics": []},'
+            raise RuntimeError("connection reset")
+
+        self.mock_gpt.chat_stream.side_effect = stream
+        pipelined = ArticleGenerator(gpt=self.mock_gpt, language="RU", pipeline_outline=True)
+        with unittest.mock.patch.object(ArticleGenerator, "_write_section", return_value="Текст"):
+            with self.assertRaises(ArticleGenerationError):
+                pipelined.generate_article("Тема")
+
+    def test_invalid_outline_is_rejected(self):
+        pipelined = ArticleGenerator(gpt=self.mock_gpt, language="RU", pipeline_outline=True)
+        cases = [
+            # Пункт без subtopics не проходит схему еще в потоке, разделы не запускаются
+            ('{"outline": [{"title": "A"}, {"title": "B", "subtopics": []}]}', 0),
+            # Пункт разобран и ушел в работу, но весь ответ оборван и не проходит проверку
+            ('{"outline": [{"title": "A", "subtopics": []}', 1),
+        ]
+        for text, written in cases:
+            self.mock_gpt.chat_stream.side_effect = lambda *args, text=text, **kwargs: iter(chunked(text, 5))
+            with unittest.mock.patch.object(ArticleGenerator, "_write_section", return_value="Текст") as write:
+                with self.assertRaises(ArticleGenerationError):
+                    pipelined.generate_article("Тема")
+            self.assertEqual(write.call_count, written)
+
+    def test_streamed_items_must_match_complete_outline(self):
+        text = json.dumps(OUTLINE, ensure_ascii=False)
+        self.mock_gpt.chat_stream.side_effect = lambda *args, **kwargs: iter(chunked(text, 10))
+        pipelined = ArticleGenerator(gpt=self.mock_gpt, language="RU", pipeline_outline=True)
+        streamed = [{"title": "Другой раздел", "subtopics": []}]
+        with unittest.mock.patch("article_generator.iter_outline_items", return_value=iter(streamed)), \
+                unittest.mock.patch.object(ArticleGenerator, "_write_section", return_value="Текст"):
+            with self.assertRaises(ArticleGenerationError):
+                pipelined.generate_article("Тема")
+
+    def test_resume_reuses_journaled_sections(self):
+        text = json.dumps(OUTLINE, ensure_ascii=False)
+        self.mock_gpt.chat_stream.side_effect = lambda *args, **kwargs: iter(chunked(text, 10))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            journal = JobJournal(tmpdir)
+            # Прерванный запуск успел сохранить раздел 0, а раздел 1 — под другим заголовком
+            journal.put_section("Тема", 0, "Сохраненный текст", title="Раздел 0")
+            journal.put_section("Тема", 1, "Устаревший текст", title="Старый раздел")
+            pipelined = ArticleGenerator(gpt=self.mock_gpt, language="RU", journal=journal, pipeline_outline=True)
+            with unittest.mock.patch.object(ArticleGenerator, "_write_section",
+                                            side_effect=lambda topic, title, subtopics: f"Текст {title}") as write:
+                article = pipelined.generate_article("Тема")
+
+        self.assertEqual([call.args[1] for call in write.call_args_list], ["Раздел 1", "Раздел 2"])
+        self.assertIn("## Раздел 0\nСохраненный текст\n", article)
+        self.assertIn("## Раздел 1\nТекст Раздел 1\n", article)
+
+
+if __name__ == "__main__":
+    unittest.main()
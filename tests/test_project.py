@@ -1,14 +1,24 @@
 import unittest
+import unittest.mock
 from unittest.mock import MagicMock
-from article_generator import ArticleGenerator, OutlineResponse, OutlineItem
-from gpt_client import GPTClient
-from summarizer import Summarizer
-from utils import load_prompts, save_article_to_file
+from article_generator import ArticleGenerator, ArticleGenerationError, OutlineResponse, OutlineItem
+from gpt_client import GPTClient, AsyncGPTClient
+from summarizer import Summarizer, AsyncSummarizer
+from utils import (
+    ArticleIndex, TopicJob, iter_topic_jobs, load_prompts, save_article_to_file, skip_existing_articles,
+    stream_article_to_file
+)
 
 class TestArticleGenerator(unittest.TestCase):
     def setUp(self):
         self.mock_gpt = MagicMock(spec=GPTClient)
         self.generator = ArticleGenerator(gpt=self.mock_gpt, language="RU")
+        # Системный промпт генерируется отдельным клиентом; в тестах он не нужен
+        patcher = unittest.mock.patch.object(
+            ArticleGenerator, "generate_system_prompt", return_value="Системный промпт"
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
     def test_generate_outline(self):
         mock_response = OutlineResponse(outline=[
@@ -17,10 +27,128 @@ class TestArticleGenerator(unittest.TestCase):
         ])
         self.mock_gpt.chat_with_format.return_value = mock_response
         outline = self.generator.generate_outline("Тестовая тема")
-        self.assertIn("outline", outline)
+        self.assertIs(outline, mock_response)
+        self.assertEqual(self.mock_gpt.chat_with_format.call_args.kwargs["response_format"], OutlineResponse)
+
+        self.mock_gpt.chat_with_format.side_effect = ValueError("Response does not match OutlineResponse")
+        with self.assertRaises(ArticleGenerationError):
+            self.generator.generate_outline("Тестовая тема")
+
+    def test_generate_article_parallel_keeps_outline_order(self):
+        import time
+        mock_response = OutlineResponse(outline=[
+            OutlineItem(title=f"Раздел {i}", subtopics=["A"]) for i in range(5)
+        ])
+        self.mock_gpt.chat_with_format.return_value = mock_response
+
+        failing = {2}
+
+        def section(topic, section_title, subtopics):
+            # Первые разделы отвечают дольше, чтобы перемешать порядок завершения
+            index = int(section_title.split()[-1])
+            time.sleep(0.01 * (5 - index))
+            if index in failing:
+                raise RuntimeError("boom")
+            return f"Текст {index}"
+
+        parallel = ArticleGenerator(gpt=self.mock_gpt, language="RU", max_workers=4)
+        with unittest.mock.patch.object(ArticleGenerator, "_write_section", side_effect=section):
+            chunks = []
+            # Неудачный раздел прерывает статью вместо заглушки в тексте
+            with self.assertRaises(ArticleGenerationError):
+                for chunk in parallel.iter_article("Тема"):
+                    chunks.append(chunk)
+        partial = "".join(chunks)
+        self.assertIn("## Раздел 1\nТекст 1", partial)
+        self.assertNotIn("Раздел 2", partial)
+
+        failing.clear()
+        with unittest.mock.patch.object(ArticleGenerator, "_write_section", side_effect=section):
+            article = parallel.generate_article("Тема")
+        positions = [article.index(f"## Раздел {i}") for i in range(5)]
+        self.assertEqual(positions, sorted(positions))
+        self.assertIn("Текст 4", article)
+
+    def test_generate_article_resumes_from_journal(self):
+        import tempfile
+        from journal import JobJournal
+
+        mock_response = OutlineResponse(outline=[
+            OutlineItem(title=f"Раздел {i}", subtopics=["A"]) for i in range(3)
+        ])
+        self.mock_gpt.chat_with_format.return_value = mock_response
+        self.mock_gpt.chat.side_effect = ["Текст 0", RuntimeError("boom"), "Текст 2"]
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            journal = JobJournal(tmpdir)
+            generator = ArticleGenerator(gpt=self.mock_gpt, language="RU", journal=journal)
+            with self.assertRaises(ArticleGenerationError):
+                generator.generate_article("Тема")
+
+            # После "перезапуска" повторяется только упавший раздел
+            self.mock_gpt.reset_mock()
+            self.mock_gpt.chat.side_effect = ["Текст 1", "Текст 2"]
+            resumed = ArticleGenerator(gpt=self.mock_gpt, language="RU", journal=JobJournal(tmpdir))
+            article = resumed.generate_article("Тема")
+
+        self.mock_gpt.chat_with_format.assert_not_called()
+        self.assertEqual(self.mock_gpt.chat.call_count, 2)
+        self.assertIn("## Раздел 0\nТекст 0", article)
+        self.assertIn("## Раздел 1\nТекст 1", article)
+        self.assertIn("## Раздел 2\nТекст 2", article)
+
+
+    def test_generate_translations_shares_one_outline(self):
+        import tempfile
+        from article_generator import TranslatedOutline
+        from journal import JobJournal
+
+        outline = OutlineResponse(outline=[OutlineItem(title=f"Section {i}", subtopics=["A"]) for i in range(2)])
+        translated = TranslatedOutline(
+            title="Тема по-русски", outline=[OutlineItem(title=f"Раздел {i}", subtopics=["А"]) for i in range(2)]
+        )
+        self.mock_gpt.chat_with_format.side_effect = (
+            lambda *args, response_format, **kwargs: translated if response_format is TranslatedOutline else outline
+        )
+        self.mock_gpt.fork.return_value = self.mock_gpt
+        self.mock_gpt.chat.side_effect = lambda prompt, **kwargs: "Текст"
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            journal = JobJournal(tmpdir)
+            generator = ArticleGenerator(gpt=self.mock_gpt, language="EN", journal=journal)
+            articles = generator.generate_translations("Topic", ["EN", "RU"])
+            self.assertEqual(journal.get_section("Topic [RU]", 1), "Текст")
+
+        self.assertEqual(list(articles), ["EN", "RU"])
+        self.assertTrue(articles["EN"].startswith("# Topic\n\n## Section 0\nТекст"))
+        self.assertTrue(articles["RU"].startswith("# Тема по-русски\n\n## Раздел 0\nТекст"))
+        # Один outline и один перевод вместо outline на каждый язык
+        formats = [call.kwargs["response_format"] for call in self.mock_gpt.chat_with_format.call_args_list]
+        self.assertEqual(formats, [OutlineResponse, TranslatedOutline])
+        self.assertEqual(self.mock_gpt.chat.call_count, 4)
+
+    def test_iter_article_streams_same_text(self):
+        mock_response = OutlineResponse(outline=[
+            OutlineItem(title=f"Раздел {i}", subtopics=["A"]) for i in range(3)
+        ])
+        self.mock_gpt.chat_with_format.return_value = mock_response
+        self.mock_gpt.chat.side_effect = lambda *args, **kwargs: "Текст раздела"
+        self.mock_gpt.chat_stream.side_effect = lambda *args, **kwargs: iter(["Текст ", "раздела"])
+
+        article = self.generator.generate_article("Тема")
+        streaming = ArticleGenerator(gpt=self.mock_gpt, language="RU", stream_tokens=True)
+        chunks = list(streaming.iter_article("Тема"))
+
+        self.assertGreater(len(chunks), 3)
+        self.assertEqual("".join(chunks), article)
+
 
 class TestGPTClient(unittest.TestCase):
     def setUp(self):
+        import settings
+        settings.configure(settings.Settings(openai_api_key="sk-test", model_advanced="gpt-test",
+                                             model_summarizer="gpt-test-mini", temperature=0.5))
+        self.addCleanup(settings.configure, None)
         self.client = GPTClient()
 
     def test_chat(self):
@@ -29,6 +157,72 @@ class TestGPTClient(unittest.TestCase):
         response = self.client.chat("Привет")
         self.assertEqual(response, "Ответ")
 
+    def test_chat_stream_matches_chat(self):
+        transport = MagicMock()
+        transport.stream.return_value = iter(["\n ", "Отв", "ет ", " \n", "дальше", "  \n"])
+        client = GPTClient(transport=transport)
+        parts = list(client.chat_stream("Привет"))
+        self.assertEqual("".join(parts), "\n Ответ  \nдальше  \n".strip())
+        self.assertEqual(client.conversation[-1]["content"], "Ответ  \nдальше")
+
+    def test_chat_with_format_sends_strict_schema(self):
+        transport = MagicMock()
+        transport.complete.return_value = '```json\n{"outline": [{"title": "A", "subtopics": ["x"]}]}\n```'
+        client = GPTClient(transport=transport, system_prompt="")
+        outline = client.chat_with_format("Outline", OutlineResponse)
+
+        self.assertEqual(outline.outline[0].title, "A")
+        self.assertEqual(transport.complete.call_count, 1)
+        response_format = transport.complete.call_args.kwargs["response_format"]
+        self.assertEqual(response_format["type"], "json_schema")
+        self.assertTrue(response_format["json_schema"]["strict"])
+        item = response_format["json_schema"]["schema"]["$defs"]["OutlineItem"]
+        self.assertFalse(item["additionalProperties"])
+        self.assertEqual(item["required"], ["title", "subtopics"])
+
+    def test_chat_with_format_repairs_once(self):
+        transport = MagicMock()
+        transport.complete.side_effect = ['{"outline": [{"title": "A"}]}', '{"outline": []}']
+        client = GPTClient(transport=transport, system_prompt="")
+        self.assertEqual(client.chat_with_format("Outline", OutlineResponse).outline, [])
+        # Модель видит свой неверный ответ и ошибку проверки, но в истории остается только исправленный
+        repair_messages = transport.complete.call_args.kwargs["messages"]
+        self.assertIn("does not match", repair_messages[-1]["content"])
+        self.assertEqual([m["content"] for m in client.conversation[1:]], ["Outline", '{"outline": []}'])
+
+        transport.complete.side_effect = ["not json", "still not json"]
+        with self.assertRaises(ValueError):
+            client.chat_with_format("Outline", OutlineResponse)
+        self.assertEqual(transport.complete.call_count, 4)
+
+    def test_shares_transport_with_summarizer(self):
+        self.assertIs(self.client.transport, Summarizer().transport)
+
+
+class TestAsyncClients(unittest.TestCase):
+    def setUp(self):
+        self.transport = MagicMock()
+        self.transport.complete = unittest.mock.AsyncMock(return_value='{"outline": []}')
+
+    def test_chat_with_format(self):
+        import asyncio
+        client = AsyncGPTClient(transport=self.transport)
+        response = asyncio.run(client.chat_with_format("Outline", OutlineResponse, timeout=5))
+        self.assertEqual(response.outline, [])
+        self.assertEqual(self.transport.complete.call_args.kwargs["timeout"], 5)
+        self.assertEqual(client.conversation[-1]["role"], "assistant")
+
+    def test_summarize_concurrently(self):
+        import asyncio
+
+        async def run():
+            summarizers = [AsyncSummarizer(transport=self.transport) for _ in range(10)]
+            return await asyncio.gather(*(s.summarize("Текст") for s in summarizers))
+
+        self.assertEqual(len(asyncio.run(run())), 10)
+        self.assertEqual(self.transport.complete.await_count, 10)
+
+
 class TestUtils(unittest.TestCase):
     def test_load_prompts(self):
         content = load_prompts("prompts/outline_prompt_RU.txt")
@@ -41,5 +235,85 @@ class TestUtils(unittest.TestCase):
         self.assertTrue(os.path.exists("test_articles/Тестовая_тема.md"))
         os.remove("test_articles/Тестовая_тема.md")
 
+    def test_stream_article_to_file_is_atomic(self):
+        import os
+        import tempfile
+
+        def chunks():
+            yield "# Тема\n\n"
+            raise RuntimeError("boom")
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with self.assertRaises(RuntimeError):
+                stream_article_to_file(chunks(), "Тема", output_dir=tmpdir)
+            self.assertEqual(os.listdir(tmpdir), [])
+
+            path = stream_article_to_file(iter(["# Тема\n\n", "Текст"]), "Тема", output_dir=tmpdir)
+            self.assertEqual(os.listdir(tmpdir), ["Тема.md"])
+            with open(path, encoding="utf-8") as file:
+                self.assertEqual(file.read(), "# Тема\n\nТекст")
+
+    def test_iter_topic_jobs_formats(self):
+        import gzip
+        import os
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            jsonl = os.path.join(tmpdir, "topics.jsonl.gz")
+            with gzip.open(jsonl, "wt", encoding="utf-8") as file:
+                file.write('{"topic": "Кэш", "language": "ru", "sections": 3}\n')
+                file.write('не json\n\n')
+                file.write('"Очереди"\n')
+                file.write('{"language": "EN"}\n')
+            self.assertEqual(list(iter_topic_jobs(jsonl)), [
+                TopicJob("Кэш", language="RU", sections=3), TopicJob("Очереди"),
+            ])
+
+            checked = os.path.join(tmpdir, "checked.jsonl")
+            with open(checked, "w", encoding="utf-8") as file:
+                file.write('{"topic": "Ноль", "sections": 0}\n')
+                file.write('{"topic": "Немецкий", "language": "de"}\n')
+                file.write('{"topic": "Английский", "language": "en", "sections": 1}\n')
+            with self.assertLogs("utils", level="WARNING") as logs:
+                self.assertEqual(list(iter_topic_jobs(checked, languages={"RU", "EN"})), [
+                    TopicJob("Английский", language="EN", sections=1),
+                ])
+            self.assertIn("sections must be at least 1", logs.output[0])
+            self.assertIn("no prompts for language 'DE'", logs.output[1])
+
+            csv_path = os.path.join(tmpdir, "topics.csv")
+            with open(csv_path, "w", encoding="utf-8") as file:
+                file.write('topic,output_path,sections\n"Тема, с запятой",out/a.md,\nВторая,,x\nТретья,,\n')
+            self.assertEqual(list(iter_topic_jobs(csv_path)), [
+                TopicJob("Тема, с запятой", output_path="out/a.md"), TopicJob("Третья"),
+            ])
+
+            text = os.path.join(tmpdir, "topics.txt")
+            with open(text, "w", encoding="utf-8") as file:
+                file.write("Первая\n\n  Вторая  \n")
+            jobs = iter_topic_jobs(text)
+            # Темы отдаются по одной, файл не читается заранее
+            self.assertEqual(next(jobs), TopicJob("Первая"))
+            self.assertEqual(list(jobs), [TopicJob("Вторая")])
+
+    def test_skip_existing_articles_scans_once(self):
+        import os
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            save_article_to_file("Текст", "Готовая тема", output_dir=tmpdir)
+            index = ArticleIndex(tmpdir)
+            jobs = [TopicJob("Готовая тема"), TopicJob("Новая тема"),
+                    TopicJob("Своя", output_path=os.path.join(tmpdir, "custom.md"))]
+            with unittest.mock.patch("utils.os.scandir", wraps=os.scandir) as scandir:
+                self.assertEqual(list(skip_existing_articles(jobs, index)), jobs[1:])
+                self.assertEqual(list(skip_existing_articles(jobs, index)), jobs[1:])
+            self.assertEqual(scandir.call_count, 1)
+
+            # Статьи, сохраненные после сканирования, добавляются в индекс явно
+            index.add(save_article_to_file("Текст", "Своя", filepath=os.path.join(tmpdir, "custom.md")))
+            self.assertIn(jobs[2], index)
+
+
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()
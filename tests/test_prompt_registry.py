@@ -0,0 +1,59 @@
+import os
+import tempfile
+import time
+import unittest
+
+from prompt_registry import PromptRegistry, PromptTemplateError, TEMPLATE_FIELDS
+
+
+class TestPromptRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        for name in TEMPLATE_FIELDS:
+            self.write(f"{name}_RU.txt", f"{name}: {{topic}}" if "topic" in TEMPLATE_FIELDS[name] else name)
+        self.write(
+            "subtopics_prompt_RU.txt",
+            'Тема {topic}, раздел {section_title}:\n{bullets}\nОтвет в JSON: {{"text": "..."}}'
+        )
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, filename: str, text: str) -> None:
+        with open(os.path.join(self.tmpdir.name, filename), "w", encoding="utf-8") as file:
+            file.write(text)
+
+    def test_render_matches_str_format(self):
+        registry = PromptRegistry(self.tmpdir.name)
+        values = {"topic": "Тема", "section_title": "Раздел", "bullets": "- A"}
+        with open(os.path.join(self.tmpdir.name, "subtopics_prompt_RU.txt"), encoding="utf-8") as file:
+            expected = file.read().format(**values)
+        self.assertEqual(registry.render("subtopics_prompt", "RU", **values), expected)
+        self.assertEqual(registry.text("system_prompt", "RU"), "system_prompt")
+        self.assertEqual(registry.available_languages(), {"RU"})
+
+    def test_missing_template_fails_at_load(self):
+        os.remove(os.path.join(self.tmpdir.name, "outline_prompt_RU.txt"))
+        with self.assertRaises(PromptTemplateError):
+            PromptRegistry(self.tmpdir.name)
+        with self.assertRaises(PromptTemplateError):
+            PromptRegistry(self.tmpdir.name, languages=["EN"])
+        # Нестрогий режим сохраняет прежнее поведение load_prompts
+        registry = PromptRegistry(self.tmpdir.name, strict=False)
+        self.assertEqual(registry.render("outline_prompt", "RU", topic="Тема"), "")
+
+    def test_unknown_placeholder_fails_at_load(self):
+        self.write("outline_prompt_RU.txt", "Outline для {topik}")
+        with self.assertRaises(PromptTemplateError):
+            PromptRegistry(self.tmpdir.name)
+
+    def test_hot_reload(self):
+        registry = PromptRegistry(self.tmpdir.name, watch=True, reload_interval=0)
+        path = os.path.join(self.tmpdir.name, "outline_prompt_RU.txt")
+        self.write("outline_prompt_RU.txt", "Новый outline: {topic}")
+        os.utime(path, (time.time() + 10, time.time() + 10))
+        self.assertEqual(registry.render("outline_prompt", "RU", topic="Тема"), "Новый outline: Тема")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from response_cache import ResponseCache
+from transport import Transport
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "responses.sqlite")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_key_depends_on_request(self):
+        messages = [{"role": "user", "content": "Привет"}]
+        key = ResponseCache.make_key("gpt", 0.7, messages)
+        self.assertEqual(key, ResponseCache.make_key("gpt", 0.7, list(messages)))
+        self.assertNotEqual(key, ResponseCache.make_key("gpt", 0.2, messages))
+        self.assertNotEqual(key, ResponseCache.make_key("gpt", 0.7, messages, schema={"type": "object"}))
+
+    def test_ttl_and_max_entries(self):
+        cache = ResponseCache(self.path, ttl_seconds=0.05, max_entries=2)
+        cache.set("a", "1")
+        self.assertEqual(cache.get("a"), "1")
+        time.sleep(0.06)
+        self.assertIsNone(cache.get("a"))
+
+        for key in ["b", "c", "d"]:
+            cache.set(key, key)
+        cache.ttl_seconds = None
+        cache.evict()
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("b"))
+        cache.close()
+
+    def test_refresh_and_bypass(self):
+        cache = ResponseCache(self.path)
+        cache.set("a", "old")
+        cache.refresh = True
+        self.assertIsNone(cache.get("a"))
+        cache.set("a", "new")
+        cache.refresh = False
+        self.assertEqual(cache.get("a"), "new")
+        cache.bypass = True
+        cache.set("b", "value")
+        cache.bypass = False
+        self.assertIsNone(cache.get("b"))
+        cache.close()
+
+    def test_transport_serves_repeated_request_from_cache(self):
+        transport = Transport("sk-test", cache=ResponseCache(self.path))
+        response = MagicMock()
+        response.choices[0].message.content = "Ответ"
+        transport.client = MagicMock()
+        transport.client.chat.completions.create.return_value = response
+
+        messages = [{"role": "user", "content": "Привет"}]
+        self.assertEqual(transport.complete("gpt", messages, 0.7), "Ответ")
+        self.assertEqual(transport.complete("gpt", messages, 0.7), "Ответ")
+        self.assertEqual(transport.client.chat.completions.create.call_count, 1)
+        transport.cache.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
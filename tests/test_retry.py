@@ -0,0 +1,169 @@
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+import httpx
+from openai import APIConnectionError, BadRequestError, InternalServerError, RateLimitError
+
+from retry import CircuitBreaker, CircuitOpenError, RetryPolicy, is_retryable
+from scheduler import BatchScheduler
+from transport import Transport
+
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+def make_status_error(error_class, status_code: int, retry_after: str | None = None):
+    headers = {"retry-after": retry_after} if retry_after is not None else {}
+    return error_class("error", response=httpx.Response(status_code, headers=headers, request=REQUEST), body=None)
+
+
+def always_failing(status_code: int = 503):
+    def create(**kwargs):
+        raise make_status_error(InternalServerError, status_code)
+    return create
+
+
+def make_response(content: str = "Ответ"):
+    response = MagicMock()
+    response.choices[0].message.content = content
+    return response
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_classifies_errors(self):
+        self.assertTrue(is_retryable(make_status_error(InternalServerError, 503)))
+        self.assertTrue(is_retryable(APIConnectionError(request=REQUEST)))
+        self.assertFalse(is_retryable(make_status_error(BadRequestError, 400)))
+        self.assertFalse(is_retryable(ValueError("bad json")))
+
+    def test_delay_is_jittered_and_honors_retry_after(self):
+        policy = RetryPolicy(base_delay=1.0, max_delay=8.0)
+        delays = [policy.delay(4) for _ in range(50)]
+        self.assertTrue(all(0 <= delay <= 8.0 for delay in delays))
+        self.assertGreater(len(set(delays)), 1)
+        self.assertGreaterEqual(policy.delay(1, retry_after=5.0), 5.0)
+
+
+class TestTransportRetries(unittest.TestCase):
+    def setUp(self):
+        sleep = patch("transport.time.sleep")
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def make_transport(self, side_effect, **middleware):
+        transport = Transport("sk-test", **middleware)
+        transport.client = MagicMock()
+        transport.client.chat.completions.create.side_effect = side_effect
+        return transport
+
+    def test_retries_transient_errors(self):
+        transport = self.make_transport(
+            [make_status_error(InternalServerError, 503, retry_after="3"), APIConnectionError(request=REQUEST),
+             make_response()],
+            retry_policy=RetryPolicy(max_attempts=3, base_delay=0.01)
+        )
+        self.assertEqual(transport.complete("gpt", [{"role": "user", "content": "Привет"}], 0.5), "Ответ")
+        self.assertEqual(transport.client.chat.completions.create.call_count, 3)
+        self.assertGreaterEqual(self.sleep.call_args_list[0].args[0], 3.0)
+
+    def test_fatal_errors_and_exhausted_attempts_are_raised(self):
+        transport = self.make_transport([make_status_error(BadRequestError, 400)],
+                                        retry_policy=RetryPolicy(max_attempts=3))
+        with self.assertRaises(BadRequestError):
+            transport.complete("gpt", [{"role": "user", "content": "Привет"}], 0.5)
+        self.assertEqual(transport.client.chat.completions.create.call_count, 1)
+
+        transport = self.make_transport(always_failing(500), retry_policy=RetryPolicy(max_attempts=2, base_delay=0))
+        with self.assertRaises(InternalServerError):
+            transport.complete("gpt", [{"role": "user", "content": "Привет"}], 0.5)
+        self.assertEqual(transport.client.chat.completions.create.call_count, 2)
+
+    def test_circuit_breaker_opens_on_outage(self):
+        breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=60, max_wait=0)
+        transport = self.make_transport(
+            always_failing(),
+            retry_policy=RetryPolicy(max_attempts=5, base_delay=0), circuit_breaker=breaker
+        )
+        with self.assertRaises(CircuitOpenError):
+            transport.complete("gpt", [{"role": "user", "content": "Привет"}], 0.5)
+        self.assertEqual(transport.client.chat.completions.create.call_count, 2)
+        self.assertGreater(breaker.cooldown_remaining(), 0)
+
+    def test_rate_limits_do_not_open_circuit(self):
+        breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=60, max_wait=0)
+        responses = iter([make_status_error(RateLimitError, 429, "0")] * 3 + [make_response()])
+
+        def create(**kwargs):
+            response = next(responses)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        transport = self.make_transport(
+            create, retry_policy=RetryPolicy(max_attempts=5, base_delay=0), circuit_breaker=breaker
+        )
+        self.assertEqual(transport.complete("gpt", [{"role": "user", "content": "Привет"}], 0.5), "Ответ")
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_probe_without_response_is_released(self):
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0, max_wait=0)
+        breaker.record_failure()
+
+        def create(**kwargs):
+            raise ValueError("bad request body")
+
+        transport = self.make_transport(create, circuit_breaker=breaker)
+        with self.assertRaises(ValueError):
+            transport.complete("gpt", [{"role": "user", "content": "Привет"}], 0.5)
+        # Следующий запрос снова становится пробным, а не ждет застрявший
+        self.assertEqual(breaker.reserve(), 0)
+
+    def test_stream_interruption_counts_as_failure(self):
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=60, max_wait=0)
+
+        def chunks():
+            chunk = MagicMock(usage=None)
+            chunk.choices[0].delta.content = "Нача"
+            yield chunk
+            raise APIConnectionError(request=REQUEST)
+
+        transport = self.make_transport(lambda **kwargs: chunks(), circuit_breaker=breaker)
+        with self.assertRaises(APIConnectionError):
+            list(transport.stream("gpt", [{"role": "user", "content": "Привет"}], 0.5))
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_half_open_probe(self):
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.05)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertGreater(breaker.reserve(), 0)
+
+        time.sleep(0.06)
+        self.assertEqual(breaker.reserve(), 0)
+        # Пока пробный запрос не завершился, остальные ждут
+        self.assertGreater(breaker.reserve(), 0)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        time.sleep(0.06)
+        breaker.acquire()
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(breaker.reserve(), 0)
+
+    def test_scheduler_pauses_while_open(self):
+        breaker = MagicMock()
+        breaker.cooldown_remaining.side_effect = [0.0, 0.02, 0.0]
+        processed = []
+        report = BatchScheduler(max_concurrency=1, circuit_breaker=breaker).run(["a", "b"], processed.append)
+
+        self.assertEqual(processed, ["a", "b"])
+        self.assertEqual(report.succeeded, 2)
+        self.assertEqual(breaker.cooldown_remaining.call_count, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
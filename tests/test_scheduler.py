@@ -0,0 +1,80 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+import httpx
+from openai import RateLimitError
+
+from rate_limiter import RateLimiter
+from scheduler import BatchScheduler
+from transport import Transport
+
+
+def make_rate_limit_error(retry_after: str = "0") -> RateLimitError:
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(429, headers={"retry-after": retry_after}, request=request)
+    return RateLimitError("rate limited", response=response, body=None)
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_requests_per_minute_budget(self):
+        limiter = RateLimiter(requests_per_minute=60)
+        waits = [limiter.reserve() for _ in range(62)]
+        self.assertEqual(waits[0], 0)
+        # После исчерпания 60 запросов каждый следующий ждет ~1 секунду
+        self.assertAlmostEqual(waits[-1], 2.0, delta=0.1)
+
+    def test_backoff_grows_and_decays(self):
+        limiter = RateLimiter(backoff_base=1.0, backoff_max=4.0)
+        self.assertEqual(limiter.on_rate_limited(), 1.0)
+        self.assertEqual(limiter.on_rate_limited(), 2.0)
+        self.assertEqual(limiter.on_rate_limited(retry_after=10), 10)
+        self.assertGreater(limiter.cooldown_remaining(), 9)
+        limiter.on_success()
+        limiter.on_success()
+        self.assertEqual(limiter.on_rate_limited(), 2.0)
+
+
+class TestTransportRateLimit(unittest.TestCase):
+    def test_retries_after_429(self):
+        limiter = RateLimiter(backoff_base=0.01)
+        transport = Transport("sk-test", rate_limiter=limiter)
+        response = MagicMock()
+        response.choices[0].message.content = " Ответ "
+        response.usage.total_tokens = 10
+        transport.client = MagicMock()
+        transport.client.chat.completions.create.side_effect = [make_rate_limit_error(), response]
+
+        result = transport.complete("gpt", [{"role": "user", "content": "Привет"}], 0.5)
+
+        self.assertEqual(result, "Ответ")
+        self.assertEqual(limiter.rate_limited_count, 1)
+        self.assertEqual(transport.client.chat.completions.create.call_count, 2)
+
+
+class TestBatchScheduler(unittest.TestCase):
+    def test_bounded_concurrency_and_failures(self):
+        lock = threading.Lock()
+        active = {"now": 0, "max": 0}
+
+        def process(topic):
+            with lock:
+                active["now"] += 1
+                active["max"] = max(active["max"], active["now"])
+            time.sleep(0.01)
+            with lock:
+                active["now"] -= 1
+            if topic == "bad":
+                raise RuntimeError("boom")
+
+        topics = (t for t in ["a", "b", "bad", "c", "d", "e"])
+        report = BatchScheduler(max_concurrency=2).run(topics, process)
+
+        self.assertLessEqual(active["max"], 2)
+        self.assertEqual(report.succeeded, 5)
+        self.assertEqual(report.failed_topics, ["bad"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import settings
+from settings import ClientFactory, Settings
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestSettings(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.addCleanup(settings.configure, None)
+
+    def test_import_does_not_read_env_or_load_openai(self):
+        # В каталоге без .env импорт должен проходить и не тянуть openai
+        code = "import sys, main, summarizer; print('openai' in sys.modules)"
+        env = {**os.environ, "PYTHONPATH": ROOT}
+        result = subprocess.run([sys.executable, "-c", code], cwd=self.tmpdir.name, env=env,
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), "False")
+
+    def test_from_env_prefers_process_environment(self):
+        path = os.path.join(self.tmpdir.name, ".env")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("MODEL_ADVANCED=gpt-file\nTEMPERATURE=0.2\nOPENAI_API_KEY=sk-file\n")
+
+        with patch.dict(os.environ, {"OPENAI_API_KEY": "sk-env"}):
+            loaded = Settings.from_env(path)
+        self.assertEqual((loaded.model_advanced, loaded.temperature, loaded.openai_api_key),
+                         ("gpt-file", 0.2, "sk-env"))
+        self.assertEqual(loaded.summary_max_sentences, 3)
+
+    def test_factory_injects_settings_and_creates_transport_lazily(self):
+        transport = MagicMock()
+        factory = ClientFactory(Settings(model_advanced="gpt-a", model_summarizer="gpt-s", temperature=0.1,
+                                         summary_max_sentences=5), transport=transport)
+        client = factory.gpt_client()
+        summarizer = factory.summarizer()
+
+        self.assertEqual((client.model, client.temperature), ("gpt-a", 0.1))
+        self.assertEqual((summarizer.model, summarizer.max_sentences), ("gpt-s", 5))
+        self.assertIs(client.transport, summarizer.transport)
+
+        with patch("transport.get_transport") as get_transport:
+            lazy = ClientFactory(Settings(openai_api_key="sk-test"))
+            get_transport.assert_not_called()
+            self.assertIs(lazy.transport, get_transport.return_value)
+            get_transport.assert_called_once_with("sk-test")
+
+    def test_factories_with_transport_options_get_own_transports(self):
+        with patch("transport.get_transport") as get_transport:
+            first = ClientFactory(Settings(openai_api_key="sk-test"), max_connections=2)
+            second = ClientFactory(Settings(openai_api_key="sk-test", openai_base_url="http://localhost:8089/v1"))
+            self.assertIsNot(first.transport, second.transport)
+            get_transport.assert_not_called()
+        self.assertEqual(str(second.transport.client.base_url), "http://localhost:8089/v1/")
+
+    def test_legacy_constants_resolve_from_settings(self):
+        import gpt_client
+        settings.configure(Settings(model_advanced="gpt-legacy"))
+        self.assertEqual(gpt_client.MODEL_ADVANCED, "gpt-legacy")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from utils import ArticleRecord, ArticleSink, BackgroundSink, FileSink, JsonlSink, SqliteSink
+
+
+class TestFileSink(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def test_colliding_topics_get_suffixes(self):
+        sink = FileSink(self.tmpdir.name)
+        first = sink.write("a/b", "# a/b\n\nПервая")
+        second = sink.write("a_b", "# a_b\n\nВторая")
+        self.assertNotEqual(first, second)
+        self.assertTrue(second.endswith("a_b-2.md"))
+
+        # Та же тема в новом запуске перезаписывает свою статью, а не создает копию
+        again = FileSink(self.tmpdir.name).write("a/b", "# a/b\n\nНовая")
+        self.assertEqual(again, first)
+        with open(first, encoding="utf-8") as file:
+            self.assertEqual(file.read(), "# a/b\n\nНовая")
+        self.assertEqual(sorted(os.listdir(self.tmpdir.name)), ["a_b-2.md", "a_b.md"])
+
+    def test_explicit_output_path(self):
+        path = os.path.join(self.tmpdir.name, "nested", "custom.md")
+        self.assertEqual(FileSink(self.tmpdir.name).write("Тема", "# Тема\n", {"output_path": path}), path)
+        self.assertTrue(os.path.exists(path))
+
+    def test_translation_is_replaced_on_rerun(self):
+        # Перевод начинается с переведенного заголовка, а не с "# <тема>"
+        path = os.path.join(self.tmpdir.name, "EN", "Тема.md")
+        for text in ("# Topic\n\nFirst", "# Topic\n\nSecond"):
+            written = FileSink(self.tmpdir.name).write("Тема", text, {"language": "EN", "output_path": path})
+            self.assertEqual(written, path)
+        self.assertEqual(os.listdir(os.path.dirname(path)), ["Тема.md"])
+        with open(path, encoding="utf-8") as file:
+            self.assertEqual(file.read(), "# Topic\n\nSecond")
+
+        # В одном запуске явный путь другой темы по-прежнему не перезаписывается
+        sink = FileSink(self.tmpdir.name)
+        sink.write("Тема", "# Topic", {"output_path": path})
+        self.assertNotEqual(sink.write("Другая тема", "# Other", {"output_path": path}), path)
+
+
+class TestBatchedSinks(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def test_jsonl_gzip_appends_batches(self):
+        path = os.path.join(self.tmpdir.name, "articles.jsonl.gz")
+        sink = JsonlSink(path)
+        sink.write_batch([ArticleRecord("a", "Текст a", {"language": "RU"}), ArticleRecord("b", "Текст b")])
+        sink.write("c", "Текст c")
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            records = [json.loads(line) for line in file]
+        self.assertEqual([record["topic"] for record in records], ["a", "b", "c"])
+        self.assertEqual(records[0]["language"], "RU")
+
+    def test_sqlite_replaces_by_topic_and_language(self):
+        path = os.path.join(self.tmpdir.name, "articles.sqlite")
+        with SqliteSink(path) as sink:
+            sink.write("a", "один два", {"language": "EN"})
+            sink.write("a", "один два три", {"language": "EN"})
+            sink.write("a", "uno", {"language": "ES"})
+        with sqlite3.connect(path) as conn:
+            rows = conn.execute("SELECT language, words FROM articles ORDER BY language").fetchall()
+        self.assertEqual(rows, [("EN", 3), ("ES", 1)])
+
+
+class RecordingSink(ArticleSink):
+    def __init__(self, fail_on: str | None = None):
+        self.batches = []
+        self.fail_on = fail_on
+        self.closed = False
+
+    def write_batch(self, records):
+        if any(record.topic == self.fail_on for record in records):
+            raise OSError("disk full")
+        self.batches.append([record.topic for record in records])
+        return [f"mem://{record.topic}" for record in records]
+
+    def close(self):
+        self.closed = True
+
+
+class TestBackgroundSink(unittest.TestCase):
+    def test_batches_writes_and_resolves_futures(self):
+        inner = RecordingSink()
+        sink = BackgroundSink(inner, batch_size=3, flush_interval=5.0)
+        futures = [sink.write(f"t{i}", "Текст") for i in range(7)]
+        sink.close()
+
+        self.assertEqual([future.result() for future in futures], [f"mem://t{i}" for i in range(7)])
+        self.assertEqual([len(batch) for batch in inner.batches], [3, 3, 1])
+        self.assertTrue(inner.closed)
+        sink.close()
+
+    def test_write_error_fails_the_batch(self):
+        sink = BackgroundSink(RecordingSink(fail_on="bad"), batch_size=10, flush_interval=0.01)
+        done = threading.Event()
+        future = sink.write("bad", "Текст")
+        future.add_done_callback(lambda _: done.set())
+        self.assertTrue(done.wait(1))
+        self.assertIsInstance(future.exception(), OSError)
+        self.assertEqual(sink.write("ok", "Текст").result(timeout=1), "mem://ok")
+        sink.close()
+        self.assertEqual((sink.written, sink.failed), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from gpt_client import GPTClient
+from prompt_registry import PromptRegistry
+from system_prompts import ClientPool, SystemPromptProvider, TopicGrouper, normalize_topic
+
+
+class TestSystemPromptProvider(unittest.TestCase):
+    def setUp(self):
+        self.prompts = MagicMock(spec=PromptRegistry)
+        self.prompts.render.side_effect = lambda name, language, topic: f"prompt for {topic}"
+        self.prompts.text.return_value = "Стандартный промпт"
+        self.created = []
+
+        def factory():
+            client = MagicMock(spec=GPTClient)
+            client.chat.side_effect = lambda prompt: (time.sleep(0.02), f"system: {prompt}")[1]
+            self.created.append(client)
+            return client
+
+        self.pool = ClientPool(factory, size=2)
+
+    def test_memoizes_by_normalized_topic_and_language(self):
+        provider = SystemPromptProvider(self.prompts, self.pool)
+        first = provider.get("Python  Decorators!", "EN")
+        self.assertEqual(provider.get("python decorators", "EN"), first)
+        provider.get("python decorators", "RU")
+
+        self.assertEqual((provider.misses, provider.hits), (2, 1))
+        self.assertEqual(sum(client.chat.call_count for client in self.created), 2)
+
+    def test_concurrent_requests_share_one_call_and_pool_is_bounded(self):
+        provider = SystemPromptProvider(self.prompts, self.pool)
+        topics = ["Тема A", "тема a", "Тема B", "Тема C", "Тема D"]
+        results = {}
+        threads = [
+            threading.Thread(target=lambda t=t: results.__setitem__(t, provider.get(t, "RU")))
+            for t in topics
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results["Тема A"], results["тема a"])
+        self.assertLessEqual(len(self.created), 2)
+        self.assertEqual(sum(client.chat.call_count for client in self.created), 4)
+
+    def test_groups_similar_topics(self):
+        provider = SystemPromptProvider(self.prompts, self.pool, grouper=TopicGrouper(0.6))
+        first = provider.get("Async IO in Python", "EN")
+        self.assertEqual(provider.get("Python async IO", "EN"), first)
+        self.assertNotEqual(provider.get("Gardening tips", "EN"), first)
+
+    def test_failure_falls_back_and_is_not_cached(self):
+        failing = MagicMock(spec=GPTClient)
+        failing.chat.side_effect = RuntimeError("boom")
+        provider = SystemPromptProvider(self.prompts, ClientPool(lambda: failing, size=1))
+
+        self.assertEqual(provider.get("Тема", "RU"), "Стандартный промпт")
+        provider.get("Тема", "RU")
+        self.assertEqual(failing.chat.call_count, 2)
+
+    def test_failed_client_creation_frees_its_slot(self):
+        attempts = []
+
+        def factory():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RuntimeError("no client")
+            return MagicMock(spec=GPTClient)
+
+        pool = ClientPool(factory, size=1, timeout=0.1)
+        with self.assertRaises(RuntimeError):
+            with pool.lease("Промпт"):
+                pass
+        with pool.lease("Промпт") as client:
+            self.assertEqual(client.conversation, [{"role": "system", "content": "Промпт"}])
+            with self.assertRaises(TimeoutError):
+                with pool.lease("Промпт"):
+                    pass
+
+    def test_normalize_topic(self):
+        self.assertEqual(normalize_topic("  Hello,   World! "), "hello world")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import json
+import os
+import tempfile
+import unittest
+import unittest.mock
+from unittest.mock import MagicMock
+
+from article_generator import ArticleGenerator
+from gpt_client import GPTClient
+from journal import JobJournal
+from topic_index import MERGE, REUSE_OUTLINE, SKIP, TopicIndex, article_topics, deduplicate_topics
+from utils import TopicJob
+
+
+class TestTopicIndex(unittest.TestCase):
+    def test_finds_reordered_and_recased_variants(self):
+        index = TopicIndex(threshold=0.7)
+        self.assertIsNone(index.match_or_add("Caching strategies in Python"))
+        self.assertIsNone(index.match_or_add("Memory safety in Rust"))
+
+        match = index.query("python CACHING strategies")
+        self.assertEqual(match.topic, "Caching strategies in Python")
+        self.assertGreaterEqual(match.similarity, 0.7)
+        self.assertEqual(index.query("Rust: memory safety").topic, "Memory safety in Rust")
+        self.assertIsNone(index.query("Kubernetes networking"))
+        # Запрос не добавляет тему в индекс
+        self.assertEqual(len(index), 2)
+
+    def test_empty_topic_never_matches(self):
+        index = TopicIndex()
+        self.assertIsNone(index.match_or_add("!!!"))
+        self.assertIsNone(index.match_or_add("???"))
+        self.assertEqual(len(index), 0)
+
+
+class TestDeduplicateTopics(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.jobs = [TopicJob("Caching in Python"), TopicJob("python caching"), TopicJob("Rust ownership")]
+
+    def test_skip_and_merge(self):
+        kept = list(deduplicate_topics(self.jobs, TopicIndex(), SKIP))
+        self.assertEqual([job.topic for job in kept], ["Caching in Python", "Rust ownership"])
+
+        aliases = os.path.join(self.tmpdir.name, "aliases.jsonl")
+        kept = list(deduplicate_topics(self.jobs, TopicIndex(), MERGE, aliases_path=aliases))
+        self.assertEqual(len(kept), 2)
+        with open(aliases, encoding="utf-8") as file:
+            record = json.loads(file.readline())
+        self.assertEqual((record["topic"], record["article"]), ("python caching", "Caching in Python"))
+
+    def test_reuse_outline_defers_duplicates(self):
+        self.jobs[1] = TopicJob("python caching", language="EN", sections=4)
+        with unittest.mock.patch("topic_index.tempfile.TemporaryFile", wraps=tempfile.TemporaryFile) as spill:
+            kept = list(deduplicate_topics(self.jobs, TopicIndex(), REUSE_OUTLINE))
+        # Отложенные дубликаты хранятся на диске, а не в списке в памяти
+        spill.assert_called_once()
+        self.assertEqual([job.topic for job in kept], ["Caching in Python", "Rust ownership", "python caching"])
+        self.assertEqual(kept[-1].outline_from, "Caching in Python")
+        self.assertEqual(kept[-1].options(), {"language": "EN", "sections": 4, "outline_from": "Caching in Python"})
+
+    def test_existing_articles(self):
+        with open(os.path.join(self.tmpdir.name, "Caching_in_Python.md"), "w", encoding="utf-8") as file:
+            file.write("# Caching in Python\n\nТекст\n")
+        index = TopicIndex()
+        for topic in article_topics(self.tmpdir.name):
+            index.add(topic, existing=True)
+
+        # Та же тема генерируется заново, а ее вариант считается дубликатом статьи
+        kept = list(deduplicate_topics(self.jobs, index, SKIP))
+        self.assertEqual([job.topic for job in kept], ["Caching in Python", "Rust ownership"])
+
+
+class TestOutlineReuse(unittest.TestCase):
+    def test_generator_takes_outline_from_journal(self):
+        gpt = MagicMock(spec=GPTClient)
+        gpt.chat.side_effect = lambda *args, **kwargs: "Текст"
+        with tempfile.TemporaryDirectory() as tmpdir, unittest.mock.patch.object(
+            ArticleGenerator, "generate_system_prompt", return_value="Системный промпт"
+        ):
+            journal = JobJournal(tmpdir)
+            journal.put("Caching in Python", "outline", [{"title": "Раздел", "subtopics": ["A"]}])
+            generator = ArticleGenerator(gpt=gpt, language="RU", journal=journal, outline_from="Caching in Python")
+            article = generator.generate_article("python caching")
+            self.assertEqual(journal.get("python caching", "outline"), [{"title": "Раздел", "subtopics": ["A"]}])
+
+        gpt.chat_with_format.assert_not_called()
+        self.assertIn("# python caching\n\n## Раздел\nТекст", article)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,222 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+from collections import defaultdict
+from dataclasses import dataclass, replace
+from typing import Iterable, Iterator
+
+from system_prompts import normalize_topic
+from utils import TopicJob
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_THRESHOLD = 0.7
+DEFAULT_NUM_PERM = 64
+DEFAULT_BANDS = 16
+SHINGLE_SIZE = 3
+
+# Что делать с темой, похожей на уже известную
+SKIP = "skip"
+MERGE = "merge"
+REUSE_OUTLINE = "reuse_outline"
+POLICIES = (SKIP, MERGE, REUSE_OUTLINE)
+
+_MASK64 = (1 << 64) - 1
+
+
+def topic_shingles(topic: str, size: int = SHINGLE_SIZE) -> set[str]:
+    """
+    Признаки темы: нормализованные слова и символьные n-граммы каждого слова.
+    Порядок слов не влияет на набор, а n-граммы сглаживают разные формы слова.
+    """
+    words = normalize_topic(topic).split()
+    shingles = set(words)
+    for word in words:
+        padded = f" {word} "
+        shingles.update(padded[i:i + size] for i in range(max(1, len(padded) - size + 1)))
+    return shingles
+
+
+@dataclass
+class TopicMatch:
+    """
+    Найденная похожая тема: topic — тема из индекса, similarity — оценка
+    коэффициента Жаккара, existing — тема уже сгенерированной ранее статьи.
+    """
+    topic: str
+    similarity: float
+    existing: bool = False
+
+
+class TopicIndex:
+    """
+    Индекс почти одинаковых тем на MinHash и LSH. Сигнатура темы из num_perm
+    минимальных хешей ее признаков делится на bands полос; кандидаты — темы,
+    совпавшие с запросом хотя бы в одной полосе, поэтому поиск не перебирает
+    весь индекс. Кандидаты проверяются по доле совпавших хешей (оценка Жаккара)
+    с порогом threshold. Хранятся только сигнатуры, не признаки тем.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, num_perm: int = DEFAULT_NUM_PERM,
+                 bands: int = DEFAULT_BANDS, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = random.Random(seed)
+        # Хеш-функции вида (a * x + b) mod 2^64, старшие 32 бита; a нечетное
+        self._coefficients = [(rng.getrandbits(64) | 1, rng.getrandbits(64)) for _ in range(num_perm)]
+        self._lock = threading.Lock()
+        self._buckets: dict[tuple[int, int], list[int]] = defaultdict(list)
+        self._topics: list[str] = []
+        self._signatures: list[tuple[int, ...]] = []
+        self._existing: set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._topics)
+
+    def signature(self, topic: str) -> tuple[int, ...]:
+        hashes = [
+            int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+            for shingle in topic_shingles(topic)
+        ]
+        if not hashes:
+            return ()
+        return tuple(min(((a * h + b) & _MASK64) >> 32 for h in hashes) for a, b in self._coefficients)
+
+    def _band_keys(self, signature: tuple[int, ...]) -> list[tuple[int, int]]:
+        return [(band, hash(signature[band * self.rows:(band + 1) * self.rows])) for band in range(self.bands)]
+
+    def _query(self, signature: tuple[int, ...]) -> TopicMatch | None:
+        if not signature:
+            return None
+        best, best_similarity = None, 0.0
+        candidates = {i for key in self._band_keys(signature) for i in self._buckets.get(key, ())}
+        for i in candidates:
+            similarity = sum(x == y for x, y in zip(signature, self._signatures[i])) / self.num_perm
+            if similarity >= self.threshold and similarity > best_similarity:
+                best, best_similarity = i, similarity
+        if best is None:
+            return None
+        return TopicMatch(self._topics[best], best_similarity, best in self._existing)
+
+    def _add(self, topic: str, signature: tuple[int, ...], existing: bool) -> None:
+        if not signature:
+            return
+        i = len(self._topics)
+        self._topics.append(topic)
+        self._signatures.append(signature)
+        if existing:
+            self._existing.add(i)
+        for key in self._band_keys(signature):
+            self._buckets[key].append(i)
+
+    def query(self, topic: str) -> TopicMatch | None:
+        """
+        Самая похожая тема индекса не ниже порога или None.
+        """
+        signature = self.signature(topic)
+        with self._lock:
+            return self._query(signature)
+
+    def add(self, topic: str, existing: bool = False) -> None:
+        signature = self.signature(topic)
+        with self._lock:
+            self._add(topic, signature, existing)
+
+    def match_or_add(self, topic: str) -> TopicMatch | None:
+        """
+        Возвращает похожую тему, а если ее нет — добавляет тему в индекс.
+        """
+        signature = self.signature(topic)
+        with self._lock:
+            match = self._query(signature)
+            if match is None:
+                self._add(topic, signature, existing=False)
+            return match
+
+
+def article_topics(output_dir: str) -> Iterator[str]:
+    """
+    Темы сохраненных статей каталога: первая строка .md файла вида "# тема".
+    """
+    try:
+        with os.scandir(output_dir) as entries:
+            paths = [entry.path for entry in entries if entry.is_file() and entry.name.endswith(".md")]
+    except OSError:
+        return
+    for path in paths:
+        try:
+            with open(path, encoding="utf-8") as file:
+                first_line = file.readline()
+        except (OSError, UnicodeDecodeError):
+            continue
+        if first_line.startswith("# "):
+            yield first_line[2:].strip()
+
+
+def deduplicate_topics(jobs: Iterable[TopicJob], index: TopicIndex, policy: str = SKIP,
+                       aliases_path: str | None = None) -> Iterator[TopicJob]:
+    """
+    Отсеивает темы, почти совпадающие с предыдущими темами потока или с темами
+    статей, добавленных в индекс как existing. Тема, нормализованно равная теме
+    существующей статьи, не считается дубликатом: это повторная генерация.
+
+    skip — дубликат не генерируется; merge — тоже, но пара "тема -> статья"
+    дописывается в aliases_path (JSONL); reuse_outline — дубликат генерируется
+    по outline похожей темы из журнала и откладывается в конец потока, чтобы
+    к его началу outline исходной темы уже был готов. Отложенные задания
+    до конца потока лежат во временном JSONL-файле, а не в памяти.
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown duplicate policy '{policy}', expected one of {POLICIES}")
+    deferred = None
+    duplicates = 0
+    aliases = None
+    if policy == MERGE and aliases_path:
+        directory = os.path.dirname(aliases_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        aliases = open(aliases_path, "a", encoding="utf-8")
+    try:
+        for job in jobs:
+            match = index.match_or_add(job.topic)
+            if match is None or (match.existing and normalize_topic(match.topic) == normalize_topic(job.topic)):
+                yield job
+                continue
+            duplicates += 1
+            logger.info(
+                f"Topic '{job.topic}' is a near-duplicate of '{match.topic}' "
+                f"(similarity {match.similarity:.2f}), policy: {policy}"
+            )
+            if policy == REUSE_OUTLINE:
+                if deferred is None:
+                    deferred = tempfile.TemporaryFile("w+", encoding="utf-8")
+                deferred.write(json.dumps(
+                    {"topic": job.topic, **replace(job, outline_from=match.topic).options()}, ensure_ascii=False
+                ) + "\n")
+            elif aliases is not None:
+                aliases.write(json.dumps(
+                    {"topic": job.topic, "article": match.topic, "similarity": round(match.similarity, 3)},
+                    ensure_ascii=False
+                ) + "\n")
+                aliases.flush()
+        if deferred is not None:
+            deferred.seek(0)
+            for line in deferred:
+                yield TopicJob(**json.loads(line))
+    finally:
+        if aliases is not None:
+            aliases.close()
+        if deferred is not None:
+            deferred.close()
+        if duplicates:
+            logger.info(f"Near-duplicate topics found: {duplicates} ({policy})")
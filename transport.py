@@ -0,0 +1,437 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, AsyncIterator, Iterator
+
+from rate_limiter import RateLimiter, estimate_tokens, retry_after_seconds
+from response_cache import ResponseCache
+from metrics import MetricsRecorder
+from retry import CircuitBreaker, RetryPolicy, is_rate_limit, is_retryable, retry_delay
+
+if TYPE_CHECKING:
+    import httpx
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+DEFAULT_TIMEOUT = 120.0
+DEFAULT_RATE_LIMIT_RETRIES = 5
+
+
+# openai и httpx импортируются при создании транспорта: их импорт занимает
+# большую часть времени старта, а клиент нужен не каждому процессу
+
+def _build_limits(max_connections: int, max_keepalive_connections: int) -> "httpx.Limits":
+    import httpx
+
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=min(max_keepalive_connections, max_connections),
+    )
+
+
+def _build_timeout(timeout: float) -> "httpx.Timeout":
+    import httpx
+
+    # pool=None: при исчерпании пула запрос ждет свободное соединение, а не падает
+    return httpx.Timeout(timeout, pool=None)
+
+
+def _usage(response) -> tuple[int, int, int] | None:
+    """
+    Токены из usage ответа: (prompt, completion, cached prompt).
+    """
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) or 0
+    return usage.prompt_tokens or 0, usage.completion_tokens or 0, cached
+
+
+class _BaseTransport:
+    """
+    Общая часть синхронного и асинхронного транспорта: кэш ответов,
+    учет бюджета rate_limiter, повторы после временных ошибок,
+    circuit breaker и запись метрик вызовов.
+    """
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT, rate_limiter: RateLimiter | None = None,
+                 rate_limit_retries: int = DEFAULT_RATE_LIMIT_RETRIES,
+                 cache: ResponseCache | None = None, metrics: MetricsRecorder | None = None,
+                 retry_policy: RetryPolicy | None = None, circuit_breaker: CircuitBreaker | None = None):
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.rate_limit_retries = rate_limit_retries
+        self.cache = cache
+        self.metrics = metrics
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+
+    def _cache_lookup(self, model: str, temperature: float, messages: list[dict],
+                      schema: dict | None, kwargs: dict) -> tuple[str | None, str | None]:
+        """
+        Возвращает (ключ кэша, сохраненный ответ); ключ None, если кэш не подключен.
+        """
+        if self.cache is None:
+            return None, None
+        cache_key = self.cache.make_key(model, temperature, messages, schema, **kwargs)
+        return cache_key, self.cache.get(cache_key)
+
+    def _cache_store(self, cache_key: str | None, content: str) -> None:
+        if cache_key is not None:
+            self.cache.set(cache_key, content)
+
+    def _on_breaker_error(self, error: BaseException) -> None:
+        """
+        Передает исход неудачного запроса (или оборвавшегося потока) в circuit breaker.
+        """
+        if self.circuit_breaker is None:
+            return
+        # 429 не считается сбоем: паузу выдерживает rate_limiter, а разомкнутая
+        # цепь лишь провалила бы темы, которые прошли бы после нее
+        if isinstance(error, Exception) and is_retryable(error) and not is_rate_limit(error):
+            self.circuit_breaker.record_failure()
+        elif getattr(error, "status_code", None) is not None:
+            # Провайдер ответил, пусть и ошибкой запроса или 429, — он доступен
+            self.circuit_breaker.record_success()
+        else:
+            # Без ответа провайдера исход неизвестен: пробный запрос не должен застрять
+            self.circuit_breaker.release()
+
+    def _on_error(self, error: Exception, attempt: int) -> float:
+        """
+        Учитывает неудачную попытку и возвращает паузу перед повтором;
+        пробрасывает ошибку, если она фатальная или попытки исчерпаны.
+        """
+        self._on_breaker_error(error)
+
+        if is_rate_limit(error) and self.rate_limiter:
+            # Паузу после 429 выдерживает rate_limiter.acquire перед следующей попыткой
+            self.rate_limiter.on_rate_limited(retry_after_seconds(error))
+            if attempt > self.rate_limit_retries:
+                raise error
+            return 0.0
+
+        delay = retry_delay(error, attempt, self.retry_policy)
+        if delay is None:
+            raise error
+        logger.warning(f"LLM request failed ({type(error).__name__}: {error}), "
+                       f"retry {attempt} in {delay:.1f}s")
+        return delay
+
+    def _on_success(self) -> None:
+        if self.rate_limiter:
+            self.rate_limiter.on_success()
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record_success()
+
+    def _on_response(self, estimated: int, usage: tuple[int, int, int] | None) -> None:
+        if self.rate_limiter and usage is not None:
+            self.rate_limiter.record_usage(estimated, usage[0] + usage[1])
+
+    def _record(self, started: float, model: str, usage: tuple[int, int, int] | None = None, retries: int = 0,
+                cache_hit: bool = False, error: bool = False) -> None:
+        if self.metrics is None:
+            return
+        prompt_tokens, completion_tokens, cached_tokens = usage or (0, 0, 0)
+        self.metrics.record(
+            time.perf_counter() - started,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cached_tokens=cached_tokens,
+            retries=retries,
+            cache_hit=cache_hit,
+            error=error,
+            model=model,
+        )
+
+
+class Transport(_BaseTransport):
+    """
+    Синхронный транспорт к OpenAI: один клиент с пулом keep-alive соединений,
+    общий для всех GPTClient и Summarizer в процессе.
+    base_url позволяет направить запросы в OpenAI-совместимый сервер
+    (например, benchmarks/mock_llm_server.py); None — OPENAI_BASE_URL или api.openai.com.
+    """
+
+    def __init__(self, api_key: str, max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+                 timeout: float = DEFAULT_TIMEOUT, base_url: str | None = None, **middleware):
+        super().__init__(timeout=timeout, **middleware)
+        import httpx
+        from openai import OpenAI
+
+        self.client = OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            # С retry_policy повторами управляет транспорт, а не встроенный механизм SDK
+            **({"max_retries": 0} if self.retry_policy is not None else {}),
+            http_client=httpx.Client(
+                limits=_build_limits(max_connections, max_keepalive_connections),
+                timeout=_build_timeout(timeout),
+            ),
+        )
+
+    def complete(self, model: str, messages: list[dict], temperature: float,
+                 timeout: float | None = None, schema: dict | None = None, **kwargs) -> str:
+        """
+        Выполняет chat completion и возвращает текст ответа.
+        timeout переопределяет таймаут транспорта для одного вызова.
+        schema — JSON-схема ожидаемого ответа, учитывается в ключе кэша.
+        Если задан rate_limiter, запрос ждет свободного бюджета RPM/TPM,
+        а при 429 повторяется после адаптивной паузы.
+        """
+        started = time.perf_counter()
+        cache_key, cached = self._cache_lookup(model, temperature, messages, schema, kwargs)
+        if cached is not None:
+            self._record(started, model, cache_hit=True)
+            return cached
+
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        estimated = estimate_tokens(messages, kwargs.get("max_tokens"))
+        try:
+            response, retries = self._create(estimated, model=model, messages=messages,
+                                             temperature=temperature, **kwargs)
+        except Exception:
+            self._record(started, model, error=True)
+            raise
+
+        usage = _usage(response)
+        self._on_response(estimated, usage)
+        self._record(started, model, usage, retries=retries)
+        content = response.choices[0].message.content.strip()
+        self._cache_store(cache_key, content)
+        return content
+
+    def stream(self, model: str, messages: list[dict], temperature: float,
+               timeout: float | None = None, schema: dict | None = None, **kwargs) -> Iterator[str]:
+        """
+        Как complete, но отдает текст ответа по частям по мере генерации.
+        Готовый ответ сохраняется в кэш; ответ из кэша отдается одним куском.
+        """
+        started = time.perf_counter()
+        cache_key, cached = self._cache_lookup(model, temperature, messages, schema, kwargs)
+        if cached is not None:
+            self._record(started, model, cache_hit=True)
+            yield cached
+            return
+
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        estimated = estimate_tokens(messages, kwargs.get("max_tokens"))
+        parts = []
+        usage = None
+        try:
+            stream, retries = self._create(estimated, model=model, messages=messages, temperature=temperature,
+                                           stream=True, stream_options={"include_usage": True}, **kwargs)
+        except Exception:
+            self._record(started, model, error=True)
+            raise
+
+        try:
+            for chunk in stream:
+                usage = _usage(chunk) or usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        except Exception as e:
+            # Обрыв потока после успешного начала ответа — тоже сбой провайдера
+            self._on_breaker_error(e)
+            self._record(started, model, usage, error=True)
+            raise
+
+        self._on_response(estimated, usage)
+        self._record(started, model, usage, retries=retries)
+        self._cache_store(cache_key, "".join(parts).strip())
+
+    def _create(self, estimated: int, **request):
+        """
+        Отправляет запрос с учетом бюджета rate_limiter и circuit breaker,
+        повторяя его после 429 и временных сбоев.
+        Возвращает ответ и число повторов.
+        """
+        attempt = 0
+        while True:
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.acquire()
+            if self.rate_limiter:
+                self.rate_limiter.acquire(estimated)
+            try:
+                response = self.client.chat.completions.create(**request)
+                break
+            except Exception as e:
+                attempt += 1
+                delay = self._on_error(e, attempt)
+                if delay > 0:
+                    time.sleep(delay)
+            except BaseException as e:
+                # Прерывание во время пробного запроса не должно оставить цепь в ожидании
+                self._on_breaker_error(e)
+                raise
+
+        self._on_success()
+        return response, attempt
+
+    def close(self) -> None:
+        self.client.close()
+
+
+class AsyncTransport(_BaseTransport):
+    """
+    Асинхронный транспорт к OpenAI: один AsyncOpenAI с общим пулом соединений.
+    Позволяет держать сотни запросов одновременно в одном процессе.
+    """
+
+    def __init__(self, api_key: str, max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+                 timeout: float = DEFAULT_TIMEOUT, base_url: str | None = None, **middleware):
+        super().__init__(timeout=timeout, **middleware)
+        import httpx
+        from openai import AsyncOpenAI
+
+        self.client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            # С retry_policy повторами управляет транспорт, а не встроенный механизм SDK
+            **({"max_retries": 0} if self.retry_policy is not None else {}),
+            http_client=httpx.AsyncClient(
+                limits=_build_limits(max_connections, max_keepalive_connections),
+                timeout=_build_timeout(timeout),
+            ),
+        )
+
+    async def complete(self, model: str, messages: list[dict], temperature: float,
+                       timeout: float | None = None, schema: dict | None = None, **kwargs) -> str:
+        """
+        Асинхронный аналог Transport.complete.
+        """
+        started = time.perf_counter()
+        cache_key, cached = self._cache_lookup(model, temperature, messages, schema, kwargs)
+        if cached is not None:
+            self._record(started, model, cache_hit=True)
+            return cached
+
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        estimated = estimate_tokens(messages, kwargs.get("max_tokens"))
+        try:
+            response, retries = await self._create(estimated, model=model, messages=messages,
+                                                   temperature=temperature, **kwargs)
+        except Exception:
+            self._record(started, model, error=True)
+            raise
+
+        usage = _usage(response)
+        self._on_response(estimated, usage)
+        self._record(started, model, usage, retries=retries)
+        content = response.choices[0].message.content.strip()
+        self._cache_store(cache_key, content)
+        return content
+
+    async def stream(self, model: str, messages: list[dict], temperature: float,
+                     timeout: float | None = None, schema: dict | None = None, **kwargs) -> AsyncIterator[str]:
+        """
+        Асинхронный аналог Transport.stream.
+        """
+        started = time.perf_counter()
+        cache_key, cached = self._cache_lookup(model, temperature, messages, schema, kwargs)
+        if cached is not None:
+            self._record(started, model, cache_hit=True)
+            yield cached
+            return
+
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        estimated = estimate_tokens(messages, kwargs.get("max_tokens"))
+        parts = []
+        usage = None
+        try:
+            stream, retries = await self._create(estimated, model=model, messages=messages, temperature=temperature,
+                                                 stream=True, stream_options={"include_usage": True}, **kwargs)
+        except Exception:
+            self._record(started, model, error=True)
+            raise
+
+        try:
+            async for chunk in stream:
+                usage = _usage(chunk) or usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        except Exception as e:
+            # Обрыв потока после успешного начала ответа — тоже сбой провайдера
+            self._on_breaker_error(e)
+            self._record(started, model, usage, error=True)
+            raise
+
+        self._on_response(estimated, usage)
+        self._record(started, model, usage, retries=retries)
+        self._cache_store(cache_key, "".join(parts).strip())
+
+    async def _create(self, estimated: int, **request):
+        attempt = 0
+        while True:
+            if self.circuit_breaker is not None:
+                await self.circuit_breaker.acquire_async()
+            if self.rate_limiter:
+                await self.rate_limiter.acquire_async(estimated)
+            try:
+                response = await self.client.chat.completions.create(**request)
+                break
+            except Exception as e:
+                attempt += 1
+                delay = self._on_error(e, attempt)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            except BaseException as e:
+                # Отмена задачи во время пробного запроса не должна оставить цепь в ожидании
+                self._on_breaker_error(e)
+                raise
+
+        self._on_success()
+        return response, attempt
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+_lock = threading.Lock()
+_transport: Transport | None = None
+_async_transport: AsyncTransport | None = None
+
+
+def get_transport(api_key: str, **pool_options) -> Transport:
+    """
+    Возвращает общий для процесса синхронный транспорт, создавая его при первом вызове.
+    """
+    global _transport
+    with _lock:
+        if _transport is None:
+            _transport = Transport(api_key, **pool_options)
+            logger.info("Created shared OpenAI transport")
+        return _transport
+
+
+def get_async_transport(api_key: str, **pool_options) -> AsyncTransport:
+    """
+    Возвращает общий для процесса асинхронный транспорт, создавая его при первом вызове.
+    Параметры пула (max_connections, timeout) учитываются только при создании.
+    """
+    global _async_transport
+    with _lock:
+        if _async_transport is None:
+            _async_transport = AsyncTransport(api_key, **pool_options)
+            logger.info("Created shared async OpenAI transport")
+        return _async_transport
@@ -1,6 +1,18 @@
+import csv
+import gzip
+import io
+import json
 import os
+import queue
 import re
 import logging
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Collection, Iterable, Iterator
 
 
 logging.basicConfig(
@@ -10,32 +22,108 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def save_article_to_file(article_text: str, topic: str, output_dir: str = "articles") -> None:
+def article_path(topic: str, output_dir: str = "articles") -> str:
+    safe_topic = re.sub(r'[\\/*?:"<>|, ]', "_", topic)
+    filename = f"{safe_topic}.md"
+    return os.path.join(output_dir, filename)
+
+
+def save_article_to_file(article_text: str, topic: str, output_dir: str = "articles",
+                         filepath: str | None = None) -> str | None:
+    """
+    Сохраняет статью и возвращает путь к файлу или None, если сохранить не удалось.
+    filepath задает путь к файлу явно, иначе он строится из темы в output_dir.
+    """
     if not article_text:
         logger.error("Article text is empty. Cannot save.")
-        return
+        return None
+    if filepath:
+        output_dir = os.path.dirname(filepath) or "."
 
     try:
         os.makedirs(output_dir, exist_ok=True)
     except PermissionError:
         logger.error(f"Permission denied when creating directory: {output_dir}")
-        return
+        return None
     except Exception as e:
         logger.error(f"Error creating directory {output_dir}: {e}")
-        return
+        return None
 
-    safe_topic = re.sub(r'[\\/*?:"<>|, ]', "_", topic)
-    filename = f"{safe_topic}.md"
-    filepath = os.path.join(output_dir, filename)
+    filepath = filepath or article_path(topic, output_dir)
 
     try:
         with open(filepath, "w", encoding="utf-8") as file:
             file.write(article_text)
         logger.info(f"Article on topic '{topic}' saved to: {filepath}")
+        return filepath
     except PermissionError:
         logger.error(f"Permission denied when writing to file: {filepath}")
     except Exception as e:
         logger.error(f"Error writing to file {filepath}: {e}")
+    return None
+
+
+def stream_article_to_file(chunks: Iterable[str], topic: str, output_dir: str = "articles",
+                           filepath: str | None = None) -> str | None:
+    """
+    Записывает статью по частям по мере генерации во временный файл
+    (.<имя>.md.part, его можно читать для предпросмотра) и атомарно
+    переименовывает его в итоговый .md после получения последней части.
+    Если генерация прерывается, временный файл удаляется, а исключение
+    пробрасывается дальше; полузаписанных .md не остается.
+    Возвращает путь к статье или None, если записать не удалось.
+    filepath задает путь к файлу явно, иначе он строится из темы в output_dir.
+    """
+    if filepath:
+        output_dir = os.path.dirname(filepath) or "."
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+    except PermissionError:
+        logger.error(f"Permission denied when creating directory: {output_dir}")
+        return None
+    except Exception as e:
+        logger.error(f"Error creating directory {output_dir}: {e}")
+        return None
+
+    filepath = filepath or article_path(topic, output_dir)
+    tmp_path = os.path.join(output_dir, f".{os.path.basename(filepath)}.part")
+
+    written = 0
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            for chunk in chunks:
+                file.write(chunk)
+                file.flush()
+                written += len(chunk)
+    except OSError as e:
+        logger.error(f"Error writing to file {tmp_path}: {e}")
+        _remove_quietly(tmp_path)
+        return None
+    except BaseException:
+        _remove_quietly(tmp_path)
+        raise
+
+    if not written:
+        logger.error("Article text is empty. Cannot save.")
+        _remove_quietly(tmp_path)
+        return None
+
+    try:
+        os.replace(tmp_path, filepath)
+    except OSError as e:
+        logger.error(f"Error moving {tmp_path} to {filepath}: {e}")
+        _remove_quietly(tmp_path)
+        return None
+
+    logger.info(f"Article on topic '{topic}' saved to: {filepath}")
+    return filepath
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
 
 
 def load_topics_from_file(filepath: str) -> list:
@@ -64,6 +152,457 @@ def load_topics_from_file(filepath: str) -> list:
         return topics
 
 
+@dataclass(frozen=True)
+class TopicJob:
+    """
+    Задание на одну статью: тема и необязательные параметры из входного файла.
+    language, sections и model None — значения по умолчанию из main.py и настроек,
+    output_path None — путь строится из темы (article_path).
+    outline_from — тема, outline которой из журнала переиспользуется (для почти одинаковых тем).
+    """
+    topic: str
+    language: str | None = None
+    sections: int | None = None
+    output_path: str | None = None
+    model: str | None = None
+    outline_from: str | None = None
+
+    def path(self, output_dir: str = "articles") -> str:
+        return self.output_path or article_path(self.topic, output_dir)
+
+    def options(self) -> dict:
+        """
+        Параметры задания кроме темы (для сохранения в очереди заданий).
+        """
+        return {
+            name: value for name, value in
+            (("language", self.language), ("sections", self.sections), ("output_path", self.output_path),
+             ("model", self.model), ("outline_from", self.outline_from))
+            if value is not None
+        }
+
+    def __str__(self) -> str:
+        return self.topic
+
+
+def _topic_format(filepath: str) -> str:
+    name = filepath.lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    if name.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    if name.endswith(".csv"):
+        return "csv"
+    return "text"
+
+
+def _job_from_record(record: dict, languages: Collection[str] | None = None) -> TopicJob | None:
+    topic = str(record.get("topic") or "").strip()
+    if not topic:
+        return None
+    language = str(record["language"]).strip().upper() if record.get("language") else None
+    if language is not None and languages is not None and language not in languages:
+        raise ValueError(f"no prompts for language '{language}'")
+    sections = record.get("sections")
+    sections = int(sections) if sections not in (None, "") else None
+    if sections is not None and sections < 1:
+        raise ValueError(f"sections must be at least 1, got {sections}")
+    return TopicJob(
+        topic=topic,
+        language=language,
+        sections=sections,
+        output_path=str(record["output_path"]) if record.get("output_path") else None,
+        model=str(record["model"]).strip() if record.get("model") else None,
+    )
+
+
+def _iter_topic_records(file, fmt: str) -> Iterator[tuple[int, object]]:
+    """
+    Отдает (номер строки, запись) без разбора значений: строку текста,
+    строку JSON или словарь CSV.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(file)
+        if not reader.fieldnames or "topic" not in reader.fieldnames:
+            raise ValueError("CSV topics file must have a header with a 'topic' column")
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(file, 1):
+        line = line.strip()
+        if line:
+            yield line_number, line
+
+
+def _parse_topic_record(record, fmt: str, languages: Collection[str] | None = None) -> TopicJob | None:
+    if fmt == "text":
+        return TopicJob(record)
+    if fmt == "jsonl":
+        record = json.loads(record)
+        # Строка JSONL может быть и просто строкой темы
+        if isinstance(record, str):
+            record = {"topic": record}
+        if not isinstance(record, dict):
+            raise ValueError(f"expected an object, got {type(record).__name__}")
+    return _job_from_record(record, languages)
+
+
+def iter_topic_jobs(filepath: str, fmt: str | None = None,
+                    languages: Collection[str] | None = None) -> Iterator[TopicJob]:
+    """
+    Читает задания из файла тем построчно, не загружая его в память.
+
+    Форматы (по расширению, можно сжать в .gz):
+    - текст: одна тема на строку;
+    - JSONL (.jsonl, .ndjson): {"topic": ..., "language": ..., "sections": ..., "output_path": ..., "model": ...};
+    - CSV (.csv): заголовок с колонкой topic и теми же необязательными колонками.
+    Строки с ошибками пропускаются с предупреждением, ошибки чтения файла
+    логируются и завершают поток. Ошибкой строки считаются и sections < 1,
+    и язык не из languages (языки, для которых есть промпты; None — любой).
+    """
+    if not os.path.exists(filepath):
+        logger.error(f"File '{filepath}' not found. No topics to read.")
+        return
+
+    fmt = fmt or _topic_format(filepath)
+    count = 0
+    try:
+        if filepath.lower().endswith(".gz"):
+            file = io.TextIOWrapper(gzip.open(filepath, "rb"), encoding="utf-8", newline="")
+        else:
+            file = open(filepath, "r", encoding="utf-8", newline="")
+        with file:
+            for line_number, record in _iter_topic_records(file, fmt):
+                try:
+                    job = _parse_topic_record(record, fmt, languages)
+                except (ValueError, TypeError) as e:
+                    logger.warning(f"Skipping malformed entry at {filepath}:{line_number}: {e}")
+                    continue
+                if job is None:
+                    logger.warning(f"Skipping entry without a topic at {filepath}:{line_number}")
+                    continue
+                count += 1
+                yield job
+    except UnicodeDecodeError:
+        logger.error(f"Error decoding file {filepath}. Try with a different encoding.")
+    except PermissionError:
+        logger.error(f"Permission denied when reading file: {filepath}")
+    except (OSError, ValueError, csv.Error) as e:
+        logger.error(f"Error reading file {filepath}: {e}")
+    logger.info(f"Read {count} topics from {filepath}")
+
+
+class ArticleIndex:
+    """
+    Множество уже сохраненных статей. Каждый каталог сканируется один раз
+    при первом обращении, дальше проверка темы — поиск в памяти.
+    """
+
+    def __init__(self, output_dir: str = "articles"):
+        self.output_dir = output_dir
+        self._names: dict[str, set[str]] = {}
+
+    def _scan(self, directory: str) -> set[str]:
+        names = self._names.get(directory)
+        if names is None:
+            try:
+                with os.scandir(directory) as entries:
+                    names = {entry.name for entry in entries if entry.is_file()}
+            except OSError:
+                names = set()
+            self._names[directory] = names
+        return names
+
+    def __contains__(self, job: TopicJob | str) -> bool:
+        path = (job if isinstance(job, TopicJob) else TopicJob(job)).path(self.output_dir)
+        return os.path.basename(path) in self._scan(os.path.dirname(path) or ".")
+
+    def add(self, path: str) -> None:
+        self._scan(os.path.dirname(path) or ".").add(os.path.basename(path))
+
+
+def skip_existing_articles(jobs: Iterable[TopicJob], index: ArticleIndex) -> Iterator[TopicJob]:
+    """
+    Пропускает задания, статьи для которых уже есть на диске.
+    """
+    skipped = 0
+    for job in jobs:
+        if job in index:
+            skipped += 1
+            continue
+        yield job
+    if skipped:
+        logger.info(f"Skipped {skipped} topics with existing articles in {index.output_dir}")
+
+
+
+@dataclass
+class ArticleRecord:
+    """
+    Готовая статья для записи в ArticleSink; metadata — язык, модель и т.п.
+    """
+    topic: str
+    text: str
+    metadata: dict = field(default_factory=dict)
+    created: float = field(default_factory=time.time)
+
+
+class ArticleSink:
+    """
+    Хранилище готовых статей. write_batch() записывает пачку статей одной
+    операцией и возвращает их адреса; при ошибке бросает исключение
+    (OSError, sqlite3.Error), ничего не подменяя заглушками.
+    """
+
+    def write_batch(self, records: list[ArticleRecord]) -> list[str]:
+        raise NotImplementedError
+
+    def write(self, topic: str, text: str, metadata: dict | None = None) -> str:
+        return self.write_batch([ArticleRecord(topic, text, metadata or {})])[0]
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "ArticleSink":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class FileSink(ArticleSink):
+    """
+    Статья на файл: запись во временный файл в том же каталоге и атомарный
+    os.replace, так что читатели видят либо старую, либо полную новую версию.
+    Если имя, построенное из темы, уже занято статьей на другую тему
+    (например, "a/b" и "a_b"), к нему добавляется суффикс -2, -3, ...
+    Принадлежность файла теме определяется по заголовку "# <тема>" в первой строке.
+    metadata["output_path"] задает путь к файлу явно: такой файл принадлежит
+    теме независимо от заголовка (например, у перевода он на другом языке) и
+    перезаписывается, суффикс добавляется, только если путь уже занят
+    другой темой в этом запуске.
+    """
+
+    def __init__(self, output_dir: str = "articles", fsync: bool = False):
+        self.output_dir = output_dir
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._claimed: dict[str, str] = {}
+        self._directories: set[str] = set()
+
+    @staticmethod
+    def _belongs_to(path: str, topic: str) -> bool:
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                return file.readline().rstrip("\n") == f"# {topic}"
+        except FileNotFoundError:
+            return True
+        except (OSError, UnicodeDecodeError):
+            return False
+
+    def claim(self, topic: str, filepath: str | None = None) -> str:
+        """
+        Возвращает свободный для темы путь и закрепляет его за ней до конца работы.
+        filepath — путь, заданный вызывающим кодом; файл по нему считается файлом темы.
+        """
+        path = filepath or article_path(topic, self.output_dir)
+        base, extension = os.path.splitext(path)
+        number = 1
+        with self._lock:
+            while True:
+                owner = self._claimed.get(path)
+                if owner == topic or (owner is None and (path == filepath or self._belongs_to(path, topic))):
+                    self._claimed[path] = topic
+                    return path
+                number += 1
+                path = f"{base}-{number}{extension}"
+
+    def _ensure_directory(self, directory: str) -> None:
+        if directory not in self._directories:
+            os.makedirs(directory, exist_ok=True)
+            self._directories.add(directory)
+
+    def write_batch(self, records: list[ArticleRecord]) -> list[str]:
+        paths = []
+        for record in records:
+            path = self.claim(record.topic, record.metadata.get("output_path"))
+            directory = os.path.dirname(path) or "."
+            self._ensure_directory(directory)
+            tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{uuid.uuid4().hex}.part")
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as file:
+                    file.write(record.text)
+                    if self.fsync:
+                        file.flush()
+                        os.fsync(file.fileno())
+                os.replace(tmp_path, path)
+            except BaseException:
+                _remove_quietly(tmp_path)
+                raise
+            paths.append(path)
+        return paths
+
+
+class JsonlSink(ArticleSink):
+    """
+    Все статьи в одном append-only JSONL-файле: {"topic", "text", "created", ...metadata}.
+    Пачка статей дописывается одной записью; со сжатием (по расширению .gz
+    или .zst, либо compression="gzip"/"zstd") каждая пачка — отдельный
+    gzip-член или zstd-фрейм, и такие файлы читаются стандартными утилитами
+    целиком (zcat, zstdcat). Для zstd нужен пакет zstandard.
+    Вместо миллионов мелких файлов на общем диске остается один файл.
+    """
+
+    def __init__(self, path: str = "articles/articles.jsonl.gz", compression: str | None = "auto"):
+        self.path = path
+        if compression == "auto":
+            compression = "gzip" if path.endswith(".gz") else "zstd" if path.endswith(".zst") else None
+        if compression not in (None, "gzip", "zstd"):
+            raise ValueError(f"Unknown compression: {compression}")
+        self.compression = compression
+        self._compressor = None
+        if compression == "zstd":
+            # Необязательная зависимость, нужна только для .zst
+            import zstandard
+            self._compressor = zstandard.ZstdCompressor()
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write_batch(self, records: list[ArticleRecord]) -> list[str]:
+        data = "".join(
+            json.dumps({"topic": record.topic, "text": record.text, "created": record.created, **record.metadata},
+                       ensure_ascii=False) + "\n"
+            for record in records
+        ).encode("utf-8")
+        if self.compression == "gzip":
+            data = gzip.compress(data)
+        elif self.compression == "zstd":
+            data = self._compressor.compress(data)
+        with self._lock, open(self.path, "ab") as file:
+            file.write(data)
+        return [self.path] * len(records)
+
+
+class SqliteSink(ArticleSink):
+    """
+    Статьи и их метаданные в SQLite: таблица articles с ключом (topic, language),
+    повторная запись темы заменяет статью. Пачка пишется одной транзакцией.
+    """
+
+    def __init__(self, path: str = "articles/articles.sqlite"):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS articles ("
+            "topic TEXT NOT NULL, language TEXT NOT NULL DEFAULT '', text TEXT NOT NULL, "
+            "chars INTEGER NOT NULL, words INTEGER NOT NULL, metadata TEXT, created REAL NOT NULL, "
+            "PRIMARY KEY (topic, language))"
+        )
+        self._conn.commit()
+
+    def write_batch(self, records: list[ArticleRecord]) -> list[str]:
+        rows = [
+            (record.topic, record.metadata.get("language") or "", record.text, len(record.text),
+             len(record.text.split()), json.dumps(record.metadata, ensure_ascii=False), record.created)
+            for record in records
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO articles (topic, language, text, chars, words, metadata, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        return [f"{self.path}#{record.topic}" for record in records]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_SINK_CLOSED = object()
+
+
+class BackgroundSink:
+    """
+    Запись статей в фоновом потоке: write() сразу возвращает Future с адресом
+    статьи, а поток собирает статьи в пачки (до batch_size штук или
+    flush_interval секунд ожидания) и пишет их через sink.write_batch().
+    При ошибке записи Future всех статей пачки завершаются этой ошибкой.
+    Очередь ограничена max_pending статьями: если хранилище не успевает,
+    write() ждет, а не копит статьи в памяти. close() дописывает очередь.
+    """
+
+    def __init__(self, sink: ArticleSink, batch_size: int = 100, flush_interval: float = 1.0,
+                 max_pending: int = 1000):
+        self.sink = sink
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, max_pending))
+        self.written = 0
+        self.failed = 0
+        self._thread = threading.Thread(target=self._run, name="article-sink", daemon=True)
+        self._thread.start()
+
+    def write(self, topic: str, text: str, metadata: dict | None = None) -> Future:
+        future = Future()
+        self._queue.put((ArticleRecord(topic, text, metadata or {}), future))
+        return future
+
+    def _next_batch(self) -> tuple[list, bool]:
+        entry = self._queue.get()
+        if entry is _SINK_CLOSED:
+            return [], True
+        batch = [entry]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                entry = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if entry is _SINK_CLOSED:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def _run(self) -> None:
+        closed = False
+        while not closed:
+            batch, closed = self._next_batch()
+            if not batch:
+                continue
+            try:
+                locations = self.sink.write_batch([record for record, _ in batch])
+            except Exception as e:
+                self.failed += len(batch)
+                logger.error(f"Failed to write {len(batch)} articles: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.written += len(batch)
+            for (_, future), location in zip(batch, locations):
+                future.set_result(location)
+
+    def close(self) -> None:
+        if not self._thread.is_alive():
+            return
+        self._queue.put(_SINK_CLOSED)
+        self._thread.join()
+        self.sink.close()
+
+    def __enter__(self) -> "BackgroundSink":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
 def load_prompts(filepath: str) -> str:
     try:
         with open(filepath, "r", encoding="utf-8") as file: